@@ -18,6 +18,8 @@ APP_NAME="Artocarpus"
 APP_VERSION="5.3"
 GITHUB_REPO="jtliaw/Artocarpus"
 SCRCPY_REPO="Genymobile/scrcpy"
+# 程序由以下 Python 模块组成
+APP_MODULES="scrcpy_gui.py adb_client.py transfer_engine.py sync_manifest.py remote_cache.py log_sink.py launch_orchestrator.py session_supervisor.py app_config.py artocarpus_cli.py settings_store.py encoder_cache.py link_tuner.py device_discovery.py reconnect_watchdog.py tcpip_provision.py archive_stream.py resumable_transfer.py broadcast_push.py screen_capture.py segment_recorder.py call_metrics.py"
 
 # 获取脚本所在目录（安装根目录）
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
@@ -235,8 +237,10 @@ install_app_files() {
     # 检查本地是否有文件
     if [ -f "$INSTALL_DIR/scrcpy_gui.py" ]; then
         print_info "从本地复制文件..."
-        cp "$INSTALL_DIR/scrcpy_gui.py" "$APP_DIR/"
-        print_success "已复制: scrcpy_gui.py"
+        for module in $APP_MODULES; do
+            cp "$INSTALL_DIR/$module" "$APP_DIR/"
+            print_success "已复制: $module"
+        done
         
         if [ -f "$INSTALL_DIR/artocarpus_icon.png" ]; then
             cp "$INSTALL_DIR/artocarpus_icon.png" "$APP_DIR/"
@@ -245,8 +249,10 @@ install_app_files() {
     else
         print_info "从 GitHub 下载文件..."
         
-        # 下载主程序
-        download_file "https://raw.githubusercontent.com/$GITHUB_REPO/main/scrcpy_gui.py" "$APP_DIR/scrcpy_gui.py"
+        # 下载主程序及其模块
+        for module in $APP_MODULES; do
+            download_file "https://raw.githubusercontent.com/$GITHUB_REPO/main/$module" "$APP_DIR/$module"
+        done
         
         # 下载图标
         download_file "https://raw.githubusercontent.com/$GITHUB_REPO/main/artocarpus_icon.png" "$APP_DIR/artocarpus_icon.png" || true
@@ -274,9 +280,8 @@ export PYTHONPATH="$SCRIPT_DIR/app:$PYTHONPATH"
 # 激活虚拟环境
 source "$SCRIPT_DIR/venv/bin/activate"
 
-# 启动应用
-cd "$SCRIPT_DIR/app"
-python scrcpy_gui.py "$@"
+# 启动应用 (不切换目录：命令行参数中的相对路径要相对于用户的当前目录)
+python "$SCRIPT_DIR/app/scrcpy_gui.py" "$@"
 EOF
     
     chmod +x "$BIN_DIR/artocarpus"
@@ -0,0 +1,791 @@
+"""
+直接与本机 adb server (默认 127.0.0.1:5037) 通信的客户端。
+
+实现 adb host 协议中本程序用到的部分 (host:devices、host:transport、shell:、sync: 等)，
+避免每次操作都启动一个 adb 进程；连不上 adb server 时退回到调用 adb 可执行文件。
+"""
+import os
+import re
+import shlex
+import socket
+import stat
+import struct
+import subprocess
+import threading
+import time
+
+from call_metrics import CallMetrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT") or 5037)  # 与 adb 本身使用同一个环境变量
+SYNC_DATA_MAX = 64 * 1024
+_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+_EXIT_MARKER = "__ARTOCARPUS_EXIT__:"
+_PROGRESS_LINE = re.compile(r"^\[\s*(\d+)%\]\s+(.*)$")
+_SUMMARY_LINE = re.compile(r"\((\d+) bytes in ([\d.]+)s\)")
+# sync v2 (STA2 与 LIS2 的 DNT2) 在标识之后的字段：error、dev、ino、mode、nlink、uid、gid、size (64 位)、atime、mtime、ctime
+_STAT_V2 = struct.Struct("<IQQIIIIQqqq")
+_DENT_V2 = struct.Struct("<IQQIIIIQqqqI")  # 同上，最后是文件名长度
+
+
+class AdbError(Exception):
+    pass
+
+
+class AdbServerUnavailable(AdbError):
+    pass
+
+
+class AdbConnectionClosed(AdbError):
+    pass
+
+
+class _HostConnection:
+    # 一条到 adb server 的 socket，封装请求/应答的帧格式
+    def __init__(self, host, port, timeout):
+        try:
+            self.sock = socket.create_connection((host, port), timeout=timeout)
+        except OSError as e:
+            raise AdbServerUnavailable(f"无法连接 adb server {host}:{port}: {e}") from e
+        self.sock.settimeout(timeout)
+
+    def send_request(self, payload):
+        data = payload.encode('utf-8')
+        self.sock.sendall(b"%04x" % len(data) + data)
+        self.read_status()
+
+    def read_status(self):
+        status = self.read_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_hex_payload().decode('utf-8', 'replace'))
+        raise AdbError(f"adb server 返回了未知状态: {status!r}")
+
+    def read_exact(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self.sock.recv(min(size, 1024 * 1024))
+            if not chunk:
+                raise AdbConnectionClosed("adb server 提前关闭了连接")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def read_hex_payload(self):
+        return self.read_exact(int(self.read_exact(4), 16))
+
+    def read_all(self):
+        chunks = []
+        while True:
+            chunk = self.sock.recv(64 * 1024)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class SyncSession:
+    """
+    一条已切换到 sync: 模式的连接，可以连续执行多次 STAT/LIST/RECV/SEND。
+    v1 的 STAT/LIST 中文件大小只有 32 位，4 GiB 以上的文件会回绕；设备支持时 (stat_v2/ls_v2 特性)
+    改用 STA2/LIS2，大小为 64 位。
+    """
+
+    def __init__(self, conn, serial, stat_v2=False, ls_v2=False):
+        self.conn = conn
+        self.serial = serial
+        self.stat_v2 = stat_v2
+        self.ls_v2 = ls_v2
+
+    def _send(self, cmd, arg=b""):
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        self.conn.sock.sendall(cmd + struct.pack("<I", len(arg)) + arg)
+
+    def _read_fail(self, length):
+        raise AdbError(self.conn.read_exact(length).decode('utf-8', 'replace'))
+
+    def stat(self, path):
+        if not self.stat_v2:
+            self._send(b"STAT", path)
+            resp = self.conn.read_exact(16)
+            if resp[:4] != b"STAT":
+                raise AdbError(f"sync STAT 应答异常: {resp[:4]!r}")
+            mode, size, mtime = struct.unpack("<III", resp[4:])
+            return mode, size, mtime
+        self._send(b"STA2", path)
+        tag = self.conn.read_exact(4)
+        if tag == b"FAIL":
+            self._read_fail(struct.unpack("<I", self.conn.read_exact(4))[0])
+        if tag != b"STA2":
+            raise AdbError(f"sync STA2 应答异常: {tag!r}")
+        error, _dev, _ino, mode, _nlink, _uid, _gid, size, _atime, mtime, _ctime = _STAT_V2.unpack(self.conn.read_exact(_STAT_V2.size))
+        # 与 v1 一致：路径不存在 (或无法访问) 时 mode 为 0
+        return (0, 0, 0) if error else (mode, size, mtime)
+
+    def listdir(self, path):
+        v2 = self.ls_v2
+        self._send(b"LIS2" if v2 else b"LIST", path)
+        entry_tag, body_size = (b"DNT2", _DENT_V2.size) if v2 else (b"DENT", 16)
+        entries = []
+        while True:
+            # DONE 与目录项等长；FAIL 之后是错误信息
+            tag, length = struct.unpack("<4sI", self.conn.read_exact(8))
+            if tag == b"FAIL":
+                self._read_fail(length)
+            rest = self.conn.read_exact(body_size - 4)
+            if tag == b"DONE":
+                return entries
+            if tag != entry_tag:
+                raise AdbError(f"sync {'LIS2' if v2 else 'LIST'} 应答异常: {tag!r}")
+            if v2:
+                _error, _dev, _ino, mode, _nlink, _uid, _gid, size, _atime, mtime, _ctime, namelen = _DENT_V2.unpack(struct.pack("<I", length) + rest)
+            else:
+                mode, size, mtime, namelen = struct.unpack("<IIII", struct.pack("<I", length) + rest)
+            name = self.conn.read_exact(namelen).decode('utf-8', 'replace')
+            if name not in (".", ".."):
+                entries.append((name, mode, size, mtime))
+
+    def recv(self, remote_path, fileobj, progress=None):
+        self._send(b"RECV", remote_path)
+        done = 0
+        while True:
+            tag = self.conn.read_exact(4)
+            length = struct.unpack("<I", self.conn.read_exact(4))[0]
+            if tag == b"DATA":
+                fileobj.write(self.conn.read_exact(length))
+                done += length
+                if progress: progress(done)
+            elif tag == b"DONE":
+                return done
+            elif tag == b"FAIL":
+                self._read_fail(length)
+            else:
+                raise AdbError(f"sync RECV 应答异常: {tag!r}")
+
+    def send(self, remote_path, fileobj, mode=0o644, mtime=None, progress=None):
+        self._send(b"SEND", f"{remote_path},{mode}")
+        done = 0
+        while True:
+            chunk = fileobj.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self._send(b"DATA", chunk)
+            done += len(chunk)
+            if progress: progress(done)
+        self.conn.sock.sendall(b"DONE" + struct.pack("<I", int(mtime if mtime is not None else time.time())))
+        tag = self.conn.read_exact(4)
+        length = struct.unpack("<I", self.conn.read_exact(4))[0]
+        if tag == b"FAIL":
+            self._read_fail(length)
+        if tag != b"OKAY":
+            raise AdbError(f"sync SEND 应答异常: {tag!r}")
+        return done
+
+    def quit(self):
+        try:
+            self._send(b"QUIT")
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class ExecStream:
+    """
+    open_exec 返回的数据流：直接使用到 adb server 的 socket，或退回到 `adb exec-out` 子进程的管道。
+    timer 为 CallMetrics 的计时器，close() 时记录整个数据流的存续时间与读取的字节数。
+    """
+
+    def __init__(self, conn=None, release=None, proc=None, timer=None):
+        self._conn = conn
+        self._release = release
+        self._proc = proc
+        self._timer = timer
+        self.bytes_read = 0
+
+    def read(self, size=64 * 1024):
+        data = self._conn.sock.recv(size) if self._conn else self._proc.stdout.read1(size)
+        self.bytes_read += len(data)
+        return data
+
+    def write(self, data):
+        if self._conn:
+            self._conn.sock.sendall(data)
+        else:
+            self._proc.stdin.write(data)
+        return len(data)
+
+    def flush(self):
+        if self._proc:
+            self._proc.stdin.flush()
+
+    def end_input(self):
+        # 子进程方式可以关闭 stdin 通知对端输入结束；adb server 的 socket 不支持半关闭，
+        # 只能依靠数据本身的结束标志 (例如 tar 末尾的空块)
+        if self._proc:
+            self._proc.stdin.close()
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+            if self._release:
+                self._release()
+        elif self._proc:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+        if self._timer:
+            self._timer.finish(output_bytes=self.bytes_read)
+
+
+class AdbClient:
+    """
+    adb server 客户端。sync 会话按设备序列号缓存复用，并发连接数受 max_connections 限制；
+    adb server 不可达时自动改用 adb_path 指向的可执行文件。
+    每次请求的耗时记录在 metrics (CallMetrics) 中：操作名为 "adb <命令>"，退回到可执行文件时另记 "adb-exe <命令>"。
+    """
+
+    def __init__(self, adb_path="adb", host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=15, max_connections=16, sync_pool_size=2, metrics=None):
+        self.adb_path = adb_path
+        self.metrics = metrics if metrics is not None else CallMetrics()
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sync_pool_size = sync_pool_size
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._sync_pool = {}
+        self._features = {}  # serial -> frozenset，设备支持的 adb 特性
+        self._server_down_until = 0.0
+
+    # --- 连接管理 ---
+    def _open(self, timeout=None):
+        if time.monotonic() < self._server_down_until:
+            raise AdbServerUnavailable("adb server 暂不可用")
+        try:
+            return _HostConnection(self.host, self.port, timeout or self.timeout)
+        except AdbServerUnavailable:
+            # 短时间内不再重复尝试，直接走 adb 可执行文件
+            self._server_down_until = time.monotonic() + 2.0
+            raise
+
+    def _host_query(self, request, timeout=None):
+        with self._slots:
+            conn = self._open(timeout)
+            try:
+                conn.send_request(request)
+                return conn.read_hex_payload().decode('utf-8', 'replace')
+            finally:
+                conn.close()
+
+    def _transport_request(self, serial=None, usb=False):
+        if usb:
+            return "host:transport-usb"
+        if serial:
+            return f"host:transport:{serial}"
+        return "host:transport-any"
+
+    def _open_service(self, serial, service, usb=False, timeout=None):
+        conn = self._open(timeout)
+        try:
+            conn.send_request(self._transport_request(serial, usb))
+            conn.send_request(service)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _run_service(self, serial, service, usb=False, timeout=None):
+        with self._slots:
+            conn = self._open_service(serial, service, usb, timeout)
+            try:
+                return conn.read_all()
+            finally:
+                conn.close()
+
+    def server_available(self):
+        try:
+            self._host_query("host:version", timeout=2)
+            return True
+        except AdbError:
+            return False
+
+    # --- adb 可执行文件兜底 ---
+    def run_binary(self, args, timeout=15, check=True):
+        # timeout=None 表示不限时 (用于大文件传输)
+        cmd = [self.adb_path] + list(args)
+        with self.metrics.measure(_binary_operation(args), _serial_from_args(args), " ".join(cmd)) as timer:
+            result = subprocess.run(cmd, capture_output=True, timeout=timeout, creationflags=_NO_WINDOW)
+            timer.exit_code, timer.output_bytes = result.returncode, len(result.stdout) + len(result.stderr)
+        stdout = result.stdout.decode('utf-8', 'replace')
+        if check and result.returncode != 0:
+            stderr = result.stderr.decode('utf-8', 'replace').strip()
+            raise AdbError(stderr or stdout.strip() or f"{' '.join(cmd)} 退出码 {result.returncode}")
+        return stdout
+
+    def run_binary_transfer(self, args, path, total=None, progress=None):
+        """
+        用 adb 可执行文件执行 push/pull，并把输出中的 "[ 42%] 路径" 与
+        "(N bytes in T s)" 解析为 progress(path, done, total) 事件。返回传输的字节数。
+        """
+        cmd = [self.adb_path] + list(args)
+        with self.metrics.measure(_binary_operation(args), _serial_from_args(args), " ".join(cmd)) as timer:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, creationflags=_NO_WINDOW)
+            transferred, tail = None, []
+            try:
+                for raw in proc.stdout:
+                    line = raw.decode('utf-8', 'replace').strip()
+                    if not line:
+                        continue
+                    tail = (tail + [line])[-5:]
+                    event = parse_transfer_output(line)
+                    if event is None:
+                        continue
+                    kind, value, name = event
+                    if kind == "percent" and progress and total:
+                        progress(name or path, total * value // 100, total)
+                    elif kind == "summary":
+                        transferred = value
+                        if progress: progress(path, value, total or value)
+            except BaseException:
+                # 进度回调抛出 TransferCancelled 等异常时必须结束子进程：否则没人读它的输出，管道写满后会卡住
+                proc.kill()
+                proc.wait()
+                raise
+            finally:
+                proc.stdout.close()
+            timer.exit_code, timer.output_bytes = proc.wait(), transferred or 0
+        if proc.returncode != 0:
+            raise AdbError("\n".join(tail) or f"{' '.join(cmd)} 退出码 {proc.returncode}")
+        return transferred
+
+    # --- host 服务 ---
+    def devices(self):
+        """返回 [(serial, state), ...]，与 `adb devices` 的输出一致。"""
+        with self.metrics.measure("adb devices", command="host:devices") as timer:
+            try:
+                text = self._host_query("host:devices")
+            except AdbServerUnavailable:
+                text = "\n".join(self.run_binary(["devices"], timeout=self.timeout).splitlines()[1:])
+            timer.output_bytes = len(text)
+        return parse_device_list(text)
+
+    def mdns_services(self, timeout=5):
+        """返回与 `adb mdns services` 相同的文本 (每行: 实例名、服务类型、ip:port)，由调用方解析。"""
+        with self.metrics.measure("adb mdns", command="host:mdns:services") as timer:
+            try:
+                text = self._host_query("host:mdns:services", timeout=timeout)
+            except AdbServerUnavailable:
+                text = self.run_binary(["mdns", "services"], timeout=timeout * 2, check=False)
+            timer.output_bytes = len(text)
+        return text
+
+    def connect(self, address, timeout=None):
+        """返回 (是否成功, adb 给出的提示信息)。"""
+        with self.metrics.measure("adb connect", address, f"host:connect:{address}") as timer:
+            try:
+                message = self._host_query(f"host:connect:{address}", timeout=timeout)
+            except AdbServerUnavailable:
+                message = self.run_binary(["connect", address], timeout=timeout or self.timeout, check=False)
+            message = message.strip()
+            connected = message.startswith(("connected to", "already connected to"))
+            timer.exit_code, timer.output_bytes = 0 if connected else 1, len(message)
+        return connected, message
+
+    def features(self, serial):
+        """
+        设备与 adb server 共同支持的特性 (host-serial:<serial>:features)，例如 stat_v2、ls_v2。
+        旧版 adb server 不支持该请求或查询失败时返回空集合 (不缓存)，此时只使用 v1 协议。
+        """
+        with self._lock:
+            cached = self._features.get(serial)
+        if cached is not None:
+            return cached
+        # 不占用 max_connections 名额：_acquire_sync 已持有一个名额时也会调用这里
+        conn = self._open()
+        try:
+            conn.send_request(f"host-serial:{serial}:features")
+            features = frozenset(f.strip() for f in conn.read_hex_payload().decode('utf-8', 'replace').split(",") if f.strip())
+        except (AdbError, OSError):
+            return frozenset()
+        finally:
+            conn.close()
+        with self._lock:
+            self._features[serial] = features
+        return features
+
+    def forget_device(self, serial):
+        # 设备断开后同一地址可能换成另一台设备 (Wi-Fi)，特性需要重新查询
+        with self._lock:
+            self._features.pop(serial, None)
+
+    def disconnect(self, address):
+        with self.metrics.measure("adb disconnect", address, f"host:disconnect:{address}"):
+            try:
+                return self._host_query(f"host:disconnect:{address}").strip()
+            except AdbServerUnavailable:
+                return self.run_binary(["disconnect", address], timeout=self.timeout).strip()
+
+    def tcpip(self, serial=None, port=5555, usb=False):
+        with self.metrics.measure("adb tcpip", serial, f"tcpip:{port}"):
+            try:
+                output = self._run_service(serial, f"tcpip:{port}", usb=usb).decode('utf-8', 'replace')
+            except AdbServerUnavailable:
+                target = ["-d"] if usb else (["-s", serial] if serial else [])
+                return self.run_binary(target + ["tcpip", str(port)], timeout=self.timeout).strip()
+            if "restarting" not in output:
+                raise AdbError(output.strip() or "tcpip 请求失败")
+        return output.strip()
+
+    # --- shell ---
+    def shell(self, serial, command, timeout=None, check=False):
+        """
+        在设备上执行命令并返回输出文本 (stdout 与 stderr 合并)。
+        check=True 时命令退出码非 0 会抛出 AdbError。
+        """
+        if not isinstance(command, str):
+            command = " ".join(shlex.quote(str(part)) for part in command)
+        wrapped = f"{command}; __s=$?; echo; echo {_EXIT_MARKER}$__s"
+        with self.metrics.measure("adb shell", serial, command) as timer:
+            try:
+                raw = self._run_service(serial, f"shell:{wrapped}", timeout=timeout).decode('utf-8', 'replace')
+            except AdbServerUnavailable:
+                raw = self.run_binary(["-s", serial, "shell", wrapped], timeout=timeout or self.timeout, check=False)
+            output, exit_code = _split_exit_status(raw.replace("\r\n", "\n"))
+            timer.exit_code, timer.output_bytes = exit_code, len(output)
+        if check and exit_code != 0:
+            raise AdbError(output.strip() or f"命令退出码 {exit_code}")
+        return output
+
+    def open_exec(self, serial, command, timeout=None):
+        """
+        执行命令并返回双向的原始数据流 (不经过 pty，二进制安全)：read() 读取标准输出，
+        write() 写入标准输入。用完后必须 close()。注意：没有 shell 协议时 stderr 与 stdout 混在一起。
+        """
+        if not isinstance(command, str):
+            command = " ".join(shlex.quote(str(part)) for part in command)
+        timer = self.metrics.start("adb exec", serial, command)
+        self._slots.acquire()
+        try:
+            return ExecStream(conn=self._open_service(serial, f"exec:{command}", timeout=timeout), release=self._slots.release, timer=timer)
+        except AdbServerUnavailable:
+            self._slots.release()
+        except BaseException:
+            self._slots.release()
+            timer.finish(exit_code=-1)
+            raise
+        try:
+            proc = subprocess.Popen([self.adb_path, "-s", serial, "exec-out", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, creationflags=_NO_WINDOW)
+        except OSError:
+            timer.finish(exit_code=-1)
+            raise
+        return ExecStream(proc=proc, timer=timer)
+
+    def exec_out(self, serial, command, sink, timeout=None):
+        """
+        执行命令并把原始标准输出分块交给 sink(chunk)，返回字节数。
+        sink 返回 False 时提前结束读取。
+        """
+        total = 0
+        stream = self.open_exec(serial, command, timeout)
+        try:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    return total
+                total += len(chunk)
+                if sink(chunk) is False:
+                    return total
+        finally:
+            stream.close()
+
+    # --- sync ---
+    def _acquire_sync(self, serial):
+        # 并发名额只在使用期间占用，池中空闲的会话不计入 max_connections
+        self._slots.acquire()
+        with self._lock:
+            pool = self._sync_pool.get(serial)
+            if pool:
+                return pool.pop(), True
+        try:
+            features = self.features(serial)
+            conn = self._open_service(serial, "sync:")
+        except Exception:
+            self._slots.release()
+            raise
+        return SyncSession(conn, serial, "stat_v2" in features, "ls_v2" in features), False
+
+    def _release_sync(self, session, broken=False):
+        self._slots.release()
+        if broken:
+            session.conn.close()
+            return
+        with self._lock:
+            pool = self._sync_pool.setdefault(session.serial, [])
+            if len(pool) < self.sync_pool_size:
+                pool.append(session)
+                return
+        session.quit()
+
+    def _with_sync(self, serial, func):
+        session, reused = self._acquire_sync(serial)
+        try:
+            result = func(session)
+        except (OSError, AdbConnectionClosed):
+            self._release_sync(session, broken=True)
+            # 池中的旧连接可能已被 server 关闭 (例如设备重连)，换一条新连接重试一次
+            if reused:
+                return self._with_sync(serial, func)
+            raise
+        except Exception:
+            # adbd 在发出 FAIL 之后会结束这条 sync 会话，不能再放回池中
+            self._release_sync(session, broken=True)
+            raise
+        self._release_sync(session)
+        return result
+
+    def stat(self, serial, path):
+        """返回 (mode, size, mtime)；路径不存在时 mode 为 0。"""
+        with self.metrics.measure("adb stat", serial, path):
+            return self._with_sync(serial, lambda s: s.stat(path))
+
+    def listdir(self, serial, path):
+        """返回 [(name, mode, size, mtime), ...]，不含 '.' 与 '..'。"""
+        with self.metrics.measure("adb ls", serial, path) as timer:
+            entries = self._with_sync(serial, lambda s: s.listdir(path))
+            timer.output_bytes = sum(len(e[0]) for e in entries)
+        return entries
+
+    def pull(self, serial, remote_path, local_path, progress=None):
+        """
+        行为与 `adb pull` 相同：local_path 为已存在的文件夹时复制到其中。
+        progress(path, done, total) 会在每个数据块后被调用。返回传输的字节数。
+        """
+        try:
+            mode, size, mtime = self.stat(serial, remote_path)
+        except AdbServerUnavailable:
+            return self.run_binary_transfer(["-s", serial, "pull", remote_path, local_path], remote_path, progress=progress)
+        if mode == 0:
+            raise AdbError(f"远程路径不存在: {remote_path}")
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, posix_basename(remote_path))
+        if stat.S_ISDIR(mode):
+            return self._pull_dir(serial, remote_path, local_path, progress)
+        return self.pull_file(serial, remote_path, local_path, size, mtime, progress)
+
+    def pull_file(self, serial, remote_path, local_path, size=0, mtime=None, progress=None):
+        """复制单个文件到 local_path (完整文件路径)，mtime 不为 None 时同步修改时间。"""
+        def do_recv(session):
+            with open(local_path, 'wb') as f:
+                return session.recv(remote_path, f, (lambda done: progress(remote_path, done, size)) if progress else None)
+        with self.metrics.measure("adb pull", serial, remote_path) as timer:
+            try:
+                done = timer.output_bytes = self._with_sync(serial, do_recv)
+            except AdbServerUnavailable:
+                self.run_binary_transfer(["-s", serial, "pull", "-a", remote_path, local_path], remote_path, size, progress)
+                timer.output_bytes = os.path.getsize(local_path)
+                return timer.output_bytes
+        if mtime is not None:
+            os.utime(local_path, (mtime, mtime))
+        return done
+
+    def _pull_dir(self, serial, remote_dir, local_dir, progress):
+        os.makedirs(local_dir, exist_ok=True)
+        total = 0
+        for name, mode, size, mtime in self.listdir(serial, remote_dir):
+            remote_child = remote_dir.rstrip('/') + '/' + name
+            local_child = os.path.join(local_dir, name)
+            if stat.S_ISDIR(mode):
+                total += self._pull_dir(serial, remote_child, local_child, progress)
+            elif stat.S_ISREG(mode) or stat.S_ISLNK(mode):
+                total += self.pull_file(serial, remote_child, local_child, size, mtime, progress)
+        return total
+
+    def push(self, serial, local_path, remote_path, progress=None):
+        """行为与 `adb push` 相同：remote_path 为已存在的文件夹时复制到其中。返回传输的字节数。"""
+        try:
+            remote_mode = self.stat(serial, remote_path)[0]
+        except AdbServerUnavailable:
+            return self.run_binary_transfer(["-s", serial, "push", local_path, remote_path], local_path, progress=progress)
+        if stat.S_ISDIR(remote_mode):
+            remote_path = remote_path.rstrip('/') + '/' + os.path.basename(os.path.normpath(local_path))
+        if os.path.isdir(local_path):
+            return self._push_dir(serial, local_path, remote_path, progress)
+        return self.push_file(serial, local_path, remote_path, progress)
+
+    def push_file(self, serial, local_path, remote_path, progress=None, opener=None):
+        """
+        复制单个文件到 remote_path (完整文件路径)，远程文件的修改时间与本地一致。
+        opener() 返回代替 open(local_path) 的文件对象 (例如多台设备共享的读取缓存)，每次尝试调用一次。
+        """
+        st = os.stat(local_path)
+        def do_send(session):
+            with (opener() if opener else open(local_path, 'rb')) as f:
+                cb = (lambda done: progress(local_path, done, st.st_size)) if progress else None
+                return session.send(remote_path, f, stat.S_IMODE(st.st_mode) or 0o644, int(st.st_mtime), cb)
+        with self.metrics.measure("adb push", serial, remote_path) as timer:
+            try:
+                timer.output_bytes = self._with_sync(serial, do_send)
+            except AdbServerUnavailable:
+                self.run_binary_transfer(["-s", serial, "push", local_path, remote_path], local_path, st.st_size, progress)
+                timer.output_bytes = st.st_size
+        return timer.output_bytes
+
+    def _push_dir(self, serial, local_dir, remote_dir, progress):
+        total = 0
+        for root, _dirs, files in os.walk(local_dir):
+            rel = os.path.relpath(root, local_dir)
+            remote_root = remote_dir if rel == "." else remote_dir.rstrip('/') + '/' + rel.replace(os.sep, '/')
+            for name in files:
+                total += self.push_file(serial, os.path.join(root, name), remote_root + '/' + name, progress)
+        return total
+
+    def close(self):
+        with self._lock:
+            pools, self._sync_pool = self._sync_pool, {}
+        for sessions in pools.values():
+            for session in sessions:
+                session.quit()
+
+
+class DeviceTracker:
+    """
+    通过一条长期保持的 host:track-devices 连接跟踪设备的插拔与状态变化。
+    每次变化调用 callback(events, snapshot)，events 为 [(kind, serial, state), ...]，
+    kind 取 "added" / "removed" / "changed"；回调在后台线程中执行。
+    """
+
+    def __init__(self, client, callback, retry_interval=1.0, max_retry_interval=10.0):
+        self.client = client
+        self.callback = callback
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.devices = {}
+        self._stop = threading.Event()
+        self._conn = None
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        conn = self._conn
+        if conn:
+            conn.close()
+
+    def _run(self):
+        delay = self.retry_interval
+        while not self._stop.is_set():
+            try:
+                conn = self.client._open()
+                self._conn = conn
+                conn.send_request("host:track-devices")
+                conn.sock.settimeout(None)
+                delay = self.retry_interval
+                while not self._stop.is_set():
+                    self._update(parse_device_list(conn.read_hex_payload().decode('utf-8', 'replace')))
+            except AdbServerUnavailable:
+                # adb server 未运行：与 `adb devices` 一样尝试把它拉起来
+                try:
+                    self.client.run_binary(["start-server"], timeout=self.client.timeout)
+                except Exception:
+                    pass
+            except (OSError, AdbError, ValueError):
+                pass
+            finally:
+                if self._conn:
+                    self._conn.close()
+                    self._conn = None
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, self.max_retry_interval)
+
+    def _update(self, device_pairs):
+        snapshot = dict(device_pairs)
+        events = diff_device_states(self.devices, snapshot)
+        self.devices = snapshot
+        for kind, serial, _state in events:
+            if kind == "removed":
+                self.client.forget_device(serial)
+        if events:
+            self.callback(events, dict(snapshot))
+
+
+def diff_device_states(old, new):
+    events = []
+    for serial, state in new.items():
+        if serial not in old:
+            events.append(("added", serial, state))
+        elif old[serial] != state:
+            events.append(("changed", serial, state))
+    for serial, state in old.items():
+        if serial not in new:
+            events.append(("removed", serial, state))
+    return events
+
+
+def parse_device_list(text):
+    devices = []
+    for line in text.splitlines():
+        parts = line.strip().split('\t')
+        if len(parts) >= 2 and parts[0]:
+            devices.append((parts[0], parts[1]))
+    return devices
+
+
+def parse_transfer_output(line):
+    """
+    解析 adb push/pull 的一行输出：
+    返回 ("percent", 百分比, 文件路径)、("summary", 字节数, None) 或 None。
+    """
+    match = _PROGRESS_LINE.match(line)
+    if match:
+        return "percent", int(match.group(1)), match.group(2)
+    match = _SUMMARY_LINE.search(line)
+    if match:
+        return "summary", int(match.group(1)), None
+    return None
+
+
+def _serial_from_args(args):
+    args = list(args)
+    return args[args.index("-s") + 1] if "-s" in args[:-1] else None
+
+
+def _binary_operation(args):
+    # 操作名只取子命令 (如 "adb-exe pull")，路径等参数放在 command 中，避免统计项无限增多
+    args = list(args)
+    start = args.index("-s") + 2 if "-s" in args[:-1] else 0
+    verb = next((a for a in args[start:] if not a.startswith("-")), "")
+    return f"adb-exe {verb}".strip()
+
+
+def posix_basename(path):
+    return path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def _split_exit_status(raw):
+    head, sep, tail = raw.rpartition(_EXIT_MARKER)
+    if not sep:
+        return raw, 0
+    try:
+        exit_code = int(tail.strip() or 0)
+    except ValueError:
+        exit_code = 0
+    # 去掉包装命令中第一个 echo 额外输出的换行
+    if head.endswith("\n"):
+        head = head[:-1]
+    return head, exit_code
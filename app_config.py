@@ -0,0 +1,55 @@
+"""
+图形界面与命令行共用的路径查找，不依赖 tkinter。
+"""
+import os
+import shutil
+import sys
+
+SETTINGS_FILE = os.path.join(os.path.expanduser("~"), ".scrcpy_gui_v4.json")
+
+
+def get_executable_path(name):
+    # Windows 需要 .exe 后缀
+    if os.name == 'nt' and not name.endswith('.exe'):
+        name_with_exe = name + '.exe'
+    else:
+        name_with_exe = name
+
+    # 0. ARTOCARPUS_BIN_DIR 指定的文件夹优先 (基准测试用它换成假的 adb/scrcpy；Windows 上可以是 .cmd 脚本)
+    override_dir = os.environ.get('ARTOCARPUS_BIN_DIR')
+    if override_dir:
+        for candidate in (name_with_exe, name + '.cmd') if os.name == 'nt' else (name,):
+            override_path = os.path.join(override_dir, candidate)
+            if os.path.isfile(override_path):
+                return override_path
+
+    # 1. 检查打包后的路径 (PyInstaller)
+    if hasattr(sys, '_MEIPASS'):
+        bundled_path = os.path.join(sys._MEIPASS, name_with_exe if os.name == 'nt' else name)
+        if os.path.exists(bundled_path):
+            return bundled_path
+
+    # 2. 检查 AppImage 路径
+    appdir = os.environ.get('APPDIR')
+    if appdir:
+        bundled_path = os.path.join(appdir, 'usr/bin', name)
+        if os.path.exists(bundled_path) and os.access(bundled_path, os.X_OK):
+            return bundled_path
+
+    # 3. 检查当前脚本目录
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    local_path = os.path.join(script_dir, name_with_exe if os.name == 'nt' else name)
+    if os.path.exists(local_path):
+        return local_path
+
+    # 4. 检查系统 PATH（使用 shutil.which）
+    which_result = shutil.which(name_with_exe if os.name == 'nt' else name)
+    if which_result:
+        return which_result
+
+    # 5. 最后返回原名称（可能会失败，但会给出清晰的错误信息）
+    return name_with_exe if os.name == 'nt' else name
+
+
+def scrcpy_executable(settings):
+    return settings.get("scrcpy_path") or get_executable_path("scrcpy")
@@ -0,0 +1,205 @@
+"""
+打包流式传输：文件夹在设备端用 tar 打包/解包，数据通过 exec 通道连续传输，
+电脑端边接收边解包 (或边打包边发送)，两端都不产生临时归档文件。
+
+大量小文件时，逐个文件的 sync 往返延迟远大于传输本身，打包后整个目录只需一次往返；
+从设备拉取时，若设备支持 gzip 可以边传边压缩 (Wi-Fi 下带宽是瓶颈，值得用设备的 CPU 换带宽)。
+推送不压缩：经 adb server 的连接无法单独关闭设备端的 stdin，设备上的 gzip 收不到输入结束，
+会一直缓冲最后一段数据而不退出；未压缩的 tar 读到归档末尾的空块就会自行结束。
+
+进度以文件内容的字节数报告 progress(path, done, total)，与普通传输一致。
+"""
+import os
+import posixpath
+import re
+import shlex
+import stat
+import tarfile
+
+from adb_client import AdbError, posix_basename
+
+COPY_CHUNK = 256 * 1024
+_EXIT_MARKER = b"__ARTOCARPUS_TAR_EXIT__:"
+_EXIT_LINE = re.compile(re.escape(_EXIT_MARKER) + rb"(\d+)\s")
+_EXIT_TAIL = re.compile(re.escape(_EXIT_MARKER) + rb"(\d+)\s*$")
+_GZIP_PROBE = "echo x | gzip -c >/dev/null 2>&1 && echo yes"
+
+
+def device_supports_gzip(client, serial):
+    try:
+        return client.shell(serial, _GZIP_PROBE, timeout=10).strip().endswith("yes")
+    except AdbError:
+        return False
+
+
+def resolve_compression(client, serial, compression):
+    """compression: None、"gzip" 或 "auto" (仅 Wi-Fi 连接且设备支持时压缩)。"""
+    if compression == "auto":
+        from link_tuner import link_type
+        compression = "gzip" if link_type(serial) == "wifi" else None
+    if compression == "gzip" and not device_supports_gzip(client, serial):
+        return None
+    return compression
+
+
+def _safe_target(root, name):
+    # 拒绝绝对路径与 .. 等会写到目标目录之外的成员
+    target = os.path.normpath(os.path.join(root, *name.split("/")))
+    if os.path.commonpath([os.path.abspath(root), os.path.abspath(target)]) != os.path.abspath(root):
+        raise AdbError(f"归档中含有不安全的路径: {name}")
+    return target
+
+
+def _extract_member(tar, member, root, progress):
+    target = _safe_target(root, member.name)
+    if member.isdir():
+        os.makedirs(target, exist_ok=True)
+        return 0
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if member.issym():
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.symlink(member.linkname, target)
+        except OSError:
+            pass  # Windows 上普通用户可能无权创建符号链接，跳过
+        return 0
+    if not member.isfile():
+        return 0  # 设备文件、管道等不复制
+    source = tar.extractfile(member)
+    done = 0
+    with open(target, 'wb') as f:
+        while True:
+            chunk = source.read(COPY_CHUNK)
+            if not chunk:
+                break
+            f.write(chunk)
+            done += len(chunk)
+            if progress: progress(member.name, done, member.size)
+    if progress and not member.size:
+        progress(member.name, 0, 0)
+    os.utime(target, (member.mtime, member.mtime))
+    try:
+        os.chmod(target, member.mode & 0o777 | stat.S_IWUSR)
+    except OSError:
+        pass
+    return done
+
+
+def pull_archive(client, serial, remote_path, local_path, compression=None, progress=None):
+    """
+    行为与 AdbClient.pull 对文件夹的处理一致：local_path 为已存在的文件夹时放入其中的同名子文件夹。
+    返回复制的字节数。
+    """
+    mode = client.stat(serial, remote_path)[0]
+    if mode == 0:
+        raise AdbError(f"远程路径不存在: {remote_path}")
+    if not stat.S_ISDIR(mode):
+        raise AdbError(f"打包传输只支持文件夹: {remote_path}")
+    if os.path.isdir(local_path):
+        local_path = os.path.join(local_path, posix_basename(remote_path))
+    os.makedirs(local_path, exist_ok=True)
+    flags = "-czf" if compression == "gzip" else "-cf"
+    # exec 通道中 stderr 与 stdout 混在一起，必须丢弃 stderr，否则会破坏 tar 数据；
+    # tar 结束后在归档之后打印退出码：文件不可读或数据流恰好断在两个文件之间时，解包本身不会报错
+    command = f"tar {flags} - -C {shlex.quote(remote_path)} . 2>/dev/null; echo {_EXIT_MARKER.decode()}$?"
+    stream = client.open_exec(serial, command)
+    reader = _TailReader(stream)
+    total = 0
+    try:
+        with tarfile.open(fileobj=reader, mode="r|gz" if compression == "gzip" else "r|") as tar:
+            for member in tar:
+                total += _extract_member(tar, member, local_path, progress)
+        while reader.read(COPY_CHUNK):
+            pass  # 读完归档末尾的填充块，退出码在数据流的最后
+    except tarfile.TarError as e:
+        raise AdbError(f"解包失败 (设备上的 tar 可能不可用): {e}") from e
+    finally:
+        stream.close()
+    match = _EXIT_TAIL.search(reader.tail)
+    if not match:
+        raise AdbError("打包数据不完整 (连接中断?)，部分文件可能没有复制")
+    if match.group(1) != b"0":
+        raise AdbError(f"设备端打包失败 (退出码 {match.group(1).decode()}，可能有文件无法读取)")
+    return total
+
+
+class _TailReader:
+    # 透传读取，同时保留最后读到的一小段数据，用于在归档之后找到退出码
+    TAIL_SIZE = 64
+
+    def __init__(self, f):
+        self.f = f
+        self.tail = b""
+
+    def read(self, n=COPY_CHUNK):
+        chunk = self.f.read(n)
+        if chunk:
+            self.tail = (self.tail + chunk)[-self.TAIL_SIZE:]
+        return chunk
+
+
+class _ProgressReader:
+    def __init__(self, f, name, size, progress):
+        self.f, self.name, self.size, self.progress = f, name, size, progress
+        self.done = 0
+
+    def read(self, n=-1):
+        chunk = self.f.read(n)
+        self.done += len(chunk)
+        if self.progress and chunk:
+            self.progress(self.name, self.done, self.size)
+        return chunk
+
+
+def push_archive(client, serial, local_path, remote_path, progress=None):
+    """
+    行为与 AdbClient.push 对文件夹的处理一致：remote_path 为已存在的文件夹时放入其中的同名子文件夹。
+    返回复制的字节数。
+    """
+    if not os.path.isdir(local_path):
+        raise AdbError(f"打包传输只支持文件夹: {local_path}")
+    if stat.S_ISDIR(client.stat(serial, remote_path)[0]):
+        remote_path = posixpath.join(remote_path.rstrip('/'), os.path.basename(os.path.normpath(local_path)))
+    target = shlex.quote(remote_path)
+    # 设备端 tar 读到归档末尾的空块后退出，随后打印退出码，据此判断是否解包成功
+    command = f"mkdir -p {target} && tar -xf - -C {target} >/dev/null 2>&1; echo {_EXIT_MARKER.decode()}$?"
+    stream = client.open_exec(serial, command)
+    total = 0
+    try:
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+            for root, dirs, files in os.walk(local_path):
+                dirs.sort()
+                rel_root = os.path.relpath(root, local_path)
+                if rel_root != "." and not files and not dirs:
+                    tar.addfile(tar.gettarinfo(root, rel_root.replace(os.sep, "/")))  # 空文件夹也要建立
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    arcname = name if rel_root == "." else posixpath.join(rel_root.replace(os.sep, "/"), name)
+                    info = tar.gettarinfo(path, arcname)
+                    info.uid = info.gid = 0
+                    info.uname = info.gname = ""
+                    if info.isfile():
+                        with open(path, 'rb') as f:
+                            tar.addfile(info, _ProgressReader(f, path, info.size, progress))
+                        total += info.size
+                        if progress and not info.size:
+                            progress(path, 0, 0)
+                    else:
+                        tar.addfile(info)
+        stream.flush()
+        stream.end_input()
+        output = b""
+        while not _EXIT_LINE.search(output):
+            chunk = stream.read(4096)
+            if not chunk:
+                break
+            output += chunk
+    except ConnectionError as e:
+        raise AdbError(f"设备端提前结束了解包 (目标路径是否可写?): {e}") from e
+    finally:
+        stream.close()
+    match = _EXIT_LINE.search(output)
+    if not match or match.group(1) != b"0":
+        raise AdbError(f"设备端解包失败 (退出码 {match.group(1).decode() if match else '未知'})")
+    return total
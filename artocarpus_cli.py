@@ -0,0 +1,401 @@
+"""
+无界面的命令行入口，供信息亭主机或 SSH 会话使用：连接设备、启动并守护预设、传输文件。
+本模块及其依赖都不导入 tkinter/ttkthemes。
+
+    artocarpus devices
+    artocarpus connect 192.168.1.20 192.168.1.21
+    artocarpus discover 192.168.1.0/24 --ports 5555,5556
+    artocarpus tcpip                     # 所有 USB 设备切换到 Wi-Fi 并记住地址
+    artocarpus run --all-devices --connect-known
+    artocarpus run --profile wall1 --profile wall2
+    artocarpus run --all-devices --connect 192.168.1.20
+    artocarpus run --all-devices --record ./recordings --segment-minutes 10 --budget-gb 50
+    artocarpus run --all-devices --metrics-file /var/lib/node_exporter/textfile/artocarpus.prom
+    artocarpus pull -s SERIAL /sdcard/DCIM ./backup --sync
+    artocarpus push --all-devices ./media /sdcard/Movies
+    artocarpus pull -s 192.168.1.20:5555 /sdcard/Download ./dl --archive --compress
+    artocarpus resume                    # 继续中断的大文件传输
+    artocarpus broadcast --all-devices app.apk          # 所有设备安装同一个 APK
+    artocarpus broadcast --all-devices ./assets /sdcard/Download/
+    artocarpus screenshot --all-devices --interval 5 --out ./shots
+"""
+import argparse
+import datetime
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+from adb_client import AdbClient, AdbError
+from app_config import SETTINGS_FILE, get_executable_path, scrcpy_executable
+
+COMMANDS = ("devices", "connect", "disconnect", "discover", "tcpip", "run", "pull", "push", "broadcast", "screenshot", "resume")
+METRICS_INTERVAL = 15  # run --metrics-file 的写入间隔 (秒)
+
+
+def _log(message, level="INFO", serial=None):
+    stamp = datetime.datetime.now().strftime("%H:%M:%S")
+    print(f"{stamp} {level:<7} {message}", file=sys.stderr, flush=True)
+
+
+def _online_serials(client):
+    return sorted(serial for serial, state in client.devices() if state == "device")
+
+
+def _target_serials(client, args):
+    if args.all_devices:
+        return _online_serials(client)
+    if args.serial:
+        return args.serial
+    online = _online_serials(client)
+    if len(online) != 1:
+        raise AdbError(f"找到 {len(online)} 台已连接设备，请用 -s 指定设备或使用 --all-devices")
+    return online
+
+
+def _connect_all(client, addresses):
+    # 并行连接，多台离线设备的超时不会累加
+    results = {}
+    def target(address):
+        results[address] = client.connect(address)
+    threads = [threading.Thread(target=target, args=(address,), daemon=True) for address in addresses]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    for address in addresses:
+        ok, message = results.get(address, (False, "未完成"))
+        _log(f"连接 {address}: {message}", "INFO" if ok else "ERROR")
+    return all(results.get(address, (False,))[0] for address in addresses)
+
+
+def select_profiles(profiles, selectors):
+    """selectors 可以是预设名称、从 1 开始的序号 (也可写作 P1) 或设备序列号；为空时返回所有启用的预设。"""
+    if not selectors:
+        return [p for p in profiles if p.get("enabled") and p.get("serial")]
+    selected = []
+    for selector in selectors:
+        index = selector[1:] if selector[:1] in ("P", "p") else selector
+        matches = [p for p in profiles if selector in (p.get("name"), p.get("serial"))]
+        if not matches and index.isdigit() and 0 < int(index) <= len(profiles):
+            matches = [profiles[int(index) - 1]]
+        if not matches:
+            raise AdbError(f"未找到预设: {selector}")
+        selected.extend(p for p in matches if p not in selected)
+    return selected
+
+
+def cmd_devices(client, args):
+    for serial, state in client.devices():
+        print(f"{serial}\t{state}")
+    return 0
+
+
+def cmd_connect(client, args):
+    return 0 if _connect_all(client, args.address) else 1
+
+
+def cmd_disconnect(client, args):
+    for address in args.address:
+        client.disconnect(address)
+        _log(f"已断开 {address}")
+    return 0
+
+
+def cmd_discover(client, args):
+    from device_discovery import discover, parse_ports
+    ports = parse_ports(args.ports)
+    def on_event(kind, address, message):
+        if kind == "found": _log(f"发现 {address}")
+        elif kind == "mdns": _log(f"mDNS 发现 {address} ({message})")
+        elif kind == "connected": print(address, flush=True)
+        else: _log(f"{address}: {message}".lstrip(": "), "WARNING")
+    try:
+        results = discover(client, args.target, ports, use_mdns=not args.no_mdns, connect=not args.no_connect, probe_timeout=args.probe_timeout,
+                           connect_budget=args.budget, connect_timeout=args.connect_timeout, on_event=on_event)
+    except ValueError as e:
+        raise AdbError(str(e)) from e
+    if args.no_connect:
+        return 0
+    _log(f"成功连接 {sum(1 for ok, _ in results.values() if ok)} / {len(results)} 个地址")
+    return 0 if all(ok for ok, _ in results.values()) else 1
+
+
+def cmd_tcpip(client, args):
+    from settings_store import SettingsStore
+    from tcpip_provision import is_usb_serial, provision_all
+    serials = args.serial or [s for s in _online_serials(client) if is_usb_serial(s)]
+    if not serials:
+        raise AdbError("没有通过 USB 连接的设备")
+    def on_result(result):
+        if result.ok:
+            print(f"{result.serial}\t{result.address}", flush=True)
+        else:
+            _log(f"{result.serial}: {result.message}", "ERROR")
+    results = provision_all(client, serials, args.port, args.budget, on_result)
+    settings = SettingsStore(args.settings).load()
+    addresses = settings.get("tcpip_addresses", {})
+    addresses.update({r.serial: r.address for r in results if r.ok})
+    settings.update(tcpip_addresses=addresses)
+    settings.close()
+    _log(f"{sum(1 for r in results if r.ok)} / {len(results)} 台设备已通过 Wi-Fi 连接")
+    return 0 if all(r.ok for r in results) else 1
+
+
+def cmd_run(client, args):
+    from launch_orchestrator import LaunchOrchestrator, profile_command
+    from session_supervisor import SessionSupervisor
+
+    from settings_store import SettingsStore
+    settings = SettingsStore(args.settings).load()
+    addresses = list(args.connect)
+    if args.connect_known:
+        addresses += [a for a in settings.get("tcpip_addresses", {}).values() if a not in addresses]
+    if addresses:
+        _connect_all(client, addresses)
+    profiles = settings.profiles()
+    if args.all_devices:
+        targets = [(serial, settings.profile(serial) or {}) for serial in _online_serials(client)]
+    else:
+        targets = [(p["serial"], p) for p in select_profiles(profiles, args.profile) if p.get("serial")]
+    if not targets:
+        _log("没有可启动的设备。", "ERROR")
+        return 1
+
+    scrcpy_exec = args.scrcpy or scrcpy_executable(settings)
+    supervisor = SessionSupervisor(on_event=lambda session, message, level: _log(message, level, session.serial), max_restarts=args.max_restarts, metrics=client.metrics)
+    launcher = LaunchOrchestrator(max_concurrent=args.concurrency, stagger=args.stagger)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    launcher.launch([(serial, profile_command(scrcpy_exec, serial, profile.get("crop"))) for serial, profile in targets],
+                    lambda serial, cmd, ready: supervisor.start(serial, cmd, group="multi", auto_restart=not args.no_restart, ready=ready))
+    recorder = None
+    if args.record:
+        from segment_recorder import SegmentRecorder
+        recorder = SegmentRecorder(scrcpy_exec, args.record, args.segment_minutes * 60, args.segment_mb * 1024 ** 2, int(args.budget_gb * 1024 ** 3),
+                                   int(args.min_free_gb * 1024 ** 3), merge=args.merge, on_event=lambda serial, message, level: _log(message, level, serial))
+        for serial, profile in targets:
+            recorder.start(serial, profile.get("name") or serial, profile.get("crop"))
+    # 主线程只负责等待：收到信号或所有会话都已结束 (且不会再重启) 时退出
+    next_metrics_write = time.monotonic()
+    while not stop.wait(1.0):
+        if args.metrics_file and time.monotonic() >= next_metrics_write:
+            _write_metrics(client, args.metrics_file)
+            next_metrics_write = time.monotonic() + METRICS_INTERVAL
+        if not launcher.pending_count() and not any(s.active for s in supervisor.sessions()):
+            break
+    launcher.cancel_pending()
+    supervisor.stop_all()
+    if recorder:
+        # 等最后一个分段写完并完成转封装/拼接
+        recorder.stop_all()
+        recorder.wait()
+        recorder.close()
+    deadline = time.monotonic() + 5
+    while any(s.active for s in supervisor.sessions()) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if args.metrics_file:
+        _write_metrics(client, args.metrics_file)
+    return 0 if stop.is_set() or all(s.exit_code == 0 for s in supervisor.sessions()) else 1
+
+
+def _write_metrics(client, path):
+    try:
+        client.metrics.write_prometheus(path)
+    except OSError as e:
+        _log(f"写入统计文件失败: {e}", "WARNING")
+
+
+def _run_transfers(client, direction, args, source, dest):
+    from transfer_engine import TransferEngine
+
+    if args.archive and args.sync:
+        raise AdbError("--archive 与 --sync 不能同时使用")
+    serials = _target_serials(client, args)
+    engine = TransferEngine(client, max_workers=args.workers, per_device_workers=1)
+    mode = "archive" if args.archive else "sync" if args.sync else "copy"
+    compression = ("gzip" if args.compress == "always" else "auto") if args.compress else None
+    jobs = [engine.submit(direction, serial, source, dest if len(serials) == 1 or direction == "push" else _per_device_dir(dest, serial), mode, args.mirror_delete, args.hash, compression) for serial in serials]
+    return _wait_transfers(engine, jobs)
+
+
+def _wait_transfers(engine, jobs):
+    from transfer_engine import FINISHED_STATES, DONE, format_bytes, format_rate, format_eta
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not all(job.state in FINISHED_STATES for job in jobs):
+        if stop.wait(1.0):
+            for job in jobs: engine.cancel(job.id)
+        for job in jobs:
+            if job.state not in FINISHED_STATES and job.bytes_done:
+                percent = "" if job.percent is None else f" {job.percent:.0f}%"
+                _log(f"{job.serial}: {format_bytes(job.bytes_done)}{percent} {format_rate(job.rate)} 剩余 {format_eta(job.eta)}", serial=job.serial)
+    for job in jobs:
+        if job.state == DONE:
+            _log(f"{job.serial}: 完成 {job.source} -> {job.dest} {job.summary}".rstrip())
+        else:
+            _log(f"{job.serial}: {job.state} {job.error}", "ERROR")
+    return 0 if all(job.state == DONE for job in jobs) else 1
+
+
+def cmd_broadcast(client, args):
+    from broadcast_push import DEFAULT_REMOTE_DIR, broadcast
+    from transfer_engine import format_bytes
+
+    serials = _target_serials(client, args)
+    install = args.install or (args.remote is None and args.local.lower().endswith(".apk"))
+    def on_result(result):
+        _log(f"{result.serial}: {'完成' if result.ok else '失败'} {result.message}".rstrip(), "INFO" if result.ok else "ERROR", serial=result.serial)
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    report = broadcast(client, serials, args.local, args.remote or DEFAULT_REMOTE_DIR, install, {"usb": args.usb, "wifi": args.wifi},
+                       on_result=on_result, stop_event=stop)
+    for line in report.format_lines(format_bytes):
+        print(line)
+    return 0 if len(report.succeeded) == len(report.results) else 1
+
+
+def cmd_screenshot(client, args):
+    from screen_capture import CapturePipeline
+
+    serials = _target_serials(client, args)
+    def on_event(kind, serial, detail):
+        if kind == "saved": _log(f"{serial}: {detail}", serial=serial)
+        elif kind == "error": _log(f"{serial}: 截图失败 {detail}", "ERROR", serial=serial)
+    pipeline = CapturePipeline(client, args.out, workers=args.workers, dedupe=not args.no_dedupe, on_event=on_event)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    if args.interval:
+        pipeline.start_repeating(lambda: serials, args.interval)
+        while not stop.wait(1.0):
+            pass
+    else:
+        pipeline.capture_once(serials)
+    pipeline.close()
+    pipeline.wait_idle()
+    stats = pipeline.stats
+    _log(f"保存 {stats.saved} 张，丢弃重复画面 {stats.duplicates} 张，设备忙跳过 {stats.skipped} 次，失败 {stats.failed} 次")
+    return 0 if not stats.failed else 1
+
+
+def cmd_resume(client, args):
+    from transfer_engine import TransferEngine
+
+    engine = TransferEngine(client, max_workers=args.workers, per_device_workers=1)
+    pending = engine.journal.incomplete()
+    if args.list or not pending:
+        for _key, entry in pending:
+            print(f"{entry['serial']}\t{entry['direction']}\t{entry['source']} -> {entry['dest']}\t{entry.get('offset', 0)}/{entry.get('size', 0)}")
+        return 0
+    jobs = engine.resume_incomplete(set(_online_serials(client)))
+    if len(jobs) < len(pending):
+        _log(f"{len(pending) - len(jobs)} 个未完成传输的设备未连接，已跳过", "WARNING")
+    return _wait_transfers(engine, jobs)
+
+
+def _per_device_dir(dest, serial):
+    # 与图形界面一致：多台设备拉取到同一目录时，每台设备使用单独的子目录
+    return os.path.join(dest, re.sub(r'[^\w.-]', '_', serial))
+
+
+def cmd_pull(client, args):
+    return _run_transfers(client, "pull", args, args.remote, args.local)
+
+
+def cmd_push(client, args):
+    return _run_transfers(client, "push", args, args.local, args.remote)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="artocarpus", description="Artocarpus 命令行模式 (不启动图形界面)")
+    parser.add_argument("--adb", help="adb 可执行文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("devices", help="列出设备")
+    p = sub.add_parser("connect", help="通过 Wi-Fi 连接设备")
+    p.add_argument("address", nargs="+")
+    p = sub.add_parser("disconnect", help="断开 Wi-Fi 设备")
+    p.add_argument("address", nargs="+")
+    p = sub.add_parser("discover", help="扫描网段与 mDNS 并批量连接 adb over TCP 设备；成功连接的地址输出到标准输出")
+    p.add_argument("target", nargs="*", help="网段 (192.168.1.0/24)、范围 (192.168.1.10-60) 或地址，可带 :端口")
+    p.add_argument("--ports", default="5555", help="默认端口，可写 5555,5556 或 5555-5585")
+    p.add_argument("--no-mdns", action="store_true", help="不查询 adb mdns services")
+    p.add_argument("--no-connect", action="store_true", help="只扫描不连接")
+    p.add_argument("--budget", type=int, default=8, help="同时进行的 adb connect 数量")
+    p.add_argument("--probe-timeout", type=float, default=0.3, help="单个端口的探测超时 (秒)")
+    p.add_argument("--connect-timeout", type=float, default=5.0, help="单个 adb connect 的超时 (秒)")
+
+    p = sub.add_parser("tcpip", help="并行把 USB 设备切换到 TCP/IP 并通过 Wi-Fi 连接；输出 序列号<TAB>地址")
+    p.add_argument("-s", "--serial", action="append", default=[], help="设备序列号，可重复；默认为所有 USB 设备")
+    p.add_argument("--port", type=int, default=5555)
+    p.add_argument("--budget", type=int, default=16, help="同时处理的设备数量")
+    p.add_argument("--settings", default=SETTINGS_FILE, help="设置文件路径")
+
+    p = sub.add_parser("run", help="启动预设并在异常退出时自动重启，直到收到 Ctrl+C/SIGTERM")
+    p.add_argument("--profile", action="append", default=[], help="预设名称、序号或设备序列号，可重复；默认为所有启用的预设")
+    p.add_argument("--all-devices", action="store_true", help="为所有已连接设备启动 scrcpy")
+    p.add_argument("--connect", action="append", default=[], metavar="ADDRESS", help="启动前先连接的地址，可重复")
+    p.add_argument("--connect-known", action="store_true", help="启动前先连接 tcpip 命令记住的所有地址")
+    p.add_argument("--no-restart", action="store_true", help="异常退出时不自动重启")
+    p.add_argument("--max-restarts", type=int, default=10, help="连续快速失败多少次后不再自动重启")
+    p.add_argument("--concurrency", type=int, default=3, help="同时启动的 scrcpy 数量")
+    p.add_argument("--stagger", type=float, default=1.0, help="相邻两次启动的间隔 (秒)")
+    p.add_argument("--record", metavar="DIR", help="同时为每台设备分段录制到此文件夹 (每个预设一个子文件夹)")
+    p.add_argument("--segment-minutes", type=int, default=10, help="每个录制分段的最长时间 (分钟)")
+    p.add_argument("--segment-mb", type=int, default=1024, help="每个录制分段的最大大小 (MB)")
+    p.add_argument("--budget-gb", type=float, default=20, help="所有录制分段合计占用的磁盘上限，超出时删除最旧的分段")
+    p.add_argument("--min-free-gb", type=float, default=2, help="磁盘剩余空间低于此值且无分段可删时停止录制")
+    p.add_argument("--merge", action="store_true", help="停止录制后把每台设备的分段拼接为一个文件 (需要 ffmpeg)")
+    p.add_argument("--metrics-file", metavar="PATH", help=f"每 {METRICS_INTERVAL} 秒把 adb/scrcpy 调用耗时以 Prometheus 文本格式写入此文件 (node exporter textfile collector)")
+    p.add_argument("--scrcpy", help="scrcpy 可执行文件路径")
+    p.add_argument("--settings", default=SETTINGS_FILE, help="设置文件路径")
+
+    for name, first, second in (("pull", "remote", "local"), ("push", "local", "remote")):
+        p = sub.add_parser(name, help="从手机复制到电脑" if name == "pull" else "从电脑复制到手机")
+        p.add_argument(first); p.add_argument(second)
+        p.add_argument("-s", "--serial", action="append", default=[], help="设备序列号，可重复")
+        p.add_argument("--all-devices", action="store_true")
+        p.add_argument("--sync", action="store_true", help="增量同步，只传输变化的文件")
+        p.add_argument("--mirror-delete", action="store_true", help="删除目标端多余的文件 (需 --sync)")
+        p.add_argument("--hash", action="store_true", help="修改时间不同时校验哈希 (需 --sync)")
+        p.add_argument("--archive", action="store_true", help="打包流式传输文件夹 (设备端 tar)，适合大量小文件；与 --sync 互斥")
+        p.add_argument("--compress", nargs="?", const="auto", choices=("auto", "always"), help="打包拉取时用 gzip 压缩 (需 --archive)；auto 只在 Wi-Fi 连接时压缩")
+        p.add_argument("--workers", type=int, default=4)
+    p = sub.add_parser("broadcast", help="把同一个文件/文件夹同时推送到多台设备，或在多台设备上安装 APK；输出每台设备的结果")
+    p.add_argument("local"); p.add_argument("remote", nargs="?", help="设备上的目标路径，默认 /sdcard/Download/；省略且 local 为 .apk 时安装")
+    p.add_argument("-s", "--serial", action="append", default=[], help="设备序列号，可重复")
+    p.add_argument("--all-devices", action="store_true")
+    p.add_argument("--install", action="store_true", help="安装 APK")
+    p.add_argument("--usb", type=int, default=6, help="同时传输的 USB 设备数")
+    p.add_argument("--wifi", type=int, default=3, help="同时传输的 Wi-Fi 设备数")
+    p = sub.add_parser("screenshot", help="所有指定设备并发截图；带 --interval 时持续截图直到 Ctrl+C")
+    p.add_argument("-s", "--serial", action="append", default=[], help="设备序列号，可重复")
+    p.add_argument("--all-devices", action="store_true")
+    p.add_argument("--out", default="screenshots", help="保存文件夹 (每台设备一个子文件夹)")
+    p.add_argument("--interval", type=float, default=0, help="连续截图的间隔 (秒)")
+    p.add_argument("--workers", type=int, default=4, help="PNG 编码与写盘的线程数")
+    p.add_argument("--no-dedupe", action="store_true", help="保留与上一张完全相同的截图")
+    p = sub.add_parser("resume", help="从断点继续上次中断的大文件传输 (需设备已连接)")
+    p.add_argument("--list", action="store_true", help="只列出未完成的传输")
+    p.add_argument("--workers", type=int, default=4)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    client = AdbClient(args.adb or get_executable_path("adb"))
+    try:
+        return globals()[f"cmd_{args.command}"](client, args)
+    except (AdbError, OSError) as e:
+        _log(str(e), "ERROR")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+启动时间基准测试：每次都启动一个全新的 Python 进程，测量从进程创建到窗口首次绘制的时间，
+以及模块导入、界面构建、主题引擎加载各自的耗时；同时测量命令行模式 (--help) 的启动时间。
+
+    python benchmarks/bench_startup.py --runs 10
+    sudo python benchmarks/bench_startup.py --cold   # Linux 上每次运行前清空页缓存
+
+子进程使用临时的 HOME，不会读取或修改真实的设置与日志。结果以 JSON 输出到标准输出。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    # 在子进程中运行：parent_start 由父进程通过环境变量传入 (time.time())
+    parent_start = float(os.environ["ARTOCARPUS_BENCH_START"])
+    sys.path.insert(0, REPO_DIR)
+    t0 = time.perf_counter()
+    import scrcpy_gui
+    t1 = time.perf_counter()
+    root = scrcpy_gui.tk.Tk()
+    gui = scrcpy_gui.ScrcpyGUI(root, initial_theme="arc", initial_lang="zh")
+    t2 = time.perf_counter()
+    # 处理完所有挂起的绘制事件，近似为首次绘制完成
+    while not root.winfo_viewable():
+        root.update()
+    root.update_idletasks()
+    first_paint = time.time()
+    t3 = time.perf_counter()
+    gui._load_theme_engine()
+    root.update_idletasks()
+    t4 = time.perf_counter()
+    print(json.dumps({
+        "first_paint_ms": (first_paint - parent_start) * 1000,
+        "import_ms": (t1 - t0) * 1000,
+        "construct_ms": (t2 - t1) * 1000,
+        "paint_ms": (t3 - t2) * 1000,
+        "theme_engine_ms": (t4 - t3) * 1000,
+    }), flush=True)
+    os._exit(0)  # 不等待设备监视等后台线程
+
+
+def drop_caches():
+    if sys.platform.startswith("linux") and os.geteuid() == 0:
+        subprocess.run(["sync"], check=False)
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    return False
+
+
+def run_once(args, env, cmd):
+    if args.cold:
+        drop_caches()
+    env = dict(env, ARTOCARPUS_BENCH_START=repr(time.time()))
+    start = time.perf_counter()
+    result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=60)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"退出码 {result.returncode}")
+    return elapsed, result.stdout
+
+
+def summarize(samples):
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold", action="store_true", help="每次运行前清空页缓存 (需要 Linux 与 root 权限)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    report = {"python": sys.version.split()[0], "platform": sys.platform, "runs": args.runs, "cold": args.cold}
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        cli_samples = [run_once(args, env, [sys.executable, os.path.join(REPO_DIR, "artocarpus_cli.py"), "--help"])[0] for _ in range(args.runs)]
+        report["cli_help_ms"] = summarize(cli_samples)
+        if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+            report["gui"] = {"skipped": "没有 DISPLAY，可用 xvfb-run 运行"}
+        else:
+            gui_samples = []
+            for _ in range(args.runs):
+                _elapsed, stdout = run_once(args, env, [sys.executable, os.path.abspath(__file__), "--child"])
+                gui_samples.append(json.loads(stdout.strip().splitlines()[-1]))
+            report["gui"] = {key: summarize([s[key] for s in gui_samples]) for key in gui_samples[0]}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+性能基准测试套件：在假 adb server 与假 adb/scrcpy 可执行文件 (fake_devices.py) 上测量常用操作的耗时，
+结果以 JSON 输出到标准输出，可与以前保存的结果对比。
+
+    python benchmarks/bench_suite.py --runs 5 > before.json
+    python benchmarks/bench_suite.py --runs 5 --compare before.json > after.json
+    python benchmarks/bench_suite.py --devices 20 --latency 0.01 --listing 50000 --only remote_listing
+    xvfb-run python benchmarks/bench_suite.py         # 同时测量界面：设备列表刷新、文件浏览器、日志、多设备启动
+
+不带界面的场景直接调用底层模块；界面场景在子进程中创建完整的 ScrcpyGUI 测量
+(需要 DISPLAY，没有时跳过)。所有子进程使用临时的 HOME，不会读取或修改真实的设置与日志，
+并通过 ANDROID_ADB_SERVER_PORT 与 ARTOCARPUS_BIN_DIR 指向假的 adb server 与可执行文件。
+
+每个场景的结果含 min/median/max (毫秒)，吞吐量类场景另有对应的中位数 (MB/s、条/秒)。
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_startup import summarize
+from fake_devices import DEFAULT_CONFIG, serials, write_bin
+
+SCHEMA_VERSION = 1
+HEADLESS_SCENARIOS = ("device_list", "remote_listing", "pull_throughput", "push_throughput", "binary_transfer", "log_flood", "multi_launch")
+GUI_SCENARIOS = ("gui_refresh_device_list", "gui_phone_browser", "gui_pc_browser", "gui_log_flood", "gui_multi_launch")
+LOG_MESSAGES = 20000
+LOG_THREADS = 8
+
+
+class FakeEnvironment:
+    """临时 HOME、假可执行文件与独立进程中的假 adb server；with 结束时全部清理。"""
+
+    def __init__(self, config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.serials = serials(self.config)
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.home = os.path.join(self._tmp.name, "home")
+        os.makedirs(self.home)
+        self.bin_dir = os.path.join(self._tmp.name, "bin")
+        self.bin = write_bin(self.bin_dir, self.config)
+        cmd = [sys.executable, os.path.join(BENCH_DIR, "fake_devices.py"), "serve"]
+        for key, value in self.config.items():
+            cmd += ["--" + key.replace("_", "-"), str(value)]
+        self._server = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.port = int(self._server.stdout.readline())
+        self.env = dict(os.environ, HOME=self.home, USERPROFILE=self.home, ANDROID_ADB_SERVER_PORT=str(self.port), ARTOCARPUS_BIN_DIR=self.bin_dir)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.stdin.close()
+        try:
+            self._server.wait(5)
+        except subprocess.TimeoutExpired:
+            self._server.kill()
+        self._tmp.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self._tmp.name, *parts)
+
+    def client(self, **kwargs):
+        from adb_client import AdbClient
+        return AdbClient(self.bin["adb"], port=kwargs.pop("port", self.port), **kwargs)
+
+
+def measure(runs, func, setup=None):
+    """运行 runs 次，返回每次的毫秒数；setup() 在每次计时之前调用，不计入耗时。"""
+    samples = []
+    for _ in range(runs):
+        if setup: setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def result(samples, **extra):
+    return dict(summarize(samples), samples=len(samples), **extra)
+
+
+def rate(amount, samples, unit_scale=1.0):
+    return amount / unit_scale / (statistics.median(samples) / 1000)
+
+
+def _unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- 不带界面的场景 ---
+
+def bench_device_list(env, runs):
+    client = env.client()
+    samples = measure(runs, client.devices)
+    return result(samples, devices=len(client.devices()))
+
+
+def bench_remote_listing(env, runs):
+    from remote_cache import RemoteListingCache
+    cache = RemoteListingCache(env.client())
+    serial = env.serials[0]
+    entries = []
+    samples = measure(runs, lambda: entries.append(len(cache.get(serial, "/sdcard/huge/"))), lambda: cache.invalidate(serial))
+    return result(samples, entries=entries[-1], entries_per_s=rate(entries[-1], samples))
+
+
+def bench_pull_throughput(env, runs):
+    client = env.client()
+    target = env.path("pulled.bin")
+    samples = measure(runs, lambda: client.pull_file(env.serials[0], "/sdcard/big.bin", target))
+    size = os.path.getsize(target)
+    return result(samples, bytes=size, mb_s=rate(size, samples, 1024 * 1024))
+
+
+def bench_push_throughput(env, runs):
+    client = env.client()
+    source = env.path("push.bin")
+    size = int(env.config["file_mb"] * 1024 * 1024)
+    with open(source, 'wb') as f:
+        f.write(os.urandom(1024 * 1024) * (size // (1024 * 1024)) + os.urandom(size % (1024 * 1024)))
+    samples = measure(runs, lambda: client.push_file(env.serials[0], source, "/sdcard/Download/push.bin"))
+    return result(samples, bytes=size, mb_s=rate(size, samples, 1024 * 1024))
+
+
+def bench_binary_transfer(env, runs):
+    # adb server 不可达时的退路：解析 adb 可执行文件大量的进度输出
+    client = env.client(port=_unused_port())
+    target = env.path("binary_pulled.bin")
+    size = int(env.config["file_mb"] * 1024 * 1024)
+    events = []
+    samples = measure(runs, lambda: client.run_binary_transfer(["-s", env.serials[0], "pull", "/sdcard/big.bin", target], "/sdcard/big.bin", size,
+                                                               lambda _path, done, _total: events.append(done)), events.clear)
+    return result(samples, progress_events=len(events), progress_lines=env.config["progress_lines"])
+
+
+def bench_log_flood(env, runs):
+    # 多个工作线程同时写日志，另一个线程像界面一样定时批量取出
+    from log_sink import LogSink
+    def flood():
+        sink = LogSink(log_file=env.path("logs", "flood.log"))
+        per_thread = LOG_MESSAGES // LOG_THREADS
+        def drain():
+            # 待显示队列有上限，写入过快时会丢弃记录，因此以最后的结束标记判断取完，而不是数条数
+            while not any(record.message == "__bench_end__" for record in sink.drain()):
+                time.sleep(0.01)
+        drainer = threading.Thread(target=drain)
+        drainer.start()
+        workers = [threading.Thread(target=lambda n=n: [sink.emit(f"{n} 第 {i} 条消息", "INFO", env.serials[n % len(env.serials)]) for i in range(per_thread)])
+                   for n in range(LOG_THREADS)]
+        for t in workers: t.start()
+        for t in workers: t.join()
+        sink.emit("__bench_end__")
+        drainer.join()
+        sink.close()
+    samples = measure(runs, flood)
+    return result(samples, messages=LOG_MESSAGES, messages_per_s=rate(LOG_MESSAGES, samples))
+
+
+def bench_multi_launch(env, runs, concurrency=3, stagger=0.0):
+    # 所有设备的 scrcpy 从排队到画面建立 (假 scrcpy 打印 Renderer:) 的总时间
+    from launch_orchestrator import LaunchOrchestrator, profile_command
+    from session_supervisor import RUNNING, SessionSupervisor
+    supervisor = SessionSupervisor()
+    def launch():
+        launcher = LaunchOrchestrator(max_concurrent=concurrency, stagger=stagger)
+        launcher.launch([(serial, profile_command(env.bin["scrcpy"], serial)) for serial in env.serials],
+                        lambda serial, cmd, ready: supervisor.start(serial, cmd, group="multi", ready=ready))
+        _wait_for(lambda: sum(s.state == RUNNING for s in supervisor.sessions()) == len(env.serials), 60)
+    def reset():
+        supervisor.stop_all()
+        _wait_for(lambda: not any(s.active for s in supervisor.sessions()), 30)
+        supervisor.forget_finished()
+    samples = measure(runs, launch, reset)
+    reset()
+    return result(samples, devices=len(env.serials), concurrency=concurrency, stagger=stagger)
+
+
+def _wait_for(condition, timeout, poll=None):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            raise TimeoutError("等待超时")
+        if poll: poll()
+        else: time.sleep(0.002)
+
+
+# --- 界面场景 (在子进程中运行) ---
+
+def gui_child(config):
+    import scrcpy_gui
+    from app_config import get_executable_path
+    from session_supervisor import RUNNING
+    runs, expected = config["runs"], serials(config)
+    root = scrcpy_gui.tk.Tk()
+    gui = scrcpy_gui.ScrcpyGUI(root, initial_theme="arc", initial_lang="zh")
+    pump = root.update
+    _wait_for(lambda: len(gui.online_devices) == len(expected), 30, pump)
+    results = {}
+    only = set(config.get("only") or GUI_SCENARIOS)
+
+    if "gui_refresh_device_list" in only:
+        def refresh():
+            gui.refresh_device_list()
+            _wait_for(lambda: len(gui.online_devices) == len(expected), 30, pump)
+        results["gui_refresh_device_list"] = result(measure(runs, refresh, gui.online_devices.clear), devices=len(expected))
+
+    if "gui_phone_browser" in only:
+        def phone_browser():
+            browser = scrcpy_gui.PhoneFileBrowser(root, gui.remote_cache, expected[0], lambda path: None)
+            browser._populate_list("/sdcard/huge/")
+            _wait_for(lambda: len(browser.tree.get_children()) == config["listing"], 60, pump)
+            browser.destroy()
+        results["gui_phone_browser"] = result(measure(runs, phone_browser, lambda: gui.remote_cache.invalidate(expected[0])), entries=config["listing"])
+
+    if "gui_pc_browser" in only:
+        big_dir = os.path.join(os.path.expanduser("~"), "huge")
+        os.makedirs(big_dir, exist_ok=True)
+        for i in range(config["listing"]):
+            open(os.path.join(big_dir, f"file_{i:06d}.jpg"), 'wb').close()
+        def pc_browser():
+            browser = scrcpy_gui.PCFileBrowser(root, lambda path: None)
+            browser._populate_list(big_dir)
+            _wait_for(lambda: len(browser.tree.get_children()) == config["listing"], 60, pump)
+            browser.destroy()
+        results["gui_pc_browser"] = result(measure(runs, pc_browser), entries=config["listing"])
+
+    if "gui_log_flood" in only:
+        def log_flood():
+            per_thread = LOG_MESSAGES // LOG_THREADS
+            workers = [threading.Thread(target=lambda n=n: [gui.log_status(f"{n} 第 {i} 条消息", serial=expected[n % len(expected)]) for i in range(per_thread)])
+                       for n in range(LOG_THREADS)]
+            for t in workers: t.start()
+            for t in workers: t.join()
+            gui.log_status("__bench_end__")
+            _wait_for(lambda: "__bench_end__" in gui.txt_status.get("end-2l", "end-1c"), 120, pump)
+        samples = measure(runs, log_flood)
+        results["gui_log_flood"] = result(samples, messages=LOG_MESSAGES, messages_per_s=rate(LOG_MESSAGES, samples))
+
+    if "gui_multi_launch" in only:
+        gui.notebook.select(gui.tab2_frame); gui._build_selected_tab()
+        gui._set_profiles([{"enabled": True, "serial": serial} for serial in expected])
+        gui.entry_scrcpy_path.delete(0, scrcpy_gui.tk.END); gui.entry_scrcpy_path.insert(0, get_executable_path("scrcpy"))
+        def launch():
+            gui.connect_multi_devices()
+            _wait_for(lambda: sum(s.state == RUNNING for s in gui.supervisor.sessions()) == len(expected), 60, pump)
+        def reset():
+            gui.disconnect_all_multi()
+            _wait_for(lambda: not any(s.active for s in gui.supervisor.sessions()), 30, pump)
+            gui.supervisor.forget_finished()
+        samples = measure(runs, launch, reset)
+        reset()
+        results["gui_multi_launch"] = result(samples, devices=len(expected), concurrency=gui.launcher.max_concurrent, stagger=gui.launcher.stagger)
+
+    print(json.dumps(results), flush=True)
+    os._exit(0)  # 不等待设备监视等后台线程
+
+
+def run_gui(env, config, only):
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        return {name: {"skipped": "没有 DISPLAY，可用 xvfb-run 运行"} for name in only}
+    child_config = dict(config, only=list(only))
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--gui-child"], env=dict(env.env, ARTOCARPUS_BENCH_CONFIG=json.dumps(child_config)),
+                          capture_output=True, text=True, timeout=1800)
+    if proc.returncode != 0:
+        return {name: {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"退出码 {proc.returncode}"} for name in only}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_DIR, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline):
+    """逐项比较两份结果的中位数，返回可读的文本行；变慢为正数。"""
+    lines = [f"对比 {baseline.get('revision') or '基准'} → {report.get('revision') or '当前'} (中位数，毫秒)"]
+    if baseline.get("config") != report["config"]:
+        lines.append("  注意：两次运行的假设备参数不同，结果不能直接比较")
+    for name, current in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or "median" not in old or "median" not in current:
+            continue
+        change = (current["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0.0
+        lines.append(f"  {name:<26} {old['median']:>10.1f} → {current['median']:>10.1f}  {change:+6.1f}%")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", action="append", default=[], choices=HEADLESS_SCENARIOS + GUI_SCENARIOS, help="只运行指定场景，可重复")
+    parser.add_argument("--no-gui", action="store_true", help="跳过界面场景")
+    parser.add_argument("--compare", metavar="JSON", help="与以前保存的结果对比，差异输出到标准错误")
+    parser.add_argument("--output", metavar="JSON", help="结果同时写入此文件")
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=value)
+    parser.add_argument("--gui-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.gui_child:
+        return gui_child(json.loads(os.environ["ARTOCARPUS_BENCH_CONFIG"]))
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    selected = args.only or list(HEADLESS_SCENARIOS + GUI_SCENARIOS)
+    report = {"schema": SCHEMA_VERSION, "revision": git_revision(), "python": sys.version.split()[0], "platform": sys.platform,
+              "runs": args.runs, "config": config, "results": {}}
+    with FakeEnvironment(config) as env:
+        # 被测模块在导入时读取 HOME (日志、设置路径)，与子进程一样使用临时目录
+        os.environ.update(HOME=env.home, USERPROFILE=env.home)
+        for name in (n for n in HEADLESS_SCENARIOS if n in selected):
+            try:
+                report["results"][name] = globals()["bench_" + name](env, args.runs)
+            except Exception as e:
+                report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name}: {report['results'][name]}", file=sys.stderr, flush=True)
+        gui_selected = [n for n in GUI_SCENARIOS if n in selected]
+        if gui_selected and not args.no_gui:
+            report["results"].update(run_gui(env, dict(config, runs=args.runs), gui_selected))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            for line in compare(report, json.load(f)):
+                print(line, file=sys.stderr)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+"""
+基准测试用的假设备：一个实现 adb host 协议的假 adb server，以及可以放进 ARTOCARPUS_BIN_DIR 的假 adb/scrcpy 可执行文件。
+
+    python benchmarks/fake_devices.py serve --devices 10 --latency 0.005 --listing 20000
+    python benchmarks/fake_devices.py write-bin ./fake_bin --config fake.json
+
+假 server 在独立的进程中运行 (不与被测代码争抢 GIL)，启动后在标准输出打印一行监听端口。
+每台设备的文件系统相同且只存在于内存中：
+    /sdcard/big.bin          大小为 --file-mb 的文件，pull 时按 --bandwidth 限速输出
+    /sdcard/huge/            --listing 个文件的超大目录
+    /sdcard/Download/        push 的目标，写入的数据直接丢弃 (只记录大小)
+每个 adb 请求先等待 --latency 秒，模拟 USB/Wi-Fi 的往返延迟。
+shell 只认识少数命令 (getprop ro.build.version.sdk、stat -c %s、echo、exit N)，其余命令没有输出且退出码为 0。
+
+假 adb 可执行文件支持 start-server/devices/connect/shell/push/pull，push/pull 按 adb 的格式
+输出大量进度行；假 scrcpy 等待 scrcpy_startup 秒后打印 Renderer:/Texture: (视为画面已建立)，
+直到收到 SIGTERM/SIGINT 或到达 --time-limit，指定 --record 时持续写入录制文件。
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = {
+    "devices": 4,  # 设备数量，序列号为 fake-0001 起
+    "latency": 0.002,  # 秒；每个请求的延迟
+    "listing": 10000,  # /sdcard/huge/ 中的文件数
+    "file_mb": 64,  # /sdcard/big.bin 的大小
+    "bandwidth_mb": 0.0,  # MB/s；pull 的限速，0 为不限速
+    "scrcpy_startup": 0.3,  # 秒；假 scrcpy 建立画面所需的时间
+    "progress_lines": 2000,  # 假 adb push/pull 输出的进度行数
+    "sync_v2": 1,  # 1 时报告 stat_v2/ls_v2 特性并支持 STA2/LIS2 (64 位文件大小)，0 时只有 v1
+}
+_EXIT_MARKER = "__ARTOCARPUS_EXIT__:"
+_BLOCK = bytes(range(256)) * 256  # 64 KiB，RECV 的数据块
+_DIR_MODE, _FILE_MODE = stat.S_IFDIR | 0o771, stat.S_IFREG | 0o660
+_MTIME = 1700000000
+_STAT_V2 = struct.Struct("<IQQIIIIQqqq")
+
+
+def serials(config):
+    return [f"fake-{i + 1:04d}" for i in range(config["devices"])]
+
+
+class FakeFilesystem:
+    """所有设备共用的目录结构；推送的文件按 (序列号, 路径) 记录大小。"""
+
+    def __init__(self, config):
+        self.file_size = int(config["file_mb"] * 1024 * 1024)
+        self.listing = config["listing"]
+        self.dirs = {"/", "/sdcard", "/sdcard/huge", "/sdcard/Download", "/sdcard/DCIM"}
+        self.pushed = {}
+        self._lock = threading.Lock()
+
+    def stat(self, serial, path):
+        path = path.rstrip('/') or '/'
+        if path in self.dirs:
+            return _DIR_MODE, 0
+        if path == "/sdcard/big.bin":
+            return _FILE_MODE, self.file_size
+        if path.startswith("/sdcard/huge/file_"):
+            index = path[len("/sdcard/huge/file_"):].split(".")[0]
+            if index.isdigit() and int(index) < self.listing:
+                return _FILE_MODE, 1000 + int(index)
+        with self._lock:
+            size = self.pushed.get((serial, path))
+        return (_FILE_MODE, size) if size is not None else (0, 0)
+
+    def listdir(self, serial, path):
+        path = path.rstrip('/') or '/'
+        if path == "/sdcard/huge":
+            return [(f"file_{i:06d}.jpg", _FILE_MODE, 1000 + i) for i in range(self.listing)]
+        if path == "/sdcard":
+            return [("huge", _DIR_MODE, 0), ("Download", _DIR_MODE, 0), ("DCIM", _DIR_MODE, 0), ("big.bin", _FILE_MODE, self.file_size)]
+        if path in self.dirs:
+            with self._lock:
+                return [(p.rsplit("/", 1)[1], _FILE_MODE, size) for (s, p), size in self.pushed.items() if s == serial and p.rsplit("/", 1)[0] == path]
+        return None
+
+    def record_push(self, serial, path, size):
+        with self._lock:
+            self.pushed[(serial, path)] = size
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.config = self.server.config
+        self.fs = self.server.fs
+        if not hasattr(self.server.scratch, "buffer"):
+            self.server.scratch.buffer = bytearray(256 * 1024)
+
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def _skip(self, size):
+        buffer = self.server.scratch.buffer
+        while size > 0:
+            got = self.request.recv_into(buffer, min(size, len(buffer)))
+            if not got:
+                raise EOFError
+            size -= got
+
+    def _request(self):
+        payload = self._read(int(self._read(4), 16)).decode('utf-8', 'replace')
+        if self.config["latency"]:
+            time.sleep(self.config["latency"])
+        return payload
+
+    def _okay(self, payload=None):
+        self.request.sendall(b"OKAY" + (b"" if payload is None else b"%04x" % len(payload) + payload))
+
+    def _fail(self, message):
+        message = message.encode('utf-8')
+        self.request.sendall(b"FAIL" + b"%04x" % len(message) + message)
+
+    def handle(self):
+        try:
+            request = self._request()
+            if request == "host:version":
+                self._okay(b"0029")
+            elif request in ("host:devices", "host:devices-l"):
+                self._okay("".join(f"{s}\tdevice\n" for s in self.server.serials).encode())
+            elif request == "host:track-devices":
+                self._okay()
+                listing = "".join(f"{s}\tdevice\n" for s in self.server.serials).encode()
+                self.request.sendall(b"%04x" % len(listing) + listing)
+                while self.request.recv(1024):
+                    pass
+            elif request.startswith("host:connect:"):
+                self._okay(f"connected to {request[13:]}".encode())
+            elif request.startswith("host:disconnect:"):
+                self._okay(f"disconnected {request[16:]}".encode())
+            elif request.startswith("host-serial:") and request.endswith(":features"):
+                features = "shell_v2,cmd" + (",stat_v2,ls_v2" if self.config["sync_v2"] else "")
+                self._okay(features.encode())
+            elif request.startswith("host:transport:"):
+                serial = request[len("host:transport:"):]
+                if serial not in self.server.serials:
+                    return self._fail(f"device '{serial}' not found")
+                self._okay()
+                self._service(serial, self._request())
+            else:
+                self._fail(f"unknown host service: {request}")
+        except (EOFError, OSError):
+            pass
+
+    def _service(self, serial, service):
+        if service == "sync:":
+            self._okay()
+            return self._sync(serial)
+        if service.startswith("shell:"):
+            self._okay()
+            command = service[6:].split("; __s=$?")[0]  # 去掉客户端附加的退出码包装
+            output, status = "30\n" if command.startswith("getprop ro.build.version.sdk") else "", 0
+            if command.startswith("stat -c %s "):
+                mode, size = self.fs.stat(serial, command[len("stat -c %s "):].strip().strip("'"))
+                output = f"{size}\n" if mode else ""
+            elif command.startswith("echo "):
+                output = command[5:] + "\n"
+            elif command.startswith("exit ") and command[5:].isdigit():
+                status = int(command[5:])
+            self.request.sendall(f"{output}\n{_EXIT_MARKER}{status}\n".encode())
+        elif service.startswith("exec:"):
+            self._okay()
+        else:
+            self._fail(f"unknown service: {service}")
+
+    def _sync(self, serial):
+        while True:
+            tag = self._read(4)
+            arg = self._read(struct.unpack("<I", self._read(4))[0]).decode('utf-8', 'replace')
+            if tag == b"QUIT":
+                return
+            if tag == b"STAT":
+                mode, size = self.fs.stat(serial, arg)
+                self.request.sendall(b"STAT" + struct.pack("<III", mode, size & 0xffffffff, _MTIME if mode else 0))
+            elif tag == b"LIST":
+                entries = self.fs.listdir(serial, arg) or []
+                # 整批发送：超大目录时逐条 sendall 的开销会盖过被测代码本身
+                self.request.sendall(b"".join(b"DENT" + struct.pack("<IIII", mode, size & 0xffffffff, _MTIME, len(name.encode())) + name.encode()
+                                              for name, mode, size in entries) + b"DONE" + b"\0" * 16)
+            elif tag == b"STA2" and self.config["sync_v2"]:
+                mode, size = self.fs.stat(serial, arg)
+                self.request.sendall(b"STA2" + _STAT_V2.pack(0 if mode else 2, 0, 0, mode, 1, 0, 0, size, _MTIME, _MTIME, _MTIME))
+            elif tag == b"LIS2" and self.config["sync_v2"]:
+                entries = self.fs.listdir(serial, arg) or []
+                self.request.sendall(b"".join(b"DNT2" + _STAT_V2.pack(0, 0, 0, mode, 1, 0, 0, size, _MTIME, _MTIME, _MTIME) + struct.pack("<I", len(name.encode())) + name.encode()
+                                              for name, mode, size in entries) + b"DONE" + b"\0" * (_STAT_V2.size + 4))
+            elif tag == b"RECV":
+                mode, size = self.fs.stat(serial, arg)
+                if not stat.S_ISREG(mode):
+                    message = b"No such file or directory"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    return
+                self._send_data(size)
+            elif tag == b"SEND":
+                path = arg.rsplit(",", 1)[0]
+                size = 0
+                while True:
+                    chunk_tag = self._read(4)
+                    length = struct.unpack("<I", self._read(4))[0]
+                    if chunk_tag == b"DONE":
+                        break
+                    self._skip(length)
+                    size += length
+                self.fs.record_push(serial, path, size)
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                return
+
+    def _send_data(self, size):
+        bandwidth = self.config["bandwidth_mb"] * 1024 * 1024
+        started, sent = time.monotonic(), 0
+        header = b"DATA" + struct.pack("<I", len(_BLOCK))
+        while sent < size:
+            block = _BLOCK if size - sent >= len(_BLOCK) else _BLOCK[:size - sent]
+            self.request.sendall((header if block is _BLOCK else b"DATA" + struct.pack("<I", len(block))) + block)
+            sent += len(block)
+            if bandwidth:
+                ahead = sent / bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        self.request.sendall(b"DONE" + struct.pack("<I", 0))
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, config, port=0):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.serials = serials(self.config)
+        self.fs = FakeFilesystem(self.config)
+        self.scratch = threading.local()  # 每个连接线程一个接收缓冲区，推送的数据读入后直接丢弃
+        super().__init__(("127.0.0.1", port), _Handler)
+
+
+# --- 假可执行文件 ---
+
+def _split_serial(argv):
+    serial = None
+    while argv and argv[0] in ("-s", "-P", "-H"):
+        if argv[0] == "-s":
+            serial = argv[1]
+        argv = argv[2:]
+    return serial, argv
+
+
+def _print_progress(config, verb, path, size, elapsed):
+    lines = max(1, config["progress_lines"])
+    delay = config["latency"] / lines
+    out = sys.stdout
+    for i in range(1, lines + 1):
+        out.write(f"[{i * 100 // lines:3d}%] {path}\n")
+        if delay:
+            time.sleep(delay)
+    out.write(f"{path}: 1 file {verb}, 0 skipped. {size / max(elapsed, 1e-6) / 1e6:.1f} MB/s ({size} bytes in {elapsed:.3f}s)\n")
+    out.flush()
+
+
+def adb_main(argv, config):
+    config = dict(DEFAULT_CONFIG, **config)
+    serial, argv = _split_serial(list(argv))
+    command = argv[0] if argv else ""
+    if command in ("start-server", "kill-server"):
+        return 0
+    if command == "version":
+        print("Android Debug Bridge version 1.0.41 (fake)")
+        return 0
+    if command == "devices":
+        print("List of devices attached")
+        for s in serials(config):
+            print(f"{s}\tdevice")
+        return 0
+    if command in ("connect", "disconnect"):
+        print(f"connected to {argv[1]}" if command == "connect" else f"disconnected {argv[1]}")
+        return 0
+    if serial and serial not in serials(config):
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+    time.sleep(config["latency"])
+    if command == "shell":
+        print(f"\n{_EXIT_MARKER}0")
+        return 0
+    if command in ("pull", "push"):
+        paths = [a for a in argv[1:] if not a.startswith("-")]
+        started = time.monotonic()
+        if command == "pull":
+            size = int(config["file_mb"] * 1024 * 1024)
+            target = paths[1]
+            if os.path.isdir(target):
+                target = os.path.join(target, paths[0].rstrip('/').rsplit('/', 1)[-1])
+            with open(target, 'wb') as f:
+                for offset in range(0, size, len(_BLOCK)):
+                    f.write(_BLOCK[:min(len(_BLOCK), size - offset)])
+        else:
+            size = os.path.getsize(paths[0])
+        _print_progress(config, command + "ed", paths[0], size, time.monotonic() - started)
+        return 0
+    if command == "exec-out":
+        return 0
+    print(f"adb: unknown command {command}", file=sys.stderr)
+    return 1
+
+
+def scrcpy_main(argv, config):
+    config = dict(DEFAULT_CONFIG, **config)
+    if "--help" in argv:
+        print("    --serial=SERIAL\n    --crop=W:H:X:Y\n    --window-title=TEXT\n    --record=FILE\n    --record-format=FMT\n"
+              "    --no-playback\n    --no-audio\n    --no-control\n    --time-limit=SECONDS")
+        return 0
+    if "--version" in argv:
+        print("scrcpy 2.7 (fake)")
+        return 0
+    options = dict(arg[2:].split("=", 1) for arg in argv if arg.startswith("--") and "=" in arg)
+    if options.get("serial") and options["serial"] not in serials(config):
+        print(f"ERROR: Could not find ADB device {options['serial']}", flush=True)
+        return 1
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    stop.wait(config["scrcpy_startup"])
+    print("INFO: Renderer: fake\nINFO: Texture: 1080x2400", flush=True)
+    deadline = time.monotonic() + float(options.get("time-limit", "inf"))
+    record = open(options["record"], 'wb') if options.get("record") else None
+    try:
+        while not stop.wait(0.1) and time.monotonic() < deadline:
+            if record:
+                record.write(_BLOCK[:32 * 1024])
+                record.flush()
+    finally:
+        if record:
+            record.close()
+    return 0
+
+
+def write_bin(directory, config):
+    """在 directory 中生成假 adb/scrcpy (Windows 上为 .cmd)，返回 {名称: 路径}。"""
+    os.makedirs(directory, exist_ok=True)
+    config_path = os.path.join(directory, "fake_config.json")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(DEFAULT_CONFIG, **config), f)
+    paths = {}
+    for name in ("adb", "scrcpy"):
+        script = os.path.join(directory, f"fake_{name}.py")
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(f"import json, sys\nsys.path.insert(0, {BENCH_DIR!r})\nfrom fake_devices import {name}_main\n"
+                    f"sys.exit({name}_main(sys.argv[1:], json.load(open({config_path!r}, encoding='utf-8'))))\n")
+        if os.name == 'nt':
+            path = os.path.join(directory, f"{name}.cmd")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f'@"{sys.executable}" "{script}" %*\n')
+        else:
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"#!/bin/sh\nexec {json.dumps(sys.executable)} {json.dumps(script)} \"$@\"\n")
+            os.chmod(path, 0o755)
+        paths[name] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="运行假 adb server，直到标准输入关闭或收到 SIGTERM")
+    serve.add_argument("--port", type=int, default=0)
+    for key, value in DEFAULT_CONFIG.items():
+        serve.add_argument("--" + key.replace("_", "-"), type=type(value), default=value)
+    write = sub.add_parser("write-bin", help="生成假 adb/scrcpy 可执行文件")
+    write.add_argument("directory")
+    write.add_argument("--config", help="JSON 配置文件，键与 serve 的选项相同")
+    args = parser.parse_args()
+    if args.command == "write-bin":
+        config = {}
+        if args.config:
+            with open(args.config, encoding='utf-8') as f:
+                config = json.load(f)
+        for name, path in write_bin(args.directory, config).items():
+            print(f"{name}\t{path}")
+        return 0
+    server = FakeAdbServer({key: getattr(args, key) for key in DEFAULT_CONFIG}, args.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(server.server_address[1], flush=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        sys.stdin.read()  # 父进程退出 (标准输入关闭) 时一起退出
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+广播推送：把同一个本地文件/文件夹推送到多台设备，或在多台设备上安装同一个 APK。
+
+每台设备一个数据流并发传输，本地文件只从磁盘读取一次：读到的数据块放入共享缓存，
+等所有设备都取走后释放。缓存总量不超过 budget，某台设备远远落后时超出部分改为直接读盘，
+不会让快的设备等慢的设备，也不会无限占用内存。
+
+并发数按连接方式分别限制：Wi-Fi 设备共享同一个无线信道，同时传输的设备越多每台越慢，
+总吞吐却不增加，默认只同时传 3 台；USB 设备各有各的线缆，默认同时传 6 台。
+"""
+import os
+import posixpath
+import shlex
+import stat
+import threading
+import time
+
+from adb_client import AdbError, SYNC_DATA_MAX
+from link_tuner import link_type
+
+DEFAULT_REMOTE_DIR = "/sdcard/Download/"
+DEFAULT_LIMITS = {"usb": 6, "wifi": 3}
+CACHE_BUDGET = 256 * 1024 * 1024
+CHUNK_SIZE = SYNC_DATA_MAX  # 与 sync DATA 包大小一致，推送时每个数据块正好一个包
+INSTALL_TIMEOUT = 300  # 秒；安装大型 APK 时设备端的 dex 优化可能需要较长时间
+_TMP_APK_DIR = "/data/local/tmp"
+
+
+class BroadcastResult:
+    __slots__ = ("serial", "ok", "message", "bytes", "elapsed")
+
+    def __init__(self, serial, ok=False, message="", nbytes=0, elapsed=0.0):
+        self.serial = serial
+        self.ok = ok
+        self.message = message
+        self.bytes = nbytes
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BroadcastReport:
+    def __init__(self, results, source_bytes, disk_bytes, elapsed):
+        self.results = results  # 与输入的设备顺序一致
+        self.source_bytes = source_bytes  # 本地文件的总大小
+        self.disk_bytes = disk_bytes  # 实际从磁盘读取的字节数，理想情况下等于 source_bytes
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    def format_lines(self, format_bytes):
+        lines = [f"{r.serial}\t{'成功' if r.ok else '失败'}\t{format_bytes(r.bytes)}\t{format_bytes(r.rate)}/s\t{r.elapsed:.1f}s\t{r.message}".rstrip() for r in self.results]
+        lines.append(f"共 {len(self.results)} 台，成功 {len(self.succeeded)} 台，用时 {self.elapsed:.1f} 秒；"
+                     f"本地读取 {format_bytes(self.disk_bytes)} (源文件 {format_bytes(self.source_bytes)})")
+        return lines
+
+
+class SharedFileCache:
+    """
+    多台设备共享的读取缓存：数据块按 (路径, 序号) 缓存，记录还有哪些设备没有读取，
+    全部读取后立即释放。设备失败或取消时调用 drop()，不再为它保留数据。
+    """
+
+    def __init__(self, participants, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.disk_bytes = 0
+        self._lock = threading.Lock()
+        self._active = set(participants)
+        self._chunks = {}  # (path, index) -> [data, 尚未读取的设备集合]
+        self._loading = {}  # (path, index) -> threading.Event，避免多台设备同时读同一块
+        self._cached_bytes = 0
+
+    def read_chunk(self, participant, path, index):
+        key = (path, index)
+        while True:
+            with self._lock:
+                entry = self._chunks.get(key)
+                if entry is not None:
+                    entry[1].discard(participant)
+                    if not entry[1]:
+                        self._evict(key)
+                    return entry[0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+            with self._lock:
+                if key not in self._chunks:
+                    # 加载者没有缓存这一块 (预算已满)，自己直接读盘
+                    return self._read_disk(path, index)
+        try:
+            data = self._read_disk(path, index)
+            with self._lock:
+                pending = self._active - {participant}
+                if pending and data and self._cached_bytes + len(data) <= self.budget:
+                    self._chunks[key] = [data, pending]
+                    self._cached_bytes += len(data)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+        return data
+
+    def _read_disk(self, path, index):
+        with open(path, 'rb') as f:
+            f.seek(index * CHUNK_SIZE)
+            data = f.read(CHUNK_SIZE)
+        with self._lock:
+            self.disk_bytes += len(data)
+        return data
+
+    def _evict(self, key):
+        data, _pending = self._chunks.pop(key)
+        self._cached_bytes -= len(data)
+
+    def drop(self, participant):
+        with self._lock:
+            self._active.discard(participant)
+            for key in [k for k, (_data, pending) in self._chunks.items() if pending <= {participant}]:
+                self._evict(key)
+            for _data, pending in self._chunks.values():
+                pending.discard(participant)
+
+    def reader(self, participant, path):
+        return _SharedReader(self, participant, path)
+
+
+class _SharedReader:
+    """按顺序读取的文件对象 (read/close，可用于 with)，数据来自 SharedFileCache。"""
+
+    def __init__(self, cache, participant, path):
+        self.cache, self.participant, self.path = cache, participant, path
+        self._index = 0
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = self.cache.read_chunk(self.participant, self.path, self._index)
+            if not chunk:
+                break
+            self._index += 1
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._buffer = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def plan_files(local_path):
+    """[(本地文件, 设备上的相对路径), ...]；只遍历一次本地文件夹，所有设备共用。"""
+    if not os.path.isdir(local_path):
+        return [(local_path, "")]
+    files = []
+    for root, dirs, names in os.walk(local_path):
+        dirs.sort()
+        rel_root = os.path.relpath(root, local_path)
+        for name in sorted(names):
+            rel = name if rel_root == "." else posixpath.join(rel_root.replace(os.sep, "/"), name)
+            files.append((os.path.join(root, name), rel))
+    return files
+
+
+def _push_device(client, serial, cache, local_path, remote_path, files, progress):
+    if stat.S_ISDIR(client.stat(serial, remote_path)[0]):
+        remote_path = posixpath.join(remote_path.rstrip('/'), os.path.basename(os.path.normpath(local_path)))
+    total = 0
+    for path, rel in files:
+        target = posixpath.join(remote_path, rel) if rel else remote_path
+        base = total
+        cb = (lambda _p, done, _size, base=base: progress(base + done)) if progress else None
+        total += client.push_file(serial, path, target, cb, opener=lambda path=path: cache.reader(serial, path))
+    return total
+
+
+def _install_device(client, serial, cache, apk_path, progress):
+    size = os.path.getsize(apk_path)
+    sdk = client.shell(serial, "getprop ro.build.version.sdk", timeout=10).strip()
+    if sdk.isdigit() and int(sdk) >= 24:
+        output = _stream_install(client, serial, cache, apk_path, size, progress)
+    else:
+        # Android 7 之前没有 cmd package 的流式安装：先推送到临时目录再用 pm install
+        tmp_path = posixpath.join(_TMP_APK_DIR, f"artocarpus_{os.getpid()}_{os.path.basename(apk_path)}")
+        client.push_file(serial, apk_path, tmp_path, (lambda _p, done, _size: progress(done)) if progress else None,
+                         opener=lambda: cache.reader(serial, apk_path))
+        try:
+            output = client.shell(serial, f"pm install -r {shlex.quote(tmp_path)}", timeout=INSTALL_TIMEOUT)
+        finally:
+            client.shell(serial, f"rm -f {shlex.quote(tmp_path)}", timeout=30)
+    if "Success" not in output:
+        raise AdbError(output.strip().splitlines()[-1] if output.strip() else "安装失败 (设备没有返回结果)")
+    return size
+
+
+def _stream_install(client, serial, cache, apk_path, size, progress):
+    stream = client.open_exec(serial, f"cmd package install -r -S {size}", timeout=INSTALL_TIMEOUT)
+    try:
+        done = 0
+        with cache.reader(serial, apk_path) as reader:
+            while done < size:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    raise AdbError(f"本地文件在安装过程中被修改: {apk_path}")
+                stream.write(chunk)
+                done += len(chunk)
+                if progress: progress(done)
+        stream.flush()
+        output = b""
+        while True:
+            chunk = stream.read(4096)
+            if not chunk:
+                break
+            output += chunk
+    except OSError as e:
+        raise AdbError(f"安装数据流中断: {e}") from e
+    finally:
+        stream.close()
+    return output.decode('utf-8', 'replace')
+
+
+def broadcast(client, serials, local_path, remote_path=DEFAULT_REMOTE_DIR, install=False, limits=None, budget=CACHE_BUDGET,
+              on_progress=None, on_result=None, stop_event=None):
+    """
+    install=True 时 local_path 必须是 APK 文件，remote_path 被忽略。
+    on_progress(serial, done, total) 与 on_result(result) 在后台线程中调用。返回 BroadcastReport。
+    """
+    if install and not (os.path.isfile(local_path) and local_path.lower().endswith(".apk")):
+        raise AdbError(f"不是 APK 文件: {local_path}")
+    if not os.path.exists(local_path):
+        raise AdbError(f"本地路径不存在: {local_path}")
+    files = plan_files(local_path)
+    source_bytes = sum(os.path.getsize(path) for path, _rel in files)
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    slots = {link: threading.BoundedSemaphore(max(1, n)) for link, n in limits.items()}
+    cache = SharedFileCache(serials, budget)
+    results = {}
+    started = time.monotonic()
+
+    def target(serial):
+        result = BroadcastResult(serial)
+        def progress(done):
+            if stop_event is not None and stop_event.is_set():
+                raise AdbError("已取消")
+            result.bytes = done
+            if on_progress: on_progress(serial, done, source_bytes)
+        with slots[link_type(serial)]:
+            t0 = time.monotonic()
+            try:
+                if stop_event is not None and stop_event.is_set():
+                    raise AdbError("已取消")
+                if install:
+                    result.bytes = _install_device(client, serial, cache, local_path, progress)
+                else:
+                    result.bytes = _push_device(client, serial, cache, local_path, remote_path, files, progress)
+                result.ok = True
+            except (AdbError, OSError) as e:
+                result.message = str(e)
+            finally:
+                result.elapsed = time.monotonic() - t0
+                cache.drop(serial)
+        results[serial] = result
+        if on_result:
+            on_result(result)
+
+    threads = [threading.Thread(target=target, args=(serial,), daemon=True) for serial in serials]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return BroadcastReport([results[serial] for serial in serials], source_bytes, cache.disk_bytes, time.monotonic() - started)
@@ -0,0 +1,220 @@
+"""
+外部调用的耗时统计：adb server 请求、adb/scrcpy 子进程等每次调用都记录操作名、设备、耗时、
+退出码与输出字节数，用来判断界面变慢时是 adb、scrcpy、设备还是 Tk 本身的问题。
+
+耗时按对数分桶累计 (每个 2 倍区间 4 个桶)，内存占用与调用次数无关；p50/p95 由桶内插值得到，
+误差不超过一个桶宽 (约 19%)。最近的调用另外保存在有界队列中，便于查看具体的命令。
+可导出为 JSON，或 Prometheus 文本格式 (供 node exporter 的 textfile collector 读取)。
+"""
+import bisect
+import collections
+import datetime
+import json
+import os
+import threading
+import time
+
+# 桶的上界 (秒)：0.1 毫秒起每个 2 倍区间 4 个桶，最后一个约 56 分钟；更长的计入溢出桶
+BUCKET_BOUNDS = tuple(1e-4 * 2 ** (i / 4) for i in range(4 * 25 + 1))
+# 导出 Prometheus 时只保留 2 的整数倍的上界，与内部的桶边界重合，累计值仍是精确的
+PROMETHEUS_BOUNDS = BUCKET_BOUNDS[::4]
+RECENT_CALLS = 500
+
+
+class CallRecord:
+    __slots__ = ("time", "operation", "serial", "command", "duration", "exit_code", "output_bytes")
+
+    def __init__(self, operation, serial, command, duration, exit_code, output_bytes):
+        self.time = time.time()
+        self.operation = operation
+        self.serial = serial
+        self.command = command
+        self.duration = duration
+        self.exit_code = exit_code
+        self.output_bytes = output_bytes
+
+    def to_dict(self):
+        return {"time": self.time, "operation": self.operation, "serial": self.serial, "command": self.command,
+                "duration": self.duration, "exit_code": self.exit_code, "output_bytes": self.output_bytes}
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max", "errors", "output_bytes")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.output_bytes = 0
+
+    def add(self, duration, error=False, output_bytes=0):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.errors += bool(error)
+        self.output_bytes += output_bytes
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.errors += other.errors
+        self.output_bytes += other.output_bytes
+
+    def quantile(self, q):
+        """按桶估计分位数 (秒)：在所在的桶内按几何插值，结果不超过观测到的最大值。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if index >= len(BUCKET_BOUNDS):
+                    return self.max
+                upper = BUCKET_BOUNDS[index]
+                lower = BUCKET_BOUNDS[index - 1] if index else 0.0
+                fraction = (rank - seen) / n
+                value = lower * (upper / lower) ** fraction if lower else upper * fraction
+                return min(value, self.max)
+            seen += n
+        return self.max
+
+
+class _Timer:
+    """measure()/start() 返回的计时器：可用于 with，也可以稍后调用 finish()。"""
+
+    def __init__(self, metrics, operation, serial, command):
+        self.metrics, self.operation, self.serial, self.command = metrics, operation, serial, command
+        self.exit_code = None
+        self.output_bytes = 0
+        self._started = time.perf_counter()
+        self._finished = False
+
+    def finish(self, exit_code=None, output_bytes=None):
+        if self._finished:
+            return
+        self._finished = True
+        if exit_code is not None: self.exit_code = exit_code
+        if output_bytes is not None: self.output_bytes = output_bytes
+        self.metrics.record(self.operation, self.serial, time.perf_counter() - self._started, self.exit_code, self.output_bytes, self.command)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 调用抛出异常且没有退出码时记为 -1 (失败)
+        if exc_type is not None and self.exit_code is None:
+            self.exit_code = -1
+        self.finish()
+
+
+class CallMetrics:
+    def __init__(self, recent=RECENT_CALLS):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (operation, serial) -> Histogram
+        self._recent = collections.deque(maxlen=recent)
+        self.started_at = time.time()
+
+    def record(self, operation, serial=None, duration=0.0, exit_code=None, output_bytes=0, command=""):
+        error = exit_code not in (None, 0)
+        with self._lock:
+            histogram = self._histograms.get((operation, serial or ""))
+            if histogram is None:
+                histogram = self._histograms[(operation, serial or "")] = Histogram()
+            histogram.add(duration, error, output_bytes)
+            if command:
+                # 没有命令的采样 (如 Tk 事件循环延迟) 只计入直方图，不占用最近调用的名额
+                self._recent.append(CallRecord(operation, serial, command[:300], duration, exit_code, output_bytes))
+
+    def measure(self, operation, serial=None, command=""):
+        return _Timer(self, operation, serial, command)
+
+    start = measure
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._recent.clear()
+            self.started_at = time.time()
+
+    def histograms(self, by_device=True):
+        """{(operation, serial): Histogram} 的副本；by_device=False 时同一操作的所有设备合并 (serial 为 "")。"""
+        with self._lock:
+            items = [(key, h) for key, h in self._histograms.items()]
+            result = {}
+            for (operation, serial), histogram in items:
+                key = (operation, serial if by_device else "")
+                merged = result.get(key)
+                if merged is None:
+                    merged = result[key] = Histogram()
+                merged.merge(histogram)
+        return result
+
+    def rows(self, by_device=True):
+        """[(operation, serial, count, p50, p95, max, errors, output_bytes), ...]，按操作与设备排序。"""
+        return [(operation, serial, h.count, h.quantile(0.5), h.quantile(0.95), h.max, h.errors, h.output_bytes)
+                for (operation, serial), h in sorted(self.histograms(by_device).items())]
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+    def to_dict(self):
+        operations = [{"operation": operation, "serial": serial, "count": count, "p50": p50, "p95": p95, "max": peak,
+                       "errors": errors, "output_bytes": nbytes} for operation, serial, count, p50, p95, peak, errors, nbytes in self.rows()]
+        return {"generated": datetime.datetime.now().isoformat(timespec="seconds"), "since": self.started_at,
+                "operations": operations, "recent": [r.to_dict() for r in self.recent()]}
+
+    def to_prometheus(self):
+        lines = ["# HELP artocarpus_call_duration_seconds Duration of adb/scrcpy calls made by Artocarpus.",
+                 "# TYPE artocarpus_call_duration_seconds histogram"]
+        histograms = sorted(self.histograms().items())
+        for (operation, serial), h in histograms:
+            labels = f'operation="{_escape_label(operation)}",serial="{_escape_label(serial)}"'
+            cumulative, index = 0, 0
+            for bound in PROMETHEUS_BOUNDS:
+                while index < len(BUCKET_BOUNDS) and BUCKET_BOUNDS[index] <= bound * (1 + 1e-9):
+                    cumulative += h.counts[index]
+                    index += 1
+                lines.append(f'artocarpus_call_duration_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'artocarpus_call_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"artocarpus_call_duration_seconds_sum{{{labels}}} {h.total:.6f}")
+            lines.append(f"artocarpus_call_duration_seconds_count{{{labels}}} {h.count}")
+        for name, attr, help_text in (("artocarpus_call_errors_total", "errors", "Calls that failed or exited with a non-zero code."),
+                                      ("artocarpus_call_output_bytes_total", "output_bytes", "Bytes of output produced by calls.")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (operation, serial), h in histograms:
+                lines.append(f'{name}{{operation="{_escape_label(operation)}",serial="{_escape_label(serial)}"}} {getattr(h, attr)}')
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        # textfile collector 可能随时读取，必须整体替换，不能让它读到写了一半的文件
+        _write_atomic(path, self.to_prometheus())
+
+
+def format_duration(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.1f} ms"
+    if seconds < 120:
+        return f"{seconds:.2f} s"
+    return f"{int(seconds) // 60}:{int(seconds) % 60:02d}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
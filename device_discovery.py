@@ -0,0 +1,212 @@
+"""
+Wi-Fi 设备发现与批量连接：并发探测网段/端口范围内开放的 adb 端口 (TCP 连接探测，单个主机的超时很短)，
+加上 adb server 的 mDNS 服务列表 (`adb mdns services`)，再以有限的并发数批量 adb connect。
+每个结果一产生就通过回调报告，不必等整个网段扫描完。
+
+目标写法：
+    192.168.1.0/24            整个网段 (不含网络地址与广播地址)
+    192.168.1.10-60           最后一段的范围
+    192.168.1.20              单个地址
+    192.168.1.20:5555-5560    指定端口或端口范围 (覆盖默认端口)
+"""
+import ipaddress
+import queue
+import re
+import socket
+import subprocess
+import threading
+
+from adb_client import AdbError
+
+DEFAULT_PORTS = (5555,)
+MAX_HOSTS = 4096  # 防止误输入 /8 这样的网段
+_TARGET = re.compile(r"^(?P<host>[^:\s]+?)(?::(?P<ports>[\d,-]+))?$")
+_CONNECT_SERVICES = ("_adb._tcp", "_adb-tls-connect._tcp")  # _adb-tls-pairing 需要先配对，不能直接连接
+
+
+def parse_ports(text):
+    ports = []
+    for part in str(text).replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        start, end = int(first), int(last or first)
+        if not (0 < start <= end <= 65535):
+            raise ValueError(f"无效的端口: {part}")
+        ports.extend(range(start, end + 1))
+    return ports
+
+
+def _expand_hosts(host):
+    if "/" in host:
+        network = ipaddress.ip_network(host, strict=False)
+        hosts = list(network.hosts()) if network.num_addresses <= MAX_HOSTS + 2 else None
+    elif re.match(r"^\d+\.\d+\.\d+\.\d+-\d+$", host):
+        base, last = host.rsplit("-", 1)
+        prefix, first = base.rsplit(".", 1)
+        hosts = [ipaddress.ip_address(f"{prefix}.{n}") for n in range(int(first), int(last) + 1)]
+    else:
+        return [host]
+    if hosts is None or len(hosts) > MAX_HOSTS:
+        raise ValueError(f"地址范围过大 (最多 {MAX_HOSTS} 个主机): {host}")
+    return [str(ip) for ip in hosts]
+
+
+def expand_targets(specs, default_ports=DEFAULT_PORTS):
+    """把目标写法展开为 [(host, port), ...]，保持输入顺序并去重。"""
+    targets, seen = [], set()
+    for spec in specs:
+        for item in re.split(r"[\s;]+", spec.strip()):
+            if not item:
+                continue
+            match = _TARGET.match(item)
+            if not match:
+                raise ValueError(f"无法识别的目标: {item}")
+            ports = parse_ports(match.group("ports")) if match.group("ports") else list(default_ports)
+            for host in _expand_hosts(match.group("host")):
+                for port in ports:
+                    if (host, port) not in seen:
+                        seen.add((host, port))
+                        targets.append((host, port))
+    return targets
+
+
+def local_subnet():
+    """本机所在的 /24 网段 (用于界面中的默认值)；无法确定时返回空字符串。"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("10.255.255.255", 1))  # UDP connect 不发送数据，只用于选出本机出口地址
+            address = s.getsockname()[0]
+    except OSError:
+        return ""
+    if address.startswith("127."):
+        return ""
+    return str(ipaddress.ip_network(f"{address}/24", strict=False))
+
+
+def probe_port(host, port, timeout):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def parse_mdns_services(text):
+    """解析 `adb mdns services` 的输出，返回可直接 adb connect 的 [(名称, "ip:port"), ...]。"""
+    services = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 3 or not any(fields[1].rstrip(".") == name for name in _CONNECT_SERVICES):
+            continue
+        if re.match(r"^[\d.]+:\d+$", fields[-1]):
+            services.append((fields[0], fields[-1]))
+    return services
+
+
+def mdns_services(client):
+    return parse_mdns_services(client.mdns_services())
+
+
+def _run_pool(items, worker, max_workers, stop_event):
+    # 固定数量的工作线程从队列中取任务，队列取空或收到停止信号时退出
+    tasks = queue.Queue()
+    for item in items:
+        tasks.put(item)
+    def loop():
+        while not (stop_event and stop_event.is_set()):
+            try:
+                item = tasks.get_nowait()
+            except queue.Empty:
+                return
+            worker(item)
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, min(max_workers, len(items))))]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+
+def scan(targets, timeout=0.3, max_workers=64, on_found=None, stop_event=None):
+    """并发探测 [(host, port), ...]，返回端口开放的 "host:port" 列表 (按输入顺序)。"""
+    found = {}
+    def worker(target):
+        if probe_port(*target, timeout):
+            address = f"{target[0]}:{target[1]}"
+            found[target] = address
+            if on_found: on_found(address)
+    _run_pool(targets, worker, max_workers, stop_event)
+    return [found[t] for t in targets if t in found]
+
+
+def connect_one(client, address, timeout=5):
+    try:
+        return client.connect(address, timeout=timeout)
+    except (AdbError, OSError, subprocess.TimeoutExpired) as e:
+        return False, str(e) or type(e).__name__
+
+
+def bulk_connect(client, addresses, max_concurrent=8, timeout=5, on_result=None, stop_event=None):
+    """以最多 max_concurrent 个并发执行 adb connect，返回 {address: (是否成功, 信息)}。"""
+    results = {}
+    def worker(address):
+        result = results[address] = connect_one(client, address, timeout)
+        if on_result: on_result(address, *result)
+    _run_pool(list(dict.fromkeys(addresses)), worker, max_concurrent, stop_event)
+    return results
+
+
+def discover(client, specs, ports=DEFAULT_PORTS, use_mdns=True, connect=True, probe_timeout=0.3, scan_workers=64,
+             connect_budget=8, connect_timeout=5, on_event=None, stop_event=None):
+    """
+    扫描 + mDNS + 批量连接。on_event(kind, address, message) 中 kind 为
+    "found" (端口开放)、"mdns" (mDNS 发现)、"connected"、"failed" 或 "error" (mDNS 查询失败等，address 为空)。
+    扫描与连接同时进行：发现一个地址就立即排队连接，不等扫描结束。返回连接结果字典。
+    """
+    emit = on_event or (lambda kind, address, message: None)
+    targets = expand_targets(specs, ports) if specs else []  # 先展开目标，写法有误时在开始扫描前就报错
+    pending = queue.Queue()
+    results = {}
+    done_scanning = threading.Event()
+
+    def found(kind, address, message=""):
+        emit(kind, address, message)
+        pending.put(address)
+
+    def connector():
+        slots = threading.BoundedSemaphore(connect_budget)
+        workers, queued = [], set()
+        while not (stop_event and stop_event.is_set()):
+            try:
+                address = pending.get(timeout=0.1)
+            except queue.Empty:
+                if done_scanning.is_set() and pending.empty():
+                    break
+                continue
+            if address in queued:
+                continue
+            queued.add(address)
+            slots.acquire()
+            def work(address=address):
+                try:
+                    result = results[address] = connect_one(client, address, connect_timeout)
+                    emit("connected" if result[0] else "failed", address, result[1])
+                finally:
+                    slots.release()
+            t = threading.Thread(target=work, daemon=True); t.start(); workers.append(t)
+        for t in workers: t.join()
+
+    connect_thread = threading.Thread(target=connector, daemon=True)
+    if connect:
+        connect_thread.start()
+    try:
+        if use_mdns:
+            try:
+                for name, address in mdns_services(client):
+                    found("mdns", address, name)
+            except (AdbError, OSError) as e:
+                emit("error", "", f"mDNS: {e}")
+        scan(targets, probe_timeout, scan_workers, lambda address: found("found", address), stop_event)
+    finally:
+        done_scanning.set()
+    if connect:
+        connect_thread.join()
+    return results
@@ -0,0 +1,130 @@
+"""
+设备视频编码器发现：解析 `scrcpy --list-encoders` 的输出，并按设备的构建指纹
+(ro.build.fingerprint，同型号同系统版本的设备相同) 缓存到 ~/.artocarpus/encoders.json，
+同一型号只需要查询一次。
+"""
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+
+from adb_client import AdbError
+
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".artocarpus", "encoders.json")
+_ENCODER_LINE = re.compile(r"--video-codec=(\w+)\s+--video-encoder=(\S+)(.*)")
+_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+
+class EncoderInfo:
+    __slots__ = ("codec", "name", "hardware", "vendor", "alias_of")
+
+    def __init__(self, codec, name, hardware=False, vendor=False, alias_of=None):
+        self.codec = codec
+        self.name = name
+        self.hardware = hardware
+        self.vendor = vendor
+        self.alias_of = alias_of
+
+    def to_dict(self):
+        return {"codec": self.codec, "name": self.name, "hardware": self.hardware, "vendor": self.vendor, "alias_of": self.alias_of}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["codec"], d["name"], d.get("hardware", False), d.get("vendor", False), d.get("alias_of"))
+
+
+def parse_list_encoders(output):
+    """
+    解析 scrcpy 2.x 的输出，例如：
+        --video-codec=h264 --video-encoder=c2.qti.avc.encoder       (hw) [vendor]
+        --video-codec=h264 --video-encoder=OMX.google.h264.encoder  (sw) (alias for c2.android.avc.encoder)
+    """
+    encoders = []
+    for line in output.splitlines():
+        match = _ENCODER_LINE.search(line)
+        if not match:
+            continue
+        codec, name, flags = match.groups()
+        alias = re.search(r"\(alias for (\S+?)\)", flags)
+        encoders.append(EncoderInfo(codec, name, "(hw)" in flags, "[vendor]" in flags, alias.group(1) if alias else None))
+    return encoders
+
+
+def preferred_encoder(encoders, codec):
+    """该编码格式的首选编码器：优先硬件编码器，其中厂商实现优先；没有硬件编码器时返回 None (交给 scrcpy 自动选择)。"""
+    candidates = [e for e in encoders if e.codec == codec and e.hardware and not e.alias_of]
+    candidates.sort(key=lambda e: not e.vendor)
+    return candidates[0].name if candidates else None
+
+
+class EncoderCache:
+    def __init__(self, client, path=CACHE_FILE):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+        self._fingerprints = {}  # serial -> fingerprint，设备重连前不会变化
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def fingerprint(self, serial):
+        with self._lock:
+            cached = self._fingerprints.get(serial)
+        if cached:
+            return cached
+        fingerprint = self.client.shell(serial, "getprop ro.build.fingerprint", timeout=10).strip() or f"serial:{serial}"
+        with self._lock:
+            self._fingerprints[serial] = fingerprint
+        return fingerprint
+
+    def forget_device(self, serial):
+        with self._lock:
+            self._fingerprints.pop(serial, None)
+
+    def cached(self, serial):
+        """返回已缓存的编码器列表；尚未查询过时返回 None。会访问设备读取指纹。"""
+        fingerprint = self.fingerprint(serial)
+        with self._lock:
+            entry = self._load().get(fingerprint)
+        return [EncoderInfo.from_dict(d) for d in entry["video"]] if entry else None
+
+    def discover(self, serial, scrcpy_exec, refresh=False, timeout=30):
+        if not refresh:
+            encoders = self.cached(serial)
+            if encoders is not None:
+                return encoders
+        cmd = [scrcpy_exec, f"--serial={serial}", "--list-encoders"]
+        try:
+            with self.client.metrics.measure("scrcpy list-encoders", serial, " ".join(cmd)) as timer:
+                result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=timeout, creationflags=_NO_WINDOW)
+                timer.exit_code, timer.output_bytes = result.returncode, len(result.stdout) + len(result.stderr)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise AdbError(f"查询编码器失败: {e}") from e
+        encoders = parse_list_encoders(result.stdout + "\n" + result.stderr)
+        if not encoders:
+            raise AdbError(f"查询编码器失败: {(result.stderr or result.stdout).strip()[-300:]}")
+        fingerprint = self.fingerprint(serial)
+        model = self.client.shell(serial, "getprop ro.product.model", timeout=10).strip()
+        with self._lock:
+            self._load()[fingerprint] = {"model": model, "queried_at": int(time.time()), "video": [e.to_dict() for e in encoders]}
+            try:
+                self._save()
+            except OSError:
+                pass
+        return encoders
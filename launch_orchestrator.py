@@ -0,0 +1,104 @@
+"""
+多设备 scrcpy 启动调度：同一时刻只允许少量 scrcpy 处于“启动中”状态，
+相邻两次启动之间再错开一小段时间。
+
+scrcpy 启动时要推送并启动手机端的 server、建立多条 adb 隧道，几十个实例同时启动
+会把 adb server 和 USB Hub 压垮，导致部分设备随机失败；启动完成后的串流本身则很轻。
+因此名额只在启动阶段占用，会话就绪 (或进程退出、超时) 后立即释放给下一台设备。
+"""
+import threading
+import time
+
+
+class LaunchOrchestrator:
+    def __init__(self, max_concurrent=3, stagger=0.5, ready_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.stagger = stagger  # 秒；相邻两次启动的最小间隔
+        self.ready_timeout = ready_timeout  # 秒；超过该时间仍未就绪也释放名额
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue = []  # [(serial, cmd, spawn)]
+        self._starting = set()
+        self._last_start = 0.0
+        self._worker = None
+
+    def set_limits(self, max_concurrent=None, stagger=None):
+        with self._cond:
+            if max_concurrent is not None: self.max_concurrent = max(1, int(max_concurrent))
+            if stagger is not None: self.stagger = max(0.0, float(stagger))
+            self._cond.notify_all()
+
+    def launch(self, items, spawn):
+        """
+        items 为 [(serial, cmd), ...]；spawn(serial, cmd, ready) 负责在后台启动进程，
+        并在会话就绪或进程结束时调用 ready()。已在排队或启动中的设备会被跳过。
+        返回实际加入队列的序列号列表。
+        """
+        accepted = []
+        with self._cond:
+            queued = {serial for serial, _cmd, _spawn in self._queue}
+            for serial, cmd in items:
+                if serial in queued or serial in self._starting:
+                    continue
+                self._queue.append((serial, cmd, spawn))
+                queued.add(serial)
+                accepted.append(serial)
+            if accepted and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+        return accepted
+
+    def cancel_pending(self):
+        """丢弃尚未开始启动的设备，返回它们的序列号。"""
+        with self._cond:
+            dropped = [serial for serial, _cmd, _spawn in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+        return dropped
+
+    def is_busy(self, serial):
+        with self._lock:
+            return serial in self._starting or any(s == serial for s, _cmd, _spawn in self._queue)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._queue) + len(self._starting)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._queue and len(self._starting) >= self.max_concurrent:
+                    self._cond.wait()
+                if not self._queue:
+                    self._worker = None
+                    return
+                delay = self._last_start + self.stagger - time.monotonic()
+                if delay > 0:
+                    # 等待期间队列可能被清空或限制被修改，醒来后重新检查
+                    self._cond.wait(delay)
+                    continue
+                serial, cmd, spawn = self._queue.pop(0)
+                self._starting.add(serial)
+                self._last_start = time.monotonic()
+            ready = threading.Event()
+            threading.Thread(target=self._wait_ready, args=(serial, ready), daemon=True).start()
+            try:
+                spawn(serial, cmd, ready.set)
+            except Exception:
+                ready.set()
+
+    def _wait_ready(self, serial, ready):
+        ready.wait(self.ready_timeout)
+        with self._cond:
+            self._starting.discard(serial)
+            self._cond.notify_all()
+
+
+def profile_command(scrcpy_exec, serial, crop=None):
+    """多设备预设的 scrcpy 命令行；crop 为 {"w","h","x","y"}，不完整时忽略。"""
+    cmd = [scrcpy_exec, f"--serial={serial}", f"--window-title={serial}"]
+    crop = crop or {}
+    w, h, x, y = (str(crop.get(k, "")).strip() for k in "whxy")
+    if all(s.isdigit() for s in [w, h, x, y]) and int(w) > 0 and int(h) > 0: cmd.append(f"--crop={w}:{h}:{x}:{y}")
+    return cmd
@@ -0,0 +1,137 @@
+"""
+画质自动调节：对每台设备做一次简短的链路测速 (通过 exec-out 读取固定大小的数据并计时)，
+根据测得的吞吐量选择 scrcpy 的码率、最大尺寸与最大帧率。
+
+结果按 "序列号 + 连接方式 (usb/wifi)" 缓存到 ~/.artocarpus/link_tuning.json，
+过期或用户要求时才重新测速；同一台设备改用 Wi-Fi 连接时会单独测速。
+"""
+import json
+import os
+import threading
+import time
+
+from adb_client import AdbError
+
+TUNING_FILE = os.path.join(os.path.expanduser("~"), ".artocarpus", "link_tuning.json")
+PROBE_BYTES = 4 * 1024 * 1024
+MAX_AGE = 24 * 3600
+
+# (可用带宽下限 Mbps, max-size，0 表示不限制, max-fps)，从高到低依次匹配
+QUALITY_TIERS = (
+    (40, 0, 60),
+    (16, 1920, 60),
+    (8, 1600, 60),
+    (4, 1280, 30),
+    (0, 1024, 30),
+)
+# 视频流只使用测得带宽的一部分，为控制通道、重传与带宽波动留出余量
+HEADROOM = {"usb": 0.5, "wifi": 0.35}
+MIN_BITRATE, MAX_BITRATE = 1, 32
+
+
+def link_type(serial):
+    # ip:port 与 mDNS 发现的无线调试设备 (adb-XXXX._adb-tls-connect._tcp) 都走网络
+    return "wifi" if ":" in serial or "._adb-tls-" in serial else "usb"
+
+
+class LinkTuning:
+    __slots__ = ("link", "mbps", "bitrate", "max_size", "max_fps", "measured_at")
+
+    def __init__(self, link, mbps, bitrate, max_size, max_fps, measured_at=None):
+        self.link = link
+        self.mbps = mbps
+        self.bitrate = bitrate
+        self.max_size = max_size
+        self.max_fps = max_fps
+        self.measured_at = measured_at or time.time()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["link"], d["mbps"], d["bitrate"], d["max_size"], d["max_fps"], d.get("measured_at"))
+
+    def scrcpy_args(self):
+        args = [f"-b{self.bitrate}M", f"--max-fps={self.max_fps}"]
+        if self.max_size:
+            args.append(f"--max-size={self.max_size}")
+        return args
+
+    def describe(self):
+        size = f"{self.max_size}px" if self.max_size else "原始分辨率"
+        return f"{self.link} {self.mbps:.1f} Mbps -> {self.bitrate} Mbps, {size}, {self.max_fps} fps"
+
+
+def choose_params(mbps, link):
+    budget = mbps * HEADROOM.get(link, HEADROOM["wifi"])
+    bitrate = int(min(max(budget, MIN_BITRATE), MAX_BITRATE))
+    max_size, max_fps = next((size, fps) for floor, size, fps in QUALITY_TIERS if budget >= floor)
+    return LinkTuning(link, mbps, bitrate, max_size, max_fps)
+
+
+def probe_throughput(client, serial, size=PROBE_BYTES, timeout=10):
+    """读取设备上 size 字节的 /dev/zero，返回吞吐量 (Mbps)。计时从收到第一个数据块开始，不含建立连接的耗时。"""
+    state = {"first": None, "received": 0}
+    def sink(chunk):
+        now = time.perf_counter()
+        if state["first"] is None:
+            state["first"] = now
+            state["first_len"] = len(chunk)
+        state["received"] += len(chunk)
+        state["last"] = now
+    client.exec_out(serial, f"dd if=/dev/zero bs=65536 count={size // 65536} 2>/dev/null", sink, timeout=timeout)
+    if state["first"] is None or state["received"] < size // 2:
+        raise AdbError(f"测速数据不完整 ({state['received']} / {size} 字节)")
+    elapsed = state["last"] - state["first"]
+    measured = state["received"] - state["first_len"]
+    if elapsed <= 0 or measured <= 0:
+        return float(MAX_BITRATE / HEADROOM["usb"])  # 数据在一个块内就到齐了，按最高档处理
+    return measured * 8 / elapsed / 1e6
+
+
+class LinkTuner:
+    def __init__(self, client, path=TUNING_FILE, max_age=MAX_AGE):
+        self.client = client
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def cached(self, serial):
+        key = f"{serial}|{link_type(serial)}"
+        with self._lock:
+            entry = self._load().get(key)
+        if entry and time.time() - entry.get("measured_at", 0) < self.max_age:
+            return LinkTuning.from_dict(entry)
+        return None
+
+    def tune(self, serial, refresh=False):
+        if not refresh:
+            tuning = self.cached(serial)
+            if tuning is not None:
+                return tuning
+        tuning = choose_params(probe_throughput(self.client, serial), link_type(serial))
+        with self._lock:
+            self._load()[f"{serial}|{tuning.link}"] = tuning.to_dict()
+            try:
+                self._save()
+            except OSError:
+                pass
+        return tuning
@@ -0,0 +1,87 @@
+"""
+线程安全的日志管道：任意线程都可以写入，界面线程定时批量取出；
+最近的记录保存在有界环形缓冲区中，同时写入按大小轮转的日志文件。
+待显示的队列同样有上限：界面来不及取出时丢弃最早的记录 (日志文件中仍然完整)，下次取出时报告丢弃的条数。
+"""
+import collections
+import datetime
+import logging
+import logging.handlers
+import os
+import threading
+
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".artocarpus", "logs")
+LEVELS = ("INFO", "WARNING", "ERROR")
+
+
+class LogRecord:
+    __slots__ = ("time", "level", "serial", "message")
+
+    def __init__(self, level, serial, message):
+        self.time = datetime.datetime.now()
+        self.level = level
+        self.serial = serial
+        self.message = message
+
+    def matches(self, level=None, serial=None):
+        if level and LEVELS.index(self.level) < LEVELS.index(level):
+            return False
+        if serial and self.serial != serial:
+            return False
+        return True
+
+
+class LogSink:
+    def __init__(self, capacity=5000, log_file=None, max_bytes=1024 * 1024, backup_count=3):
+        self._lock = threading.Lock()
+        self._pending = collections.deque(maxlen=capacity)
+        self._dropped = 0  # 因待显示队列已满而丢弃的记录数
+        self.history = collections.deque(maxlen=capacity)
+        self._logger = None
+        if log_file is None:
+            log_file = os.path.join(LOG_DIR, "artocarpus.log")
+        if log_file:
+            try:
+                os.makedirs(os.path.dirname(log_file), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+                handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+                self._logger = logging.getLogger(f"artocarpus.{id(self)}")
+                self._logger.propagate = False
+                self._logger.setLevel(logging.INFO)
+                self._logger.addHandler(handler)
+            except OSError:
+                self._logger = None
+
+    def emit(self, message, level="INFO", serial=None):
+        if level not in LEVELS:
+            level = "INFO"
+        record = LogRecord(level, serial, str(message))
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(record)
+            self.history.append(record)
+        if self._logger:
+            self._logger.log(getattr(logging, level), f"[{serial}] {record.message}" if serial else record.message)
+        return record
+
+    def drain(self, max_items=1000):
+        """取出尚未显示的记录 (最多 max_items 条)；之前有记录被丢弃时，第一条是说明丢弃条数的警告。"""
+        with self._lock:
+            count = min(max_items, len(self._pending))
+            records = [self._pending.popleft() for _ in range(count)]
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            records.insert(0, LogRecord("WARNING", None, f"日志产生过快，已丢弃 {dropped} 条未显示的记录"))
+        return records
+
+    def records(self, level=None, serial=None):
+        with self._lock:
+            snapshot = list(self.history)
+        return [r for r in snapshot if r.matches(level, serial)]
+
+    def close(self):
+        if self._logger:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
@@ -0,0 +1,171 @@
+"""
+Wi-Fi (adb over TCP/IP) 设备的自动重连：维护一组希望保持连接的 ip:port，
+设备从设备列表中消失或变为 offline 时，按带随机抖动的指数退避反复 adb connect，
+直到设备重新上线；上线后调用 on_reconnected(address)，由调用方重新启动对应的 scrcpy 会话。
+
+设备状态由 DeviceTracker 的快照驱动 (update_devices 只更新内存状态，立即返回)；
+重连在单独的调度线程中进行，同时进行的 adb connect 数量受 max_concurrent 限制，
+因此几十个端点同时掉线也不会占满 adb server 连接或阻塞界面。
+"""
+import random
+import threading
+import time
+
+from device_discovery import connect_one
+
+
+class Endpoint:
+    __slots__ = ("address", "state", "online", "failures", "next_attempt", "connecting", "lost_at")
+
+    def __init__(self, address):
+        self.address = address
+        self.state = None  # 设备列表中的状态，不在列表中时为 None
+        self.online = False
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.connecting = False
+        self.lost_at = None
+
+
+class ReconnectWatchdog:
+    """on_event(address, message, level) 与 on_reconnected(address) 都在后台线程中调用。"""
+
+    def __init__(self, client, on_event=None, on_reconnected=None, base_delay=1.0, max_delay=60.0, jitter=0.3,
+                 max_concurrent=4, connect_timeout=5.0):
+        self.client = client
+        self.on_event = on_event
+        self.on_reconnected = on_reconnected
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.connect_timeout = connect_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._cond = threading.Condition()
+        self._endpoints = {}  # address -> Endpoint
+        self._devices = {}  # 最近一次的设备列表快照
+        self._stopped = False
+        self._thread = None
+
+    @staticmethod
+    def normalize(address):
+        address = address.strip()
+        return address if ":" in address else f"{address}:5555"
+
+    def start(self):
+        with self._cond:
+            self._stopped = False
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def want(self, address):
+        """开始守护该地址；当前不在线时立即安排一次连接。"""
+        address = self.normalize(address)
+        with self._cond:
+            if address in self._endpoints:
+                return
+            endpoint = self._endpoints[address] = Endpoint(address)
+            endpoint.state = self._devices.get(address)
+            endpoint.online = endpoint.state == "device"
+            if not endpoint.online:
+                endpoint.lost_at = time.time()
+            self._cond.notify_all()
+
+    def unwant(self, address):
+        with self._cond:
+            self._endpoints.pop(self.normalize(address), None)
+
+    def desired(self):
+        with self._cond:
+            return sorted(self._endpoints)
+
+    def status(self):
+        """[(address, online, failures, 距下次重试的秒数), ...]"""
+        now = time.monotonic()
+        with self._cond:
+            return [(e.address, e.online, e.failures, max(0.0, e.next_attempt - now) if not e.online else 0.0) for e in self._endpoints.values()]
+
+    def update_devices(self, snapshot):
+        """传入 {serial: state} 的完整设备列表 (DeviceTracker 的回调参数)。"""
+        reconnected = []
+        with self._cond:
+            self._devices = dict(snapshot)
+            for endpoint in self._endpoints.values():
+                endpoint.state = snapshot.get(endpoint.address)
+                online = endpoint.state == "device"
+                if online and not endpoint.online:
+                    if endpoint.lost_at is not None:
+                        reconnected.append((endpoint.address, time.time() - endpoint.lost_at))
+                    endpoint.failures, endpoint.lost_at = 0, None
+                elif not online and endpoint.online:
+                    endpoint.lost_at = time.time()
+                    endpoint.next_attempt = time.monotonic()  # 刚掉线时立即重试一次
+                endpoint.online = online
+            self._cond.notify_all()
+        for address, downtime in reconnected:
+            self._emit(address, f"{address} 已重新上线 (离线 {downtime:.0f} 秒)", "INFO")
+            if self.on_reconnected:
+                try:
+                    self.on_reconnected(address)
+                except Exception:
+                    pass
+
+    def _delay(self, failures):
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, failures - 1))
+        # 抖动使同时掉线的设备错开重试时间，避免一起冲击路由器和 adb server
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [e for e in self._endpoints.values() if not e.online and not e.connecting and e.next_attempt <= now]
+                if not due:
+                    waits = [e.next_attempt - now for e in self._endpoints.values() if not e.online and not e.connecting]
+                    self._cond.wait(min(waits) if waits else None)
+                    continue
+                endpoint = min(due, key=lambda e: e.next_attempt)
+                if not self._slots.acquire(blocking=False):
+                    self._cond.wait(0.2)
+                    continue
+                endpoint.connecting = True
+                state = endpoint.state
+            threading.Thread(target=self._attempt, args=(endpoint, state), daemon=True).start()
+
+    def _attempt(self, endpoint, state):
+        try:
+            if state == "offline":
+                # adb 仍保留着失效的连接时 connect 只会返回 already connected，需要先断开
+                try:
+                    self.client.disconnect(endpoint.address)
+                except Exception:
+                    pass
+            ok, message = connect_one(self.client, endpoint.address, self.connect_timeout)
+        finally:
+            self._slots.release()
+        delay = None
+        with self._cond:
+            endpoint.connecting = False
+            if not endpoint.online:
+                # 即使 adb 报告已连接，也要等设备列表显示 device 才算恢复；否则按退避继续重试
+                endpoint.failures += 1
+                delay = self._delay(endpoint.failures)
+                endpoint.next_attempt = time.monotonic() + delay
+            self._cond.notify_all()
+        if not ok and delay is not None:
+            self._emit(endpoint.address, f"重连 {endpoint.address} 失败 (第 {endpoint.failures} 次，{delay:.0f} 秒后重试): {message}", "WARNING")
+
+    def _emit(self, address, message, level):
+        if self.on_event:
+            try:
+                self.on_event(address, message, level)
+            except Exception:
+                pass
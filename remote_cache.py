@@ -0,0 +1,139 @@
+"""
+手机目录列表缓存：按 (设备, 路径) 缓存 sync LIST 的结果 (含大小与修改时间)，
+带过期时间与 LRU 淘汰，并可在后台预取子目录。
+"""
+import posixpath
+import shlex
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from adb_client import AdbError, AdbServerUnavailable
+
+
+class RemoteEntry:
+    __slots__ = ("name", "is_dir", "size", "mtime")
+
+    def __init__(self, name, is_dir, size, mtime):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+
+
+def normalize_remote_dir(path):
+    path = posixpath.normpath(path or "/")
+    return "/" if path in (".", "//") else path
+
+
+class RemoteListingCache:
+    def __init__(self, client, ttl=30.0, max_entries=256, prefetch_workers=2):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (serial, path) -> (获取时间, [RemoteEntry])
+        self._inflight = {}  # (serial, path) -> threading.Event
+        self._prefetch_slots = threading.Semaphore(prefetch_workers)
+
+    def peek(self, serial, path):
+        """命中且未过期时返回列表，否则返回 None；不会访问设备。"""
+        key = (serial, normalize_remote_dir(path))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return cached[1]
+        return None
+
+    def get(self, serial, path):
+        key = (serial, normalize_remote_dir(path))
+        while True:
+            cached = self.peek(*key)
+            if cached is not None:
+                return cached
+            with self._lock:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                # 同一目录已在预取中，等待其结果而不是再发一次请求
+                pending.wait(self.client.timeout)
+                with self._lock:
+                    if key in self._entries:
+                        continue
+                owner = True
+            try:
+                entries = self._fetch(*key)
+                with self._lock:
+                    self._entries[key] = (time.monotonic(), entries)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return entries
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is pending:
+                        del self._inflight[key]
+                pending.set()
+
+    def prefetch(self, serial, paths):
+        for path in paths:
+            key = (serial, normalize_remote_dir(path))
+            if self.peek(*key) is not None:
+                continue
+            with self._lock:
+                if key in self._inflight:
+                    continue
+            threading.Thread(target=self._prefetch_one, args=key, daemon=True).start()
+
+    def _prefetch_one(self, serial, path):
+        with self._prefetch_slots:
+            try:
+                self.get(serial, path)
+            except Exception:
+                pass
+
+    def invalidate(self, serial, path=None):
+        """使 path 本身、其子目录及其父目录的缓存失效；path 为 None 时清除该设备的全部缓存。"""
+        with self._lock:
+            if path is None:
+                stale = [key for key in self._entries if key[0] == serial]
+            else:
+                path = normalize_remote_dir(path)
+                parent = posixpath.dirname(path)
+                prefix = path.rstrip('/') + '/'
+                stale = [key for key in self._entries if key[0] == serial and (key[1] in (path, parent) or key[1].startswith(prefix))]
+            for key in stale:
+                del self._entries[key]
+
+    def _fetch(self, serial, path):
+        try:
+            raw = self.client.listdir(serial, path if path.endswith('/') else path + '/')
+            if not raw and self.client.stat(serial, path)[0] == 0:
+                raise AdbError(f"{path}: No such file or directory")
+            entries = [RemoteEntry(name, stat.S_ISDIR(mode) or stat.S_ISLNK(mode), size, mtime) for name, mode, size, mtime in raw]
+        except AdbServerUnavailable:
+            entries = self._fetch_via_shell(serial, path)
+        entries.sort(key=lambda e: (not e.is_dir, e.name))
+        return entries
+
+    def _fetch_via_shell(self, serial, path):
+        # adb server 不可达时用一次 find + stat 取得同样的信息
+        command = f"find {shlex.quote(path.rstrip('/') + '/')} -mindepth 1 -maxdepth 1 -exec stat -c '%f %s %Y %n' {{}} +"
+        output = self.client.shell(serial, command, check=True)
+        entries = []
+        for line in output.splitlines():
+            parts = line.split(" ", 3)
+            if len(parts) != 4:
+                continue
+            try:
+                mode, size, mtime = int(parts[0], 16), int(parts[1]), int(parts[2])
+            except ValueError:
+                continue
+            entries.append(RemoteEntry(posixpath.basename(parts[3]), stat.S_ISDIR(mode) or stat.S_ISLNK(mode), size, mtime))
+        return entries
@@ -0,0 +1,335 @@
+"""
+大文件的断点续传：数据先写入目标旁边的 .part 文件，每确认一段 (CHECKPOINT_SIZE) 就记入
+~/.artocarpus/transfer_journal.json，中断 (数据线松动、Wi-Fi 断开、程序退出) 后从最后确认的位置继续；
+全部传完后比较两端的 MD5，一致才替换为正式文件，因此不会留下看似完整的残缺文件。
+
+拉取：设备端 `dd skip=` 从断点开始输出，一条数据流传完剩余部分，途中定期 fsync 并记录位置。
+推送：每段用一次 `head -c N >> 文件.part` 追加，设备端确认退出码后才记录位置
+(adb exec 无法单独关闭 stdin，head -c 读满 N 字节后会自行退出)。
+"""
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shlex
+import stat
+import threading
+import time
+
+from adb_client import AdbError, AdbServerUnavailable, posix_basename
+
+JOURNAL_FILE = os.path.join(os.path.expanduser("~"), ".artocarpus", "transfer_journal.json")
+RESUMABLE_MIN_SIZE = 64 * 1024 * 1024  # 小于此大小的文件直接整体传输
+BLOCK_SIZE = 64 * 1024  # dd 的块大小，断点位置总是它的整数倍
+CHECKPOINT_SIZE = 16 * 1024 * 1024
+VERIFY_SIZE = 1024 * 1024  # 续传前比较断点之前这么多字节的 MD5，确认已有数据与设备一致
+MAX_RETRIES = 6  # 连续失败 (期间没有任何进展) 的重试次数，退避 1、2、4… 秒
+COPY_CHUNK = 256 * 1024
+_EXIT_MARKER = b"__ARTOCARPUS_PART_EXIT__:"
+_EXIT_LINE = re.compile(re.escape(_EXIT_MARKER) + rb"(\d+)\s")
+_MD5_LINE = re.compile(r"\b([0-9a-f]{32})\b")
+
+
+class ResumeResult:
+    __slots__ = ("path", "size", "resumed_from", "verified", "retries")
+
+    def __init__(self, path, size, resumed_from=0, verified=False, retries=0):
+        self.path = path
+        self.size = size
+        self.resumed_from = resumed_from
+        self.verified = verified  # False 表示设备上没有 md5sum，未能校验
+        self.retries = retries
+
+
+class TransferJournal:
+    """未完成传输的记录：{键: {direction, serial, source, dest, size, mtime, offset, updated_at}}。"""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(direction, serial, source, dest):
+        return f"{direction}|{serial}|{source}|{dest}"
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+            return dict(entry) if entry else None
+
+    def update(self, key, **fields):
+        with self._lock:
+            entry = self._load().setdefault(key, {})
+            entry.update(fields, updated_at=time.time())
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def remove(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                try:
+                    self._save()
+                except OSError:
+                    pass
+
+    def incomplete(self):
+        """[(键, 记录), ...]，最近更新的在前。"""
+        with self._lock:
+            return sorted(((k, dict(v)) for k, v in self._load().items()), key=lambda kv: -kv[1].get("updated_at", 0))
+
+
+def remote_md5(client, serial, path, size):
+    # 设备上计算大文件的 MD5 需要时间，超时按 20 MB/s 估算
+    output = client.shell(serial, f"md5sum {shlex.quote(path)}", timeout=max(60, size / (20 * 1024 * 1024)))
+    match = _MD5_LINE.search(output)
+    return match.group(1) if match else None
+
+
+def _remote_range_md5(client, serial, path, offset, length):
+    command = f"dd if={shlex.quote(path)} bs={BLOCK_SIZE} skip={offset // BLOCK_SIZE} count={length // BLOCK_SIZE} 2>/dev/null | md5sum"
+    match = _MD5_LINE.search(client.shell(serial, command, timeout=30))
+    return match.group(1) if match else None
+
+
+def _local_md5(f, end, start=0, digest=None):
+    digest = digest or hashlib.md5()
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest
+
+
+def _verified_offset(client, serial, remote_path, local_file, offset):
+    """断点之前最后 VERIFY_SIZE 字节两端一致时返回 offset，否则返回 0 (从头开始)。"""
+    if offset <= 0:
+        return 0
+    start = max(0, offset - VERIFY_SIZE)
+    try:
+        remote = _remote_range_md5(client, serial, remote_path, start, offset - start)
+    except AdbError:
+        return 0
+    return offset if remote == _local_md5(local_file, offset, start).hexdigest() else 0
+
+
+def remote_file_size(client, serial, path, size):
+    """
+    client.stat 返回的 size 在设备不支持 stat_v2 时来自 sync v1，只有 32 位，4 GiB 以上的文件会回绕；
+    此时改用 shell 的 `stat -c %s` 取得真实大小 (失败时仍返回原值)。
+    """
+    if "stat_v2" in client.features(serial):
+        return size
+    try:
+        return int(client.shell(serial, f"stat -c %s {shlex.quote(path)}", timeout=30, check=True).split()[-1])
+    except (AdbError, ValueError, IndexError):
+        return size
+
+
+def _retry_wait(retries, error):
+    if retries > MAX_RETRIES:
+        raise AdbError(f"传输多次中断，已保留进度，可稍后继续: {error}") from error
+    time.sleep(min(30, 2 ** (retries - 1)))
+
+
+def pull_resumable(client, serial, remote_path, local_path, journal, progress=None):
+    """
+    行为与 AdbClient.pull 对单个文件的处理一致：local_path 为已存在的文件夹时放入其中。
+    progress(path, done, total) 的 done 包含续传前已有的字节数。
+    """
+    mode, size, mtime = client.stat(serial, remote_path)
+    if mode == 0:
+        raise AdbError(f"远程路径不存在: {remote_path}")
+    if stat.S_ISDIR(mode):
+        raise AdbError(f"断点续传只支持单个文件: {remote_path}")
+    size = remote_file_size(client, serial, remote_path, size)
+    if os.path.isdir(local_path):
+        local_path = os.path.join(local_path, posix_basename(remote_path))
+    local_path = os.path.abspath(local_path)
+    part_path = local_path + ".part"
+    key = journal.key("pull", serial, remote_path, local_path)
+    entry = journal.get(key)
+    offset = 0
+    if entry and entry.get("size") == size and entry.get("mtime") == mtime and os.path.isfile(part_path):
+        offset = min(entry.get("offset", 0), os.path.getsize(part_path))
+        offset -= offset % BLOCK_SIZE
+    with open(part_path, 'r+b' if offset else 'wb') as f:
+        offset = _verified_offset(client, serial, remote_path, f, offset)
+        resumed_from = offset
+        journal.update(key, direction="pull", serial=serial, source=remote_path, dest=local_path, size=size, mtime=mtime, offset=offset)
+        digest = _local_md5(f, offset)  # 已有部分的 MD5，之后随接收的数据增量更新
+        f.seek(offset); f.truncate()
+        checkpoint, retries = offset, 0
+        while offset < size:
+            # dd 只能按块跳过：中途断开后的位置不在块边界时，丢弃数据流开头多出的部分
+            discard = offset % BLOCK_SIZE
+            command = f"dd if={shlex.quote(remote_path)} bs={BLOCK_SIZE} skip={offset // BLOCK_SIZE} 2>/dev/null"
+            try:
+                stream = client.open_exec(serial, command)
+            except (OSError, AdbError) as e:
+                retries += 1
+                _retry_wait(retries, e)
+                continue
+            error = None
+            try:
+                while offset < size:
+                    try:
+                        chunk = stream.read(COPY_CHUNK)
+                    except OSError as e:
+                        error = e
+                        break
+                    if not chunk:
+                        error = AdbError("数据流提前结束")
+                        break
+                    if discard:
+                        chunk, discard = chunk[discard:], max(0, discard - len(chunk))
+                        if not chunk:
+                            continue
+                    chunk = chunk[:size - offset]
+                    f.write(chunk)
+                    digest.update(chunk)
+                    offset += len(chunk)
+                    retries = 0
+                    if offset - checkpoint >= CHECKPOINT_SIZE:
+                        f.flush(); os.fsync(f.fileno())
+                        checkpoint = offset - offset % BLOCK_SIZE
+                        journal.update(key, offset=checkpoint)
+                    if progress: progress(remote_path, offset, size)
+            finally:
+                stream.close()
+            if error is not None:
+                retries += 1
+                _retry_wait(retries, error)
+        f.flush(); os.fsync(f.fileno())
+    journal.update(key, offset=size)
+    local_md5 = digest.hexdigest()
+    device_md5 = remote_md5(client, serial, remote_path, size)
+    if device_md5 and device_md5 != local_md5:
+        os.remove(part_path)
+        journal.remove(key)
+        raise AdbError(f"MD5 校验失败 (设备 {device_md5}，电脑 {local_md5})，已删除不完整的文件")
+    os.replace(part_path, local_path)
+    os.utime(local_path, (mtime, mtime))
+    journal.remove(key)
+    return ResumeResult(local_path, size, resumed_from, device_md5 is not None, retries)
+
+
+def push_resumable(client, serial, local_path, remote_path, journal, progress=None):
+    """行为与 AdbClient.push 对单个文件的处理一致：remote_path 为已存在的文件夹时放入其中。"""
+    if not os.path.isfile(local_path):
+        raise AdbError(f"断点续传只支持单个文件: {local_path}")
+    local_path = os.path.abspath(local_path)
+    st = os.stat(local_path)
+    size, mtime = st.st_size, int(st.st_mtime)
+    if stat.S_ISDIR(client.stat(serial, remote_path)[0]):
+        remote_path = posixpath.join(remote_path.rstrip('/'), os.path.basename(local_path))
+    part_path = remote_path + ".part"
+    key = journal.key("push", serial, local_path, remote_path)
+    entry = journal.get(key)
+    offset = 0
+    if entry and entry.get("size") == size and entry.get("mtime") == mtime:
+        part_mode, part_size, _ = client.stat(serial, part_path)
+        if stat.S_ISREG(part_mode):
+            offset = min(entry.get("offset", 0), remote_file_size(client, serial, part_path, part_size))
+            offset -= offset % BLOCK_SIZE
+    with open(local_path, 'rb') as f:
+        offset = _verified_offset(client, serial, part_path, f, offset)
+        resumed_from = offset
+        journal.update(key, direction="push", serial=serial, source=local_path, dest=remote_path, size=size, mtime=mtime, offset=offset)
+        digest = _local_md5(f, offset)
+        client.shell(serial, f"mkdir -p {shlex.quote(posixpath.dirname(remote_path) or '/')}", timeout=30)
+        target = shlex.quote(part_path)
+        retries = 0
+        while offset < size:
+            length = min(CHECKPOINT_SIZE, size - offset)
+            # truncate 丢弃上一次失败时可能写入的半段数据，再追加本段
+            command = f"truncate -s {offset} {target} && head -c {length} >> {target}; echo {_EXIT_MARKER.decode()}$?"
+            range_digest = digest.copy()
+            try:
+                stream = client.open_exec(serial, command)
+            except (OSError, AdbError) as e:
+                retries += 1
+                _retry_wait(retries, e)
+                continue
+            output = b""
+            try:
+                f.seek(offset)
+                sent = 0
+                while sent < length:
+                    chunk = f.read(min(COPY_CHUNK, length - sent))
+                    if not chunk:
+                        raise AdbError(f"本地文件在传输过程中被修改: {local_path}")
+                    stream.write(chunk)
+                    range_digest.update(chunk)
+                    sent += len(chunk)
+                    if progress: progress(local_path, offset + sent, size)
+                stream.flush()
+                while not _EXIT_LINE.search(output):
+                    chunk = stream.read(4096)
+                    if not chunk:
+                        break
+                    output += chunk
+            except OSError as e:
+                output = b""
+                error = e
+            else:
+                error = None
+            finally:
+                stream.close()
+            match = _EXIT_LINE.search(output)
+            if match and match.group(1) != b"0":
+                raise AdbError(f"设备端写入失败 (退出码 {match.group(1).decode()}，空间不足或目标不可写?)")
+            if not match:
+                retries += 1
+                _retry_wait(retries, error or AdbError("设备端没有确认写入"))
+                continue
+            offset += length
+            digest, retries = range_digest, 0
+            journal.update(key, offset=offset)
+    local_md5 = digest.hexdigest()
+    device_md5 = remote_md5(client, serial, part_path, size)
+    if device_md5 and device_md5 != local_md5:
+        client.shell(serial, f"rm -f {target}", timeout=30)
+        journal.remove(key)
+        raise AdbError(f"MD5 校验失败 (设备 {device_md5}，电脑 {local_md5})，已删除不完整的文件")
+    # touch -d @秒数 在较旧的 toybox 上不可用，修改时间只是尽量保持一致
+    client.shell(serial, f"mv -f {target} {shlex.quote(remote_path)} && touch -m -d @{mtime} {shlex.quote(remote_path)}", timeout=30, check=False)
+    if not stat.S_ISREG(client.stat(serial, remote_path)[0]):
+        raise AdbError(f"无法把 {part_path} 重命名为 {remote_path}")
+    journal.remove(key)
+    return ResumeResult(remote_path, size, resumed_from, device_md5 is not None, retries)
+
+
+def can_resume(client, direction, serial, source, size):
+    """单个文件且不小于 RESUMABLE_MIN_SIZE 时使用断点续传；adb server 不可用时退回普通传输。"""
+    if not size or size < RESUMABLE_MIN_SIZE:
+        return False
+    if direction == "push":
+        return os.path.isfile(source)
+    try:
+        return stat.S_ISREG(client.stat(serial, source)[0])
+    except AdbServerUnavailable:
+        return False
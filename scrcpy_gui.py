@@ -1,29 +1,96 @@
+import sys
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # 带子命令运行时 (如 artocarpus run --profile wall1) 直接进入命令行模式，不加载 tkinter
+    import artocarpus_cli
+    if sys.argv[1] in artocarpus_cli.COMMANDS:
+        sys.exit(artocarpus_cli.main())
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import subprocess
 import os
-import sys
 import threading
 import re
 import datetime
-import json
+import bisect
+import time
+from adb_client import AdbClient, AdbError, DeviceTracker, diff_device_states
+from transfer_engine import TransferEngine, FINISHED_STATES, DONE, FAILED, format_bytes, format_rate, format_eta
+from remote_cache import RemoteListingCache
+from log_sink import LogSink, LEVELS as LOG_LEVELS
+from launch_orchestrator import LaunchOrchestrator, profile_command
+from session_supervisor import SessionSupervisor
+from app_config import get_executable_path
+from settings_store import SettingsStore, duplicate_serials
+from encoder_cache import EncoderCache, preferred_encoder
+from link_tuner import LinkTuner
+from reconnect_watchdog import ReconnectWatchdog
+from tcpip_provision import is_usb_serial, provision_all
+from device_discovery import DEFAULT_PORTS, discover, expand_targets, local_subnet, parse_ports
+from broadcast_push import DEFAULT_LIMITS, DEFAULT_REMOTE_DIR, broadcast
+from screen_capture import CapturePipeline
+from segment_recorder import SegmentRecorder
+from call_metrics import CallMetrics, format_duration
+
+# ttkthemes (pip install ttkthemes) 较慢，在窗口首次绘制之后才加载，见 ScrcpyGUI._load_theme_engine
+ALLOWED_THEMES = ["yaru", "ubuntu", "radiance", "clam", "breeze", "arc",
+                  "scidgreen", "scidgery", "scidmint", "scidpink", "scidpurple", "scidsand"]
+
+class ChunkedListMixin:
+    # 两个文件浏览器共用：列表在后台线程中生成，再分批插入 Treeview，避免超大目录卡住界面；
+    # 同时提供按文件名即时筛选
+    CHUNK_SIZE = 400
+
+    def _create_filter_box(self):
+        self._all_rows = []  # [(小写文件名, values)]
+        self._render_generation = 0
+        self._filter_after_id = None
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        ttk.Label(filter_frame, text="筛选:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.entry_filter = ttk.Entry(filter_frame, textvariable=self.filter_var)
+        self.entry_filter.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.filter_var.trace_add("write", lambda *args: self._schedule_filter())
+
+    def _schedule_filter(self):
+        if self._filter_after_id: self.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.after(150, self._render_rows)
+
+    def _clear_rows(self):
+        self._render_generation += 1
+        self._all_rows = []
+        self.tree.delete(*self.tree.get_children())
+
+    def _set_rows(self, rows):
+        self._all_rows = rows
+        if self._filter_after_id: self.after_cancel(self._filter_after_id)
+        self._render_rows()
 
-# 确保 ttkthemes 已安装 (pip install ttkthemes)
-try:
-    from ttkthemes import ThemedTk
-    TTKTHEMES_AVAILABLE = True
-except ImportError:
-    TTKTHEMES_AVAILABLE = False
+    def _render_rows(self):
+        self._filter_after_id = None
+        self._render_generation += 1
+        self.tree.delete(*self.tree.get_children())
+        text = self.filter_var.get().strip().lower()
+        rows = [values for key, values in self._all_rows if text in key] if text else [values for _key, values in self._all_rows]
+        self._insert_chunk(self._render_generation, rows, 0)
+
+    def _insert_chunk(self, generation, rows, start):
+        if generation != self._render_generation or not self.winfo_exists(): return  # 已有新的列表或筛选条件
+        for values in rows[start:start + self.CHUNK_SIZE]:
+            self.tree.insert("", "end", values=values)
+        if start + self.CHUNK_SIZE < len(rows):
+            self.after(1, lambda: self._insert_chunk(generation, rows, start + self.CHUNK_SIZE))
 
-class PhoneFileBrowser(tk.Toplevel):
-    def __init__(self, master, adb_path, device_serial, callback_func):
+class PhoneFileBrowser(ChunkedListMixin, tk.Toplevel):
+    PREFETCH_LIMIT = 32  # 每次最多预取的子目录数量
+
+    def __init__(self, master, listing_cache, device_serial, callback_func):
         super().__init__(master)
         self.transient(master)
         self.grab_set()
         self.title("浏览手机文件")
         self.geometry("500x600")
 
-        self.adb_path = adb_path
+        self.listing_cache = listing_cache
         self.device_serial = device_serial
         self.callback = callback_func
         self.current_path = "/sdcard/"
@@ -36,12 +103,13 @@ class PhoneFileBrowser(tk.Toplevel):
         self.entry_path = ttk.Entry(nav_frame, textvariable=self.path_var)
         self.entry_path.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.entry_path.bind("<Return>", lambda e: self._populate_list(self.path_var.get()))
+        self._create_filter_box()
 
         list_frame = ttk.Frame(self)
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
-        self.tree = ttk.Treeview(list_frame, columns=("name",), show="headings", selectmode="browse")
-        self.tree.heading("name", text="文件名")
-        self.tree.column("name", anchor="w")
+        self.tree = ttk.Treeview(list_frame, columns=("name", "size", "mtime"), show="headings", selectmode="browse")
+        self.tree.heading("name", text="文件名"); self.tree.heading("size", text="大小"); self.tree.heading("mtime", text="修改时间")
+        self.tree.column("name", anchor="w"); self.tree.column("size", anchor="e", width=80, stretch=False); self.tree.column("mtime", anchor="w", width=130, stretch=False)
         vsb = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
         self.tree.configure(yscrollcommand=vsb.set)
         vsb.pack(side=tk.RIGHT, fill=tk.Y)
@@ -60,26 +128,31 @@ class PhoneFileBrowser(tk.Toplevel):
         else:
             self.current_path = path.rstrip('/') + '/'
         self.path_var.set(self.current_path)
-        self.tree.delete(*self.tree.get_children())
+        if self.filter_var.get(): self.filter_var.set("")
+        self._clear_rows()
         self.update_idletasks()
-        cmd = [self.adb_path, "-s", self.device_serial, "shell", "ls", "-F", self.current_path]
+        path_to_list = self.current_path
         def target():
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=15, encoding='utf-8', errors='replace')
-                folders = sorted([item for item in result.stdout.strip().splitlines() if item.endswith('/')])
-                files = sorted([item for item in result.stdout.strip().splitlines() if not item.endswith('/')])
-                self.master.after(0, lambda: self._insert_items(folders, files))
+                # 缓存命中时不会访问设备；行内容也在后台线程中生成
+                with self.listing_cache.client.metrics.measure("browse list", self.device_serial, path_to_list):
+                    entries = self.listing_cache.get(self.device_serial, path_to_list)
+                rows = []
+                for entry in entries:
+                    mtime = datetime.datetime.fromtimestamp(entry.mtime).strftime("%Y-%m-%d %H:%M") if entry.mtime else ""
+                    if entry.is_dir: rows.append((entry.name.lower(), (f"📁 {entry.name}", "", mtime)))
+                    else: rows.append((entry.name.lower(), (f"📄 {entry.name}", format_bytes(entry.size), mtime)))
+                self.master.after(0, lambda: self._insert_items(path_to_list, entries, rows))
             except Exception as e:
-                self.master.after(0, lambda: messagebox.showerror("错误", f"无法读取目录 {self.current_path}:\n{e}", parent=self))
+                self.master.after(0, lambda: messagebox.showerror("错误", f"无法读取目录 {path_to_list}:\n{e}", parent=self))
         threading.Thread(target=target, daemon=True).start()
 
-    def _insert_items(self, folders, files):
-        # 去除文件夹条目的'/'后缀
-        for item in folders:
-            folder_name = item.rstrip('/')  # 关键修改：去除后缀
-            self.tree.insert("", "end", values=(f"📁 {folder_name}",))
-        for item in files:
-            self.tree.insert("", "end", values=(f"📄 {item}",))
+    def _insert_items(self, path, entries, rows):
+        if path != self.current_path or not self.winfo_exists(): return  # 用户已经切换到其他目录
+        self._set_rows(rows)
+        # 后台预取子目录，下钻时可直接命中缓存
+        child_dirs = [path + entry.name + '/' for entry in entries if entry.is_dir][:self.PREFETCH_LIMIT]
+        self.listing_cache.prefetch(self.device_serial, child_dirs)
 
     def _on_item_double_click(self, event):
         item_id = self.tree.focus()
@@ -120,7 +193,7 @@ class PhoneFileBrowser(tk.Toplevel):
         self.callback(selected_path)
         self.destroy()
 
-class PCFileBrowser(tk.Toplevel):
+class PCFileBrowser(ChunkedListMixin, tk.Toplevel):
     def __init__(self, master, callback_func):
         super().__init__(master)
         self.transient(master)
@@ -138,6 +211,7 @@ class PCFileBrowser(tk.Toplevel):
         self.entry_path = ttk.Entry(nav_frame, textvariable=self.path_var)
         self.entry_path.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.entry_path.bind("<Return>", lambda e: self._populate_list(self.path_var.get()))
+        self._create_filter_box()
 
         list_frame = ttk.Frame(self)
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
@@ -157,26 +231,37 @@ class PCFileBrowser(tk.Toplevel):
         self._populate_list(self.current_path)
 
     def _populate_list(self, path):
-        try:
-            if not os.path.isdir(path):
-                messagebox.showerror("路径错误", f"路径不存在或不是一个文件夹:\n{path}", parent=self)
-                return
-            self.current_path = os.path.abspath(path)
-            self.path_var.set(self.current_path)
-            self.tree.delete(*self.tree.get_children())
-            self.update_idletasks()
-            items = os.listdir(path)
-            folders = sorted([f for f in items if os.path.isdir(os.path.join(path, f))])
-            files = sorted([f for f in items if os.path.isfile(os.path.join(path, f))])
-            self._insert_items(folders, files)
-        except PermissionError:
-            messagebox.showwarning("权限错误", f"无法访问此文件夹:\n{path}", parent=self)
-        except Exception as e:
-            messagebox.showerror("错误", f"读取目录时发生错误:\n{e}", parent=self)
+        if not os.path.isdir(path):
+            messagebox.showerror("路径错误", f"路径不存在或不是一个文件夹:\n{path}", parent=self)
+            return
+        self.current_path = os.path.abspath(path)
+        self.path_var.set(self.current_path)
+        if self.filter_var.get(): self.filter_var.set("")
+        self._clear_rows()
+        self.update_idletasks()
+        path_to_list = self.current_path
+        def target():
+            try:
+                # os.scandir 自带文件类型信息，不必对每个条目分别调用 isdir/isfile
+                folders, files = [], []
+                with os.scandir(path_to_list) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(): folders.append(entry.name)
+                            elif entry.is_file(): files.append(entry.name)
+                        except OSError:
+                            continue
+                rows = [(f.lower(), (f"📁 {f}",)) for f in sorted(folders)] + [(f.lower(), (f"📄 {f}",)) for f in sorted(files)]
+                self.master.after(0, lambda: self._insert_items(path_to_list, rows))
+            except PermissionError:
+                self.master.after(0, lambda: messagebox.showwarning("权限错误", f"无法访问此文件夹:\n{path_to_list}", parent=self))
+            except Exception as e:
+                self.master.after(0, lambda: messagebox.showerror("错误", f"读取目录时发生错误:\n{e}", parent=self))
+        threading.Thread(target=target, daemon=True).start()
 
-    def _insert_items(self, folders, files):
-        for folder in folders: self.tree.insert("", "end", values=(f"📁 {folder}",))
-        for file in files: self.tree.insert("", "end", values=(f"📄 {file}",))
+    def _insert_items(self, path, rows):
+        if path != self.current_path or not self.winfo_exists(): return  # 用户已经切换到其他目录
+        self._set_rows(rows)
 
     def _on_item_double_click(self, event):
         item_id = self.tree.focus()
@@ -201,6 +286,174 @@ class PCFileBrowser(tk.Toplevel):
         self.callback(selected_path)
         self.destroy()
 
+class DiscoveryDialog(tk.Toplevel):
+    # 扫描在后台线程中进行，结果通过 after(0) 逐条加入列表
+    def __init__(self, master, client, on_finished=None):
+        super().__init__(master)
+        self.transient(master)
+        self.title("发现 Wi-Fi 设备")
+        self.geometry("560x460")
+        self.client = client
+        self.on_finished = on_finished
+        self.stop_event = None
+
+        form = ttk.Frame(self); form.pack(fill=tk.X, padx=5, pady=5); form.grid_columnconfigure(1, weight=1)
+        ttk.Label(form, text="地址范围:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        self.targets_var = tk.StringVar(value=local_subnet()); ttk.Entry(form, textvariable=self.targets_var).grid(row=0, column=1, columnspan=3, sticky="ew", padx=5, pady=2)
+        ttk.Label(form, text="端口:").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+        self.ports_var = tk.StringVar(value="5555"); ttk.Entry(form, textvariable=self.ports_var, width=16).grid(row=1, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(form, text="同时连接数:").grid(row=1, column=2, sticky="e", padx=5, pady=2)
+        self.budget_var = tk.IntVar(value=8); ttk.Spinbox(form, from_=1, to=64, width=4, textvariable=self.budget_var).grid(row=1, column=3, sticky="w", padx=5, pady=2)
+        self.mdns_var = tk.BooleanVar(value=True); ttk.Checkbutton(form, text="同时查询 mDNS (adb mdns services)", variable=self.mdns_var).grid(row=2, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        self.btn_start = ttk.Button(form, text="开始扫描并连接", command=self._start); self.btn_start.grid(row=2, column=2, columnspan=2, sticky="e", padx=5, pady=2)
+
+        list_frame = ttk.Frame(self); list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        self.tree = ttk.Treeview(list_frame, columns=("address", "source", "state"), show="headings")
+        self.tree.heading("address", text="地址"); self.tree.heading("source", text="来源"); self.tree.heading("state", text="状态")
+        self.tree.column("address", width=160, anchor="w"); self.tree.column("source", width=140, anchor="w"); self.tree.column("state", anchor="w")
+        vsb = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview); self.tree.configure(yscrollcommand=vsb.set)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y); self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.status_var = tk.StringVar(value="输入网段 (如 192.168.1.0/24)、范围 (192.168.1.10-60) 或地址，多个用空格分隔。")
+        ttk.Label(self, textvariable=self.status_var, anchor="w").pack(fill=tk.X, padx=5, pady=5)
+        self.protocol("WM_DELETE_WINDOW", self._close)
+
+    def _start(self):
+        try:
+            ports = parse_ports(self.ports_var.get()) or list(DEFAULT_PORTS)
+            specs = self.targets_var.get().split()
+            expand_targets(specs, ports)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e), parent=self); return
+        self.tree.delete(*self.tree.get_children())
+        self.btn_start.config(state=tk.DISABLED); self.status_var.set("正在扫描...")
+        self.stop_event = threading.Event(); stop_event = self.stop_event
+        use_mdns, budget = self.mdns_var.get(), max(1, self.budget_var.get())
+        def on_event(kind, address, message):
+            self.after(0, lambda: self._on_event(kind, address, message))
+        def target():
+            try: results = discover(self.client, specs, ports, use_mdns=use_mdns, connect_budget=budget, on_event=on_event, stop_event=stop_event)
+            except Exception as e: results = None; on_event("error", "", str(e))
+            self.after(0, lambda: self._on_done(results))
+        threading.Thread(target=target, daemon=True).start()
+
+    def _on_event(self, kind, address, message):
+        if not self.winfo_exists(): return
+        if kind == "error": self.status_var.set(message); return
+        if kind in ("found", "mdns"):
+            if not self.tree.exists(address): self.tree.insert("", tk.END, iid=address, values=(address, message if kind == "mdns" else "端口扫描", "正在连接..."))
+        elif self.tree.exists(address): self.tree.set(address, "state", "已连接" if kind == "connected" else f"失败: {message}")
+        self.status_var.set(f"已发现 {len(self.tree.get_children())} 个地址")
+
+    def _on_done(self, results):
+        if not self.winfo_exists(): return
+        self.btn_start.config(state=tk.NORMAL)
+        if results is not None: self.status_var.set(f"完成：发现 {len(self.tree.get_children())} 个地址，成功连接 {sum(1 for ok, _ in results.values() if ok)} 台")
+        if self.on_finished: self.on_finished()
+
+    def _close(self):
+        if self.stop_event: self.stop_event.set()
+        self.destroy()
+
+class BroadcastDialog(tk.Toplevel):
+    # 一个文件/文件夹推送到多台设备或在多台设备上安装同一个 APK；每台设备的结果通过 after(0) 更新到列表
+    def __init__(self, master, client, serials, local_path="", remote_path="", log=None, remote_cache=None):
+        super().__init__(master)
+        self.transient(master)
+        self.title("广播推送 / 批量安装 APK")
+        self.geometry("680x520")
+        self.client = client
+        self.log = log
+        self.remote_cache = remote_cache
+        self.stop_event = None
+
+        form = ttk.Frame(self); form.pack(fill=tk.X, padx=5, pady=5); form.grid_columnconfigure(1, weight=1)
+        ttk.Label(form, text="本地文件/文件夹:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        self.local_var = tk.StringVar(value=local_path); ttk.Entry(form, textvariable=self.local_var).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Button(form, text="文件", width=6, command=lambda: self._browse(filedialog.askopenfilename)).grid(row=0, column=2, padx=2, pady=2)
+        ttk.Button(form, text="文件夹", width=6, command=lambda: self._browse(filedialog.askdirectory)).grid(row=0, column=3, padx=2, pady=2)
+        ttk.Label(form, text="手机目标路径:").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+        self.remote_var = tk.StringVar(value=remote_path or DEFAULT_REMOTE_DIR); self.remote_entry = ttk.Entry(form, textvariable=self.remote_var); self.remote_entry.grid(row=1, column=1, columnspan=3, sticky="ew", padx=5, pady=2)
+        self.install_var = tk.BooleanVar(value=local_path.lower().endswith(".apk"))
+        ttk.Checkbutton(form, text="安装 APK (不推送文件)", variable=self.install_var, command=self._toggle_install).grid(row=2, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+        limits = ttk.Frame(form); limits.grid(row=3, column=0, columnspan=4, sticky="ew")
+        ttk.Label(limits, text="同时传输 USB:").pack(side=tk.LEFT, padx=5)
+        self.usb_limit_var = tk.IntVar(value=DEFAULT_LIMITS["usb"]); ttk.Spinbox(limits, from_=1, to=32, width=4, textvariable=self.usb_limit_var).pack(side=tk.LEFT)
+        ttk.Label(limits, text="Wi-Fi:").pack(side=tk.LEFT, padx=5)
+        self.wifi_limit_var = tk.IntVar(value=DEFAULT_LIMITS["wifi"]); ttk.Spinbox(limits, from_=1, to=32, width=4, textvariable=self.wifi_limit_var).pack(side=tk.LEFT)
+        self.btn_start = ttk.Button(limits, text="开始", command=self._start); self.btn_start.pack(side=tk.RIGHT, padx=5)
+        ttk.Button(limits, text="全选", command=lambda: self.tree.selection_set(self.tree.get_children())).pack(side=tk.RIGHT, padx=5)
+
+        list_frame = ttk.Frame(self); list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        columns = ("serial", "state", "transferred", "speed", "elapsed", "message")
+        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        for col, text, width in zip(columns, ("设备", "状态", "已传输", "速度", "用时", "信息"), (150, 70, 80, 80, 60, 200)):
+            self.tree.heading(col, text=text); self.tree.column(col, width=width, anchor="w")
+        vsb = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview); self.tree.configure(yscrollcommand=vsb.set)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y); self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for serial in serials: self.tree.insert("", tk.END, iid=serial, values=(serial, "", "", "", "", ""))
+        self.tree.selection_set(self.tree.get_children())
+        self.status_var = tk.StringVar(value="在列表中选择目标设备 (默认全部)。本地文件只读取一次，由所有设备共享。")
+        ttk.Label(self, textvariable=self.status_var, anchor="w").pack(fill=tk.X, padx=5, pady=5)
+        self._toggle_install()
+        self.protocol("WM_DELETE_WINDOW", self._close)
+
+    def _browse(self, ask):
+        path = ask(parent=self)
+        if path:
+            self.local_var.set(path); self.install_var.set(path.lower().endswith(".apk")); self._toggle_install()
+
+    def _toggle_install(self):
+        self.remote_entry.config(state=tk.DISABLED if self.install_var.get() else tk.NORMAL)
+
+    def _start(self):
+        serials = list(self.tree.selection())
+        local_path, install = self.local_var.get().strip(), self.install_var.get()
+        if not serials or not os.path.exists(local_path):
+            messagebox.showerror("错误", "请选择目标设备和存在的本地文件或文件夹。", parent=self); return
+        try: limits = {"usb": self.usb_limit_var.get(), "wifi": self.wifi_limit_var.get()}
+        except tk.TclError: limits = None
+        for serial in self.tree.get_children(): self.tree.item(serial, values=(serial, "排队中" if serial in serials else "", "", "", "", ""))
+        self.btn_start.config(state=tk.DISABLED); self.status_var.set("正在传输...")
+        self.stop_event = threading.Event(); stop_event = self.stop_event
+        remote_path = self.remote_var.get().strip() or DEFAULT_REMOTE_DIR
+        progress_shown = {}
+        def on_progress(serial, done, total):
+            # 每台设备每 1% 才刷新一次，避免大量 after 调用
+            step = done * 100 // total if total else 0
+            if progress_shown.get(serial) != step:
+                progress_shown[serial] = step
+                self.after(0, lambda: self._on_progress(serial, done, step))
+        def on_result(result):
+            if result.ok and not install and self.remote_cache:
+                # 与普通推送一样使文件浏览器中目标目录的缓存失效；在后台线程中进行，对话框关闭后也不会遗漏
+                self.remote_cache.invalidate(result.serial, remote_path)
+            self.after(0, lambda: self._on_result(result))
+        def target():
+            try: report = broadcast(self.client, serials, local_path, remote_path, install, limits, on_progress=on_progress, on_result=on_result, stop_event=stop_event)
+            except Exception as e: report = None; self.after(0, lambda: self.status_var.set(str(e)))
+            self.after(0, lambda: self._on_done(report))
+        threading.Thread(target=target, daemon=True).start()
+
+    def _on_progress(self, serial, done, step):
+        if not self.winfo_exists(): return
+        self.tree.set(serial, "state", "传输中"); self.tree.set(serial, "transferred", f"{format_bytes(done)} {step}%")
+
+    def _on_result(self, result):
+        if not self.winfo_exists(): return
+        self.tree.item(result.serial, values=(result.serial, "成功" if result.ok else "失败", format_bytes(result.bytes), format_rate(result.rate), f"{result.elapsed:.1f}s", result.message))
+
+    def _on_done(self, report):
+        if report is not None:
+            lines = report.format_lines(format_bytes)
+            if self.log:
+                for line in lines: self.log(line.replace("\t", "  "), "INFO")
+            if self.winfo_exists(): self.status_var.set(lines[-1])
+        if self.winfo_exists(): self.btn_start.config(state=tk.NORMAL)
+
+    def _close(self):
+        if self.stop_event: self.stop_event.set()
+        self.destroy()
+
 # --- 语言字典 ---
 LANGUAGES = {
     "app_title": {"zh": "Artocarpus (Scrcpy 图形界面) v5.3.2", "en": "ARtocarpus (Scrcpy GUI) v5.3.2"},
@@ -212,6 +465,24 @@ LANGUAGES = {
     "disconnect_all_profiles_button": {"zh": "断开所有预设连接", "en": "Disconnect All Profiles"},
     "duplicate_device_error_title": {"zh": "设备重复错误", "en": "Duplicate Device Error"},
     "duplicate_device_error_message": {"zh": "设备 '{}' 在多个启用的预设中被选中。请确保每个启用的预设都选择一个独一无二的设备。", "en": "Device '{}' is selected in multiple enabled profiles. Please ensure each enabled profile uses a unique device."},
+    "add_profile_button": {"zh": "添加预设", "en": "Add Profile"},
+    "remove_profile_button": {"zh": "删除", "en": "Remove"},
+    "profiles_from_devices_button": {"zh": "为所有已连接设备生成预设", "en": "Profiles for All Connected Devices"},
+    "discover_devices_button": {"zh": "发现 Wi-Fi 设备", "en": "Discover Wi-Fi Devices"},
+    "launch_concurrency_label": {"zh": "同时启动数:", "en": "Concurrent launches:"},
+    "launch_stagger_label": {"zh": "启动间隔(秒):", "en": "Stagger (s):"},
+    "sessions_frame": {"zh": "Scrcpy 会话", "en": "Scrcpy Sessions"},
+    "auto_restart_checkbox": {"zh": "异常退出时自动重启", "en": "Restart crashed sessions"},
+    "auto_reconnect_checkbox": {"zh": "Wi-Fi 设备掉线后自动重连", "en": "Reconnect dropped Wi-Fi devices"},
+    "stop_session_button": {"zh": "停止所选会话", "en": "Stop Selected"},
+    "capture_button": {"zh": "截图", "en": "Screenshot"}, "capture_repeat_checkbox": {"zh": "连续截图，间隔", "en": "Repeat every"},
+    "seconds_label": {"zh": "秒", "en": "s"}, "capture_dir_button": {"zh": "截图保存位置", "en": "Screenshot Folder"},
+    "record_segments_checkbox": {"zh": "分段录制，每段", "en": "Record in segments of"}, "minutes_label": {"zh": "分钟", "en": "min"},
+    "record_budget_label": {"zh": "磁盘预算 (GB):", "en": "Disk budget (GB):"}, "record_dir_button": {"zh": "录制保存位置", "en": "Recording Folder"},
+    "col_uptime": {"zh": "运行时长", "en": "Uptime"}, "col_restarts": {"zh": "重启次数", "en": "Restarts"}, "col_exit_code": {"zh": "退出码", "en": "Exit Code"},
+    "session_state_starting": {"zh": "启动中", "en": "Starting"}, "session_state_running": {"zh": "运行中", "en": "Running"},
+    "session_state_backoff": {"zh": "等待重启", "en": "Restarting"}, "session_state_stopped": {"zh": "已停止", "en": "Stopped"},
+    "session_state_exited": {"zh": "已关闭", "en": "Closed"}, "session_state_failed": {"zh": "失败", "en": "Failed"},
     "error": {"zh": "错误", "en": "Error"}, "info": {"zh": "提示", "en": "Info"}, "warning": {"zh": "警告", "en": "Warning"},
     "notice_label": {"zh": "手机重启后需先通过USB启用TCPIP模式才可以使用wifi连接。", "en": "After restart the phone, you need to enable TCPIP mode via USB before you can use the wifi connection."},
     "config_frame": {"zh": "全局配置", "en": "Global Configuration"}, "scrcpy_path_label": {"zh": "Scrcpy 命令/路径:", "en": "Scrcpy Command/Path:"},
@@ -228,7 +499,7 @@ LANGUAGES = {
     "scrcpy_options_frame": {"zh": "Scrcpy 控制选项", "en": "Scrcpy Control Options"}, "crop_label": {"zh": "裁剪 (W:H:X:Y):", "en": "Crop (W:H:X:Y):"},
     "crop_warning": {"zh": "如需裁剪，所有W,H,X,Y参数必须填写有效非负数字。\nW和H必须大于0。", "en": "For cropping, all W,H,X,Y parameters must be valid non-negative numbers.\nW and H must be greater than 0."},
     "turn_off_screen_checkbox": {"zh": "关闭手机屏幕", "en": "Turn off screen"}, "large_window_checkbox": {"zh": "默认最大化启动", "en": "Start maximized by default"},
-    "h265_checkbox": {"zh": "使用 H.265 编码", "en": "Use H.265 codec"}, "video_encoder_label": {"zh": "视频编码器:", "en": "Video Encoder:"},
+    "h265_checkbox": {"zh": "使用 H.265 编码", "en": "Use H.265 codec"}, "auto_quality_checkbox": {"zh": "自动画质 (测速)", "en": "Auto quality (link probe)"}, "video_encoder_label": {"zh": "视频编码器:", "en": "Video Encoder:"},
     "encoder_default": {"zh": "自动 (Scrcpy 默认)", "en": "Auto (Scrcpy Default)"}, "custom_res_checkbox": {"zh": "自定义分辨率 (最大边):", "en": "Custom Resolution (max side):"},
     "record_checkbox": {"zh": "录制视频:", "en": "Record Video:"}, "record_path_button": {"zh": "选择保存位置", "en": "Select Save Location"},
     "record_path_label": {"zh": "保存至:", "en": "Save to:"}, "record_path_error": {"zh": "已启用录制但未指定保存路径。", "en": "Recording is enabled but no save path is specified."},
@@ -250,78 +521,105 @@ LANGUAGES = {
     "path_not_selected": {"zh": "尚未选择", "en": "Not Selected"},
     "start_pull_button": {"zh": "开始复制 (手机 -> 电脑)", "en": "Start Copy (Phone -> PC)"},
     "start_push_button": {"zh": "开始复制 (电脑 -> 手机)", "en": "Start Copy (PC -> Phone)"},
+    "broadcast_push_button": {"zh": "广播到多台设备 / 安装 APK…", "en": "Broadcast / Install APK…"},
     "tab_shortcuts": {"zh": "组合键用法", "en": "Shortcuts"},
+    "all_devices_checkbox": {"zh": "对所有已连接设备执行", "en": "Apply to all connected devices"},
+    "transfer_queue_frame": {"zh": "传输队列", "en": "Transfer Queue"},
+    "global_workers_label": {"zh": "全局并发:", "en": "Global workers:"},
+    "per_device_workers_label": {"zh": "每设备并发:", "en": "Workers per device:"},
+    "cancel_job_button": {"zh": "取消所选任务", "en": "Cancel Selected"},
+    "clear_finished_button": {"zh": "清除已结束任务", "en": "Clear Finished"},
+    "resume_transfers_button": {"zh": "继续中断的传输", "en": "Resume Interrupted"},
+    "col_device": {"zh": "设备", "en": "Device"}, "col_direction": {"zh": "方向", "en": "Direction"},
+    "col_source": {"zh": "源路径", "en": "Source"}, "col_dest": {"zh": "目标路径", "en": "Destination"},
+    "col_state": {"zh": "状态", "en": "State"}, "col_transferred": {"zh": "已传输", "en": "Transferred"},
+    "job_state_queued": {"zh": "排队中", "en": "Queued"}, "job_state_running": {"zh": "传输中", "en": "Running"},
+    "job_state_done": {"zh": "已完成", "en": "Done"}, "job_state_failed": {"zh": "失败", "en": "Failed"},
+    "job_state_cancelled": {"zh": "已取消", "en": "Cancelled"},
+    "col_progress": {"zh": "进度", "en": "Progress"}, "col_speed": {"zh": "速度", "en": "Speed"}, "col_eta": {"zh": "剩余时间", "en": "ETA"},
+    "transfer_device_summary": {"zh": "{running} 个传输中，{queued} 个排队", "en": "{running} running, {queued} queued"},
+    "transfer_overall_summary": {"zh": "共 {count} 个任务  {speed}  剩余 {eta}", "en": "{count} jobs  {speed}  ETA {eta}"},
+    "transfer_idle": {"zh": "没有进行中的传输", "en": "No active transfers"},
+    "log_level_label": {"zh": "级别:", "en": "Level:"}, "log_device_label": {"zh": "设备:", "en": "Device:"},
+    "log_filter_all": {"zh": "全部", "en": "All"},
+    "sync_mode_checkbox": {"zh": "增量同步 (只传输变化的文件)", "en": "Incremental sync (changed files only)"},
+    "sync_mirror_delete_checkbox": {"zh": "删除目标端多余文件", "en": "Delete extraneous files at destination"},
+    "sync_use_hash_checkbox": {"zh": "时间不同时校验哈希", "en": "Verify hash when mtimes differ"},
+    "archive_mode_checkbox": {"zh": "打包流式传输 (适合大量小文件的文件夹)", "en": "Stream as archive (folders with many small files)"},
+    "archive_compress_checkbox": {"zh": "Wi-Fi 拉取时压缩", "en": "Compress pulls over Wi-Fi"},
+    "tab_diagnostics": {"zh": "诊断", "en": "Diagnostics"},
+    "metrics_by_device_checkbox": {"zh": "按设备分别统计", "en": "Per device"}, "metrics_reset_button": {"zh": "清空统计", "en": "Reset"},
+    "metrics_export_json_button": {"zh": "导出 JSON…", "en": "Export JSON…"}, "metrics_export_prometheus_button": {"zh": "导出 Prometheus…", "en": "Export Prometheus…"},
+    "metrics_prometheus_auto_checkbox": {"zh": "每 15 秒自动更新 Prometheus 文件", "en": "Rewrite Prometheus file every 15 s"},
+    "col_operation": {"zh": "操作", "en": "Operation"}, "col_count": {"zh": "次数", "en": "Count"}, "col_max": {"zh": "最长", "en": "Max"},
+    "col_errors": {"zh": "失败", "en": "Errors"}, "col_output": {"zh": "输出", "en": "Output"},
+    "metrics_exported": {"zh": "统计数据已导出到", "en": "Metrics exported to"},
 }
 
-def get_executable_path(name):
-    # Windows 需要 .exe 后缀
-    if os.name == 'nt' and not name.endswith('.exe'):
-        name_with_exe = name + '.exe'
-    else:
-        name_with_exe = name
-    
-    # 1. 检查打包后的路径 (PyInstaller)
-    if hasattr(sys, '_MEIPASS'):
-        bundled_path = os.path.join(sys._MEIPASS, name_with_exe if os.name == 'nt' else name)
-        if os.path.exists(bundled_path): 
-            return bundled_path
-    
-    # 2. 检查 AppImage 路径
-    appdir = os.environ.get('APPDIR')
-    if appdir:
-        bundled_path = os.path.join(appdir, 'usr/bin', name)
-        if os.path.exists(bundled_path) and os.access(bundled_path, os.X_OK): 
-            return bundled_path
-    
-    # 3. 检查当前脚本目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    local_path = os.path.join(script_dir, name_with_exe if os.name == 'nt' else name)
-    if os.path.exists(local_path):
-        return local_path
-    
-    # 4. 检查系统 PATH（使用 shutil.which）
-    import shutil
-    which_result = shutil.which(name_with_exe if os.name == 'nt' else name)
-    if which_result:
-        return which_result
-    
-    # 5. 最后返回原名称（可能会失败，但会给出清晰的错误信息）
-    return name_with_exe if os.name == 'nt' else name
-
 class ScrcpyGUI:
-    def __init__(self, master, initial_theme, initial_lang):
+    LOG_DRAIN_INTERVAL_MS = 100  # 状态栏从日志队列批量取出记录的间隔
+    LOG_MAX_LINES = 2000  # 状态栏最多保留的行数，更早的记录仍可在日志文件中查看
+    EVENT_LOOP_SAMPLE_MS = 500  # Tk 事件循环延迟的采样间隔：定时回调实际晚到的时间记为 "tk event-loop lag"
+    PROMETHEUS_INTERVAL_MS = 15000
+
+    def __init__(self, master, initial_theme, initial_lang, settings_store=None):
         self.master = master
-        self.scrcpy_process = None
-        self.multi_scrcpy_processes = {}
+        self.initial_theme = initial_theme
+        self.log_sink = LogSink()
+        self.scrcpy_serial = None  # 单设备页面当前会话的序列号
+        self.metrics = CallMetrics()  # adb/scrcpy 调用的耗时统计，显示在“诊断”分页
+        self.supervisor = SessionSupervisor(on_event=lambda session, message, level: self.log_status(message, level=level, serial=session.serial), metrics=self.metrics)
         self.current_language = initial_lang
         self.auto_connect_performed = False
         
-        # 修改主题列表，只保留指定的主题
-        if TTKTHEMES_AVAILABLE: 
-            # 定义允许的主题列表
-            allowed_themes = ["yaru", "ubuntu", "radiance", "clam", "breeze", "arc", 
-                            "scidgreen", "scidgery", "scidmint", "scidpink", "scidpurple", "scidsand"]
-            
-            # 获取可用的主题并过滤
-            all_themes = sorted(self.master.get_themes())
-            self.available_themes = [theme for theme in all_themes if theme in allowed_themes]
-            
-            # 如果没有找到任何允许的主题，使用默认主题
-            if not self.available_themes:
-                self.available_themes = ["default"]
-        else: 
-            self.available_themes = ["default"]
-            
+        # 主题列表在 _load_theme_engine 中加载 ttkthemes 后再填充
+        self.theme_style = None
+        self.available_themes = ["default"]
         self.available_languages = ["中文 (Chinese)", "英文 (English)"]
         self.profile_widgets = []
+        self.profile_settings = [{} for _ in range(5)]  # 多设备页面尚未创建时保存预设设置
+        self.launcher = LaunchOrchestrator(max_concurrent=3, stagger=1.0)
+        self.launch_concurrency_var = tk.IntVar(value=self.launcher.max_concurrent)
+        self.launch_stagger_var = tk.DoubleVar(value=self.launcher.stagger)
+        self.var_auto_restart = tk.BooleanVar(value=True)
+        self.var_auto_reconnect = tk.BooleanVar(value=True)
+        self.var_capture_repeat = tk.BooleanVar(value=False)
+        self.capture_interval_var = tk.DoubleVar(value=5.0)
+        self.screenshot_dir = os.path.join(os.path.expanduser("~"), "Pictures", "Artocarpus")
+        self.capture_pipeline = None  # 首次截图时创建
+        self._capture_after_id = None
+        self._capture_repeating = False  # var_capture_repeat 的副本，供后台线程读取
+        self.var_record_segments = tk.BooleanVar(value=False)
+        self.record_segment_minutes_var = tk.IntVar(value=10)
+        self.record_budget_gb_var = tk.IntVar(value=20)
+        self.recording_dir = os.path.join(os.path.expanduser("~"), "Videos", "Artocarpus")
+        self.segment_recorder = None  # 首次录制时创建
+        self.var_metrics_by_device = tk.BooleanVar(value=True)
+        self.var_prometheus_auto = tk.BooleanVar(value=False)
+        self.prometheus_path = os.path.join(os.path.expanduser("~"), ".artocarpus", "artocarpus.prom")
+        self._metrics_rows = None  # 诊断分页当前显示的内容，没有变化时不重建列表
         self.last_connected_serial = None
-        self.settings_file = os.path.join(os.path.expanduser("~"), ".scrcpy_gui_v4.json")
+        self.settings_store = settings_store or SettingsStore().load()
         self.scrcpy_launched = False
         self.adb_executable_path = get_executable_path("adb")
+        self.adb = AdbClient(self.adb_executable_path, metrics=self.metrics)
+        self.remote_cache = RemoteListingCache(self.adb)
+        self.encoder_cache = EncoderCache(self.adb)
+        self.link_tuner = LinkTuner(self.adb)
+        self._encoders_by_serial = {}  # serial -> [EncoderInfo]
+        self._encoder_queries = set()  # 正在后台查询编码器的设备
+        self._encoder_autopick = True  # 用户未手动选择编码器时，随设备与编码格式自动选择硬件编码器
+        self.online_devices = []  # 当前处于 device 状态的序列号 (已排序)
+        self.watchdog = ReconnectWatchdog(self.adb, on_event=lambda address, message, level: self.log_status(message, level=level, serial=address),
+                                          on_reconnected=lambda address: self.master.after(0, lambda: self._on_endpoint_reconnected(address)))
+        self.device_tracker = DeviceTracker(self.adb, self._on_device_snapshot)
         self.default_scrcpy_path = get_executable_path("scrcpy")
         self.custom_scrcpy_path = ""  # 存储用户自定义的scrcpy路径
         self.pull_dest_pc_path_var = tk.StringVar()
         self.push_source_pc_path_var = tk.StringVar()
+        self.transfer_engine = TransferEngine(self.adb, max_workers=4, per_device_workers=1, on_update=self._on_transfer_update, on_finish=self._on_transfer_finished)
+        self._transfer_view_dirty = False
+        self._transfer_rows = {}  # 队列视图中每一行当前显示的内容，只刷新有变化的行
 
         self.master.title(self._("app_title"))
         self.master.geometry("720x730")
@@ -350,11 +648,14 @@ class ScrcpyGUI:
         self.notebook.add(self.tab3_frame, text=self._("tab_file_transfer"))
         self.tab4_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.tab4_frame, text=self._("tab_shortcuts"))
+        self.tab5_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab5_frame, text=self._("tab_diagnostics"))
 
+        # 只有第一个分页立即创建，其余分页在第一次被选中时才创建，缩短首次显示窗口的时间
         self._create_tab1_widgets()
-        self._create_tab2_widgets()
-        self._create_tab3_widgets()
-        self._create_tab4_shortcuts()
+        self.combo_devices_var.trace_add("write", self._refresh_encoder_options)
+        self._pending_tabs = {str(self.tab2_frame): self._create_tab2_widgets, str(self.tab3_frame): self._create_tab3_widgets, str(self.tab4_frame): self._create_tab4_shortcuts, str(self.tab5_frame): self._create_tab5_diagnostics}
+        self.notebook.bind("<<NotebookTabChanged>>", self._build_selected_tab)
 
         self.status_frame_container = ttk.Frame(self.master); self.status_frame_container.pack(pady=(0, 10), padx=10, fill="x", expand=False)
         self.status_frame = ttk.LabelFrame(self.status_frame_container, text=self._("status_frame")); self.status_frame.pack(fill="both", expand=True)
@@ -365,20 +666,50 @@ class ScrcpyGUI:
         self.update_all_ui_texts()
         self.toggle_resolution_controls_state()
         self.toggle_recording_controls_state()
-        self.refresh_device_list()
+        self.device_tracker.start(); self.watchdog.start()
+        # 在首次绘制完成之后 (空闲回调之后的下一轮事件) 再加载主题引擎
+        self.master.after_idle(lambda: self.master.after(0, self._load_theme_engine))
         self.master.after(1000, self.perform_startup_auto_connect)
+        # 文件传输分页按需创建，未完成传输的提示不能依赖它，同样在首次绘制之后检查
+        self.master.after(1500, self._report_interrupted_transfers)
+        self._event_loop_tick = time.perf_counter(); self.master.after(self.EVENT_LOOP_SAMPLE_MS, self._sample_event_loop_lag)
+        self.master.after(self.PROMETHEUS_INTERVAL_MS, self._write_prometheus_tick)
+
+    def _build_selected_tab(self, event=None):
+        builder = self._pending_tabs.pop(self.notebook.select(), None)
+        if builder:
+            builder()
+            self.update_all_ui_texts()
+        elif self.notebook.select() == str(self.tab5_frame):
+            self._refresh_diagnostics_view(reschedule=False)
+
+    def tab_built(self, frame):
+        return str(frame) not in self._pending_tabs
+
+    def _load_theme_engine(self):
+        try:
+            from ttkthemes import ThemedStyle
+        except ImportError:
+            return
+        self.theme_style = ThemedStyle(self.master)
+        # 只保留指定的主题；如果没有找到任何允许的主题，使用默认主题
+        self.available_themes = [theme for theme in sorted(self.theme_style.get_themes()) if theme in ALLOWED_THEMES] or ["default"]
+        self.combo_theme.config(values=self.available_themes)
+        try: self.theme_style.set_theme(self.theme_var.get() or self.initial_theme)
+        except tk.TclError: self.log_status(f"{self._('theme_change_fail')}: '{self.theme_var.get()}'", level="ERROR")
+        self.apply_custom_styles()
 
     def _try_auto_launch_scrcpy(self, success, device_address_used):
         if success:
-            self.scrcpy_process = None
+            self.scrcpy_serial = None
             self.log_status(f"自动连接成功: {device_address_used}。尝试启动 Scrcpy。")
             self.master.after(2000, lambda: self._select_and_launch_scrcpy(device_address_used))
         else:
-            self.log_status(f"自动连接失败: {device_address_used}。Scrcpy 未启动。")
+            self.log_status(f"自动连接失败: {device_address_used}。Scrcpy 未启动。", level="ERROR")
 
     def _select_and_launch_scrcpy(self, device_to_select):
         if self.scrcpy_launched:
-            self.log_status("⚠️ scrcpy 已启动，跳过重复启动")
+            self.log_status("⚠️ scrcpy 已启动，跳过重复启动", level="WARNING")
             return
 
         self.scrcpy_launched = True  # 标记已启动
@@ -393,7 +724,7 @@ class ScrcpyGUI:
 
             self.connect_selected_device()
         else:
-            self.log_status(f"自动启动失败: 在设备列表中未找到 {device_to_select}。")
+            self.log_status(f"自动启动失败: 在设备列表中未找到 {device_to_select}。", level="ERROR")
 
     def _(self, key):
         return LANGUAGES.get(key, {}).get(self.current_language, key)
@@ -404,7 +735,7 @@ class ScrcpyGUI:
         self.config_frame = ttk.LabelFrame(parent, text=self._("config_frame")); self.config_frame.grid(row=current_row, column=0, columnspan=4, padx=5, pady=3, sticky="ew"); self.config_frame.grid_columnconfigure(1, weight=1); current_row+=1
         self.lbl_scrcpy_path = ttk.Label(self.config_frame, text=self._("scrcpy_path_label")); self.lbl_scrcpy_path.grid(row=0, column=0, padx=5, pady=3, sticky="w"); self.entry_scrcpy_path = ttk.Entry(self.config_frame); self.entry_scrcpy_path.grid(row=0, column=1, padx=5, pady=3, sticky="ew"); self.btn_browse_scrcpy = ttk.Button(self.config_frame, text=self._("browse_button"), command=self.browse_scrcpy_path, width=8); self.btn_browse_scrcpy.grid(row=0, column=4, padx=5, pady=3)
         self.lbl_theme = ttk.Label(self.config_frame, text=self._("theme_label")); self.lbl_theme.grid(row=1, column=0, padx=5, pady=3, sticky="w"); self.theme_var = tk.StringVar(); self.combo_theme = ttk.Combobox(self.config_frame, textvariable=self.theme_var, values=self.available_themes, state="readonly", width=15);
-        if TTKTHEMES_AVAILABLE: self.combo_theme.bind("<<ComboboxSelected>>", self.change_theme)
+        self.combo_theme.bind("<<ComboboxSelected>>", self.change_theme)
         self.combo_theme.grid(row=1, column=1, padx=5, pady=3, sticky="w")
         self.lbl_language = ttk.Label(self.config_frame, text=self._("language_label")); self.lbl_language.grid(row=1, column=2, padx=(10, 5), pady=3, sticky="e"); self.language_var = tk.StringVar(); lang_map = {"zh": "中文 (Chinese)", "en": "英文 (English)"}; self.language_var.set(lang_map.get(self.current_language)); self.combo_language = ttk.Combobox(self.config_frame, textvariable=self.language_var, values=self.available_languages, state="readonly", width=12); self.combo_language.bind("<<ComboboxSelected>>", self.change_language); self.combo_language.grid(row=1, column=4, padx=5, pady=3, sticky="e")
 
@@ -417,51 +748,206 @@ class ScrcpyGUI:
 
         self.scrcpy_ctrl_frame = ttk.LabelFrame(parent, text=self._("scrcpy_options_frame")); self.scrcpy_ctrl_frame.grid(row=current_row, column=0, columnspan=4, padx=5, pady=3, sticky="ew"); self.scrcpy_ctrl_frame.grid_columnconfigure(1, weight=1); current_row+=1
         ctrl_row = 0
-        self.lbl_video_encoder = ttk.Label(self.scrcpy_ctrl_frame, text=self._("video_encoder_label")); self.lbl_video_encoder.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); self.encoder_options = [self._("encoder_default"), "c2.android.avc.encoder", "OMX.google.h264.encoder"]; self.video_encoder_var = tk.StringVar(value=self.encoder_options[0]); self.combo_video_encoder = ttk.Combobox(self.scrcpy_ctrl_frame, textvariable=self.video_encoder_var, values=self.encoder_options, width=30, state="readonly"); self.combo_video_encoder.grid(row=ctrl_row, column=1, columnspan=3, padx=5, pady=3, sticky="ew"); ctrl_row += 1
+        self.lbl_video_encoder = ttk.Label(self.scrcpy_ctrl_frame, text=self._("video_encoder_label")); self.lbl_video_encoder.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); self.encoder_options = [self._("encoder_default")]; self.video_encoder_var = tk.StringVar(value=self.encoder_options[0]); self.combo_video_encoder = ttk.Combobox(self.scrcpy_ctrl_frame, textvariable=self.video_encoder_var, values=self.encoder_options, width=30, state="readonly"); self.combo_video_encoder.grid(row=ctrl_row, column=1, columnspan=3, padx=5, pady=3, sticky="ew"); self.combo_video_encoder.bind("<<ComboboxSelected>>", self._on_encoder_selected); ctrl_row += 1
         self.var_enable_recording = tk.BooleanVar(value=False); self.chk_enable_recording = ttk.Checkbutton(self.scrcpy_ctrl_frame, text=self._("record_checkbox"), variable=self.var_enable_recording, command=self.toggle_recording_controls_state); self.chk_enable_recording.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); self.record_format_var = tk.StringVar(value="mp4"); self.combo_record_format = ttk.Combobox(self.scrcpy_ctrl_frame, textvariable=self.record_format_var, values=["mp4", "mkv"], width=6, state="disabled"); self.combo_record_format.grid(row=ctrl_row, column=1, padx=(5,0), pady=3, sticky="w"); self.btn_browse_record_path = ttk.Button(self.scrcpy_ctrl_frame, text=self._("record_path_button"), command=self.browse_record_save_path, state=tk.DISABLED); self.btn_browse_record_path.grid(row=ctrl_row, column=2, columnspan=2, padx=5, pady=3, sticky="ew"); ctrl_row += 1
         self.lbl_record_path_display_label = ttk.Label(self.scrcpy_ctrl_frame, text=self._("record_path_label"), state=tk.DISABLED); self.lbl_record_path_display_label.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); self.entry_record_path_var = tk.StringVar(); self.lbl_record_path_display = ttk.Label(self.scrcpy_ctrl_frame, textvariable=self.entry_record_path_var, relief="sunken", width=40, state=tk.DISABLED, anchor="w", wraplength=350); self.lbl_record_path_display.grid(row=ctrl_row, column=1, columnspan=3, padx=5, pady=3, sticky="ew"); ctrl_row += 1
         self.lbl_crop = ttk.Label(self.scrcpy_ctrl_frame, text=self._("crop_label")); self.lbl_crop.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); crop_inputs_frame = ttk.Frame(self.scrcpy_ctrl_frame); crop_inputs_frame.grid(row=ctrl_row, column=1, columnspan=3, padx=5, pady=3, sticky="ew"); self.entry_crop_w = ttk.Entry(crop_inputs_frame, width=5); self.entry_crop_w.pack(side=tk.LEFT, padx=(0,1)); ttk.Label(crop_inputs_frame, text=":").pack(side=tk.LEFT, padx=1); self.entry_crop_h = ttk.Entry(crop_inputs_frame, width=5); self.entry_crop_h.pack(side=tk.LEFT, padx=1); ttk.Label(crop_inputs_frame, text=":").pack(side=tk.LEFT, padx=1); self.entry_crop_x = ttk.Entry(crop_inputs_frame, width=5); self.entry_crop_x.pack(side=tk.LEFT, padx=1); ttk.Label(crop_inputs_frame, text=":").pack(side=tk.LEFT, padx=1); self.entry_crop_y = ttk.Entry(crop_inputs_frame, width=5); self.entry_crop_y.pack(side=tk.LEFT, padx=1); ctrl_row += 1
         self.var_custom_resolution = tk.BooleanVar(value=True); self.chk_custom_resolution = ttk.Checkbutton(self.scrcpy_ctrl_frame, text=self._("custom_res_checkbox"), variable=self.var_custom_resolution, command=self.toggle_resolution_controls_state); self.chk_custom_resolution.grid(row=ctrl_row, column=0, padx=5, pady=3, sticky="w"); self.resolution_scale_var = tk.IntVar(value=720); self.scale_resolution = ttk.Scale(self.scrcpy_ctrl_frame, from_=480, to=2560, orient=tk.HORIZONTAL, length=150, variable=self.resolution_scale_var, command=self.update_resolution_label_display, state=tk.DISABLED); self.scale_resolution.grid(row=ctrl_row, column=1, padx=5, pady=3, sticky="ew"); self.lbl_resolution_value = ttk.Label(self.scrcpy_ctrl_frame, text=f"{self.resolution_scale_var.get()}px", state=tk.DISABLED); self.lbl_resolution_value.grid(row=ctrl_row, column=2, columnspan=2, padx=5, pady=3, sticky="w"); ctrl_row += 1
-        checkbox_options_frame = ttk.Frame(self.scrcpy_ctrl_frame); checkbox_options_frame.grid(row=ctrl_row, column=0, columnspan=4, padx=0, pady=0, sticky="w"); self.var_turn_off_screen = tk.BooleanVar(); self.chk_turn_off_screen = ttk.Checkbutton(checkbox_options_frame, text=self._("turn_off_screen_checkbox"), variable=self.var_turn_off_screen); self.chk_turn_off_screen.pack(side=tk.LEFT, padx=5, pady=3); self.var_maximize_window = tk.BooleanVar(); self.chk_maximize_window = ttk.Checkbutton(checkbox_options_frame, text=self._("large_window_checkbox"), variable=self.var_maximize_window); self.chk_maximize_window.pack(side=tk.LEFT, padx=5, pady=3); self.var_use_h265 = tk.BooleanVar(); self.chk_use_h265 = ttk.Checkbutton(checkbox_options_frame, text=self._("h265_checkbox"), variable=self.var_use_h265); self.chk_use_h265.pack(side=tk.LEFT, padx=5, pady=3); self.btn_save_settings = ttk.Button(self.scrcpy_ctrl_frame, text=self._("save_settings_button"), command=self.save_settings); self.btn_save_settings.grid(row=ctrl_row, column=3, padx=5, pady=5, sticky="e"); ctrl_row += 1
+        checkbox_options_frame = ttk.Frame(self.scrcpy_ctrl_frame); checkbox_options_frame.grid(row=ctrl_row, column=0, columnspan=4, padx=0, pady=0, sticky="w"); self.var_turn_off_screen = tk.BooleanVar(); self.chk_turn_off_screen = ttk.Checkbutton(checkbox_options_frame, text=self._("turn_off_screen_checkbox"), variable=self.var_turn_off_screen); self.chk_turn_off_screen.pack(side=tk.LEFT, padx=5, pady=3); self.var_maximize_window = tk.BooleanVar(); self.chk_maximize_window = ttk.Checkbutton(checkbox_options_frame, text=self._("large_window_checkbox"), variable=self.var_maximize_window); self.chk_maximize_window.pack(side=tk.LEFT, padx=5, pady=3); self.var_use_h265 = tk.BooleanVar(); self.chk_use_h265 = ttk.Checkbutton(checkbox_options_frame, text=self._("h265_checkbox"), variable=self.var_use_h265, command=self._refresh_encoder_options); self.chk_use_h265.pack(side=tk.LEFT, padx=5, pady=3); self.var_auto_quality = tk.BooleanVar(); self.chk_auto_quality = ttk.Checkbutton(checkbox_options_frame, text=self._("auto_quality_checkbox"), variable=self.var_auto_quality, command=self.toggle_auto_quality_state); self.chk_auto_quality.pack(side=tk.LEFT, padx=5, pady=3); self.btn_save_settings = ttk.Button(self.scrcpy_ctrl_frame, text=self._("save_settings_button"), command=self.save_settings); self.btn_save_settings.grid(row=ctrl_row, column=3, padx=5, pady=5, sticky="e"); ctrl_row += 1
         
 
         action_frame = ttk.Frame(parent); action_frame.grid(row=current_row, column=0, columnspan=4, sticky="ew", padx=5, pady=5); action_frame.grid_columnconfigure(0, weight=1); action_frame.grid_columnconfigure(1, weight=1)
         self.btn_connect_selected = ttk.Button(action_frame, text=self._("connect_device_button"), command=self.connect_selected_device); self.btn_connect_selected.grid(row=0, column=0, padx=5, pady=3, sticky="ew"); self.btn_disconnect = ttk.Button(action_frame, text=self._("disconnect_button"), command=self.disconnect_scrcpy); self.btn_disconnect.grid(row=0, column=1, padx=5, pady=3, sticky="ew")
 
+    def _refresh_encoder_options(self, *_):
+        # 编码器列表按设备型号缓存，首次遇到的型号在后台运行 scrcpy --list-encoders 查询
+        serial = self.combo_devices_var.get()
+        encoders = self._encoders_by_serial.get(serial, [])
+        self._show_encoder_options(encoders)
+        if not serial or serial in self._encoders_by_serial or serial in self._encoder_queries: return
+        scrcpy_exec = self.entry_scrcpy_path.get().strip()
+        if not os.path.isfile(scrcpy_exec): return  # scrcpy 路径设置好之后，下次选择设备时再查询
+        self._encoder_queries.add(serial)
+        def target():
+            try:
+                found = self.encoder_cache.discover(serial, scrcpy_exec)
+            except Exception as e:
+                found = None
+                self.log_status(f"读取 {serial} 的编码器列表失败: {e}", level="WARNING", serial=serial)
+            self.master.after(0, lambda: self._on_encoders_discovered(serial, found))
+        threading.Thread(target=target, daemon=True).start()
+
+    def _on_encoders_discovered(self, serial, encoders):
+        self._encoder_queries.discard(serial)
+        if encoders is None: return
+        self._encoders_by_serial[serial] = encoders
+        if serial == self.combo_devices_var.get(): self._show_encoder_options(encoders)
+
+    def _show_encoder_options(self, encoders):
+        codec = "h265" if self.var_use_h265.get() else "h264"
+        listed = sorted((e for e in encoders if e.codec == codec and not e.alias_of), key=lambda e: not e.hardware)
+        names = [e.name + (" (hw)" if e.hardware else "") for e in listed]
+        self.encoder_options = [self._("encoder_default")] + names
+        self.combo_video_encoder.config(values=self.encoder_options)
+        if self._encoder_autopick or self.video_encoder_var.get() not in self.encoder_options:
+            best = preferred_encoder(encoders, codec)
+            self.video_encoder_var.set(next((name for name in names if name.split()[0] == best), self.encoder_options[0]))
+            self._encoder_autopick = True
+
+    def _on_encoder_selected(self, event=None):
+        self._encoder_autopick = self.video_encoder_var.get() == self._("encoder_default")
+
     def _create_tab2_widgets(self):
-        parent = self.tab2_frame; profiles_container = ttk.Frame(parent); profiles_container.pack(pady=3, padx=5, fill="both", expand=True)
-        for i in range(5):
-            profile_frame = ttk.LabelFrame(profiles_container, text=self._("profile_label").format(i + 1)); profile_frame.pack(pady=3, padx=5, fill="x", expand=False)
-            top_row = ttk.Frame(profile_frame); top_row.pack(fill="x", expand=True)
-            enable_var = tk.BooleanVar(value=False); chk_enable = ttk.Checkbutton(top_row, text=self._("profile_enable_checkbox"), variable=enable_var); chk_enable.pack(side=tk.LEFT, padx=5, pady=3)
-            lbl_device = ttk.Label(top_row, text=self._("devices_label")); lbl_device.pack(side=tk.LEFT, padx=5, pady=3)
-            device_var = tk.StringVar(); combo_device = ttk.Combobox(top_row, textvariable=device_var, state="readonly", width=25); combo_device.pack(side=tk.LEFT, padx=5, pady=3, fill="x", expand=True)
-            
-            bottom_row = ttk.Frame(profile_frame); bottom_row.pack(fill="x", expand=True)
-            lbl_crop = ttk.Label(bottom_row, text=self._("crop_label")); lbl_crop.pack(side=tk.LEFT, padx=5, pady=3)
-            crop_entries = {}; crop_frame = ttk.Frame(bottom_row)
-            crop_frame.pack(side=tk.LEFT, padx=5, pady=3)
-            entry_w = ttk.Entry(crop_frame, width=5); entry_w.pack(side=tk.LEFT); crop_entries['w'] = entry_w
-            ttk.Label(crop_frame, text=":").pack(side=tk.LEFT)
-            entry_h = ttk.Entry(crop_frame, width=5); entry_h.pack(side=tk.LEFT); crop_entries['h'] = entry_h
-            ttk.Label(crop_frame, text=":").pack(side=tk.LEFT)
-            entry_x = ttk.Entry(crop_frame, width=5); entry_x.pack(side=tk.LEFT); crop_entries['x'] = entry_x
-            ttk.Label(crop_frame, text=":").pack(side=tk.LEFT)
-            entry_y = ttk.Entry(crop_frame, width=5); entry_y.pack(side=tk.LEFT); crop_entries['y'] = entry_y
-            
-            self.profile_widgets.append({"frame": profile_frame, "enable_var": enable_var, "device_var": device_var, "combo_device": combo_device, "crop_entries": crop_entries})
-            
+        parent = self.tab2_frame
         action_frame = ttk.Frame(parent); action_frame.pack(pady=(3, 3), padx=5, fill="x", side="bottom")
         action_frame.columnconfigure(0, weight=1); action_frame.columnconfigure(1, weight=1); action_frame.columnconfigure(2, weight=1)
-        btn_refresh_tab2 = ttk.Button(action_frame, text=self._("refresh_button"), command=self.refresh_device_list); btn_refresh_tab2.grid(row=0, column=0, padx=5, sticky="ew")
-        btn_connect_multi = ttk.Button(action_frame, text=self._("connect_selected_profiles_button"), command=self.connect_multi_devices); btn_connect_multi.grid(row=0, column=1, padx=5, sticky="ew")
-        btn_disconnect_multi = ttk.Button(action_frame, text=self._("disconnect_all_profiles_button"), command=self.disconnect_all_multi); btn_disconnect_multi.grid(row=0, column=2, padx=5, sticky="ew")
+        self.btn_refresh_tab2 = ttk.Button(action_frame, text=self._("refresh_button"), command=self.refresh_device_list); self.btn_refresh_tab2.grid(row=0, column=0, padx=5, sticky="ew")
+        self.btn_connect_multi = ttk.Button(action_frame, text=self._("connect_selected_profiles_button"), command=self.connect_multi_devices); self.btn_connect_multi.grid(row=0, column=1, padx=5, sticky="ew")
+        self.btn_disconnect_multi = ttk.Button(action_frame, text=self._("disconnect_all_profiles_button"), command=self.disconnect_all_multi); self.btn_disconnect_multi.grid(row=0, column=2, padx=5, sticky="ew")
+
+        # 截图：启用的预设中的设备 (没有启用的预设时为所有在线设备)
+        capture_frame = ttk.Frame(parent); capture_frame.pack(pady=(3, 0), padx=5, fill="x", side="bottom")
+        self.btn_capture = ttk.Button(capture_frame, text=self._("capture_button"), command=self._capture_screens); self.btn_capture.pack(side=tk.LEFT, padx=5)
+        self.chk_capture_repeat = ttk.Checkbutton(capture_frame, text=self._("capture_repeat_checkbox"), variable=self.var_capture_repeat, command=self._toggle_capture_repeat); self.chk_capture_repeat.pack(side=tk.LEFT, padx=5)
+        ttk.Spinbox(capture_frame, from_=1, to=3600, increment=1, width=5, textvariable=self.capture_interval_var).pack(side=tk.LEFT)
+        self.lbl_capture_seconds = ttk.Label(capture_frame, text=self._("seconds_label")); self.lbl_capture_seconds.pack(side=tk.LEFT, padx=(2, 5))
+        self.btn_capture_dir = ttk.Button(capture_frame, text=self._("capture_dir_button"), command=self._choose_screenshot_dir); self.btn_capture_dir.pack(side=tk.RIGHT, padx=5)
+
+        # 分段录制：连接预设时为每台设备另起一个无窗口的录制进程
+        record_frame = ttk.Frame(parent); record_frame.pack(pady=(3, 0), padx=5, fill="x", side="bottom")
+        self.chk_record_segments = ttk.Checkbutton(record_frame, text=self._("record_segments_checkbox"), variable=self.var_record_segments); self.chk_record_segments.pack(side=tk.LEFT, padx=5)
+        ttk.Spinbox(record_frame, from_=1, to=120, increment=1, width=4, textvariable=self.record_segment_minutes_var).pack(side=tk.LEFT)
+        self.lbl_record_minutes = ttk.Label(record_frame, text=self._("minutes_label")); self.lbl_record_minutes.pack(side=tk.LEFT, padx=(2, 5))
+        self.lbl_record_budget = ttk.Label(record_frame, text=self._("record_budget_label")); self.lbl_record_budget.pack(side=tk.LEFT, padx=(5, 2))
+        ttk.Spinbox(record_frame, from_=1, to=10000, increment=5, width=6, textvariable=self.record_budget_gb_var).pack(side=tk.LEFT)
+        self.lbl_record_status = ttk.Label(record_frame, text=""); self.lbl_record_status.pack(side=tk.LEFT, padx=10)
+        self.btn_record_dir = ttk.Button(record_frame, text=self._("record_dir_button"), command=self._choose_recording_dir); self.btn_record_dir.pack(side=tk.RIGHT, padx=5)
+
+        self.sessions_frame = ttk.LabelFrame(parent, text=self._("sessions_frame")); self.sessions_frame.pack(pady=3, padx=5, fill="x", side="bottom")
+        sessions_toolbar = ttk.Frame(self.sessions_frame); sessions_toolbar.pack(fill="x")
+        self.chk_auto_restart = ttk.Checkbutton(sessions_toolbar, text=self._("auto_restart_checkbox"), variable=self.var_auto_restart); self.chk_auto_restart.pack(side=tk.LEFT, padx=5, pady=3)
+        self.chk_auto_reconnect = ttk.Checkbutton(sessions_toolbar, text=self._("auto_reconnect_checkbox"), variable=self.var_auto_reconnect, command=self._toggle_auto_reconnect); self.chk_auto_reconnect.pack(side=tk.LEFT, padx=5, pady=3)
+        self.btn_stop_session = ttk.Button(sessions_toolbar, text=self._("stop_session_button"), command=self._stop_selected_sessions); self.btn_stop_session.pack(side=tk.RIGHT, padx=5, pady=3)
+        session_columns = ("device", "state", "uptime", "restarts", "exit_code")
+        self.tree_sessions = ttk.Treeview(self.sessions_frame, columns=session_columns, show="headings", height=4)
+        for col, width in zip(session_columns, (180, 90, 80, 70, 70)):
+            self.tree_sessions.column(col, width=width, anchor="w")
+        self.tree_sessions.pack(fill="x", padx=5, pady=(0, 5))
+        self.master.after(1000, self._refresh_sessions_view)
+
+        # 预设列表可以容纳几十台设备，因此放在可滚动区域中，每个预设只占一行
+        toolbar = ttk.Frame(parent); toolbar.pack(pady=(3, 0), padx=5, fill="x", side="top")
+        self.btn_add_profile = ttk.Button(toolbar, text=self._("add_profile_button"), command=lambda: self._add_profile()); self.btn_add_profile.pack(side=tk.LEFT, padx=5)
+        self.btn_profiles_from_devices = ttk.Button(toolbar, text=self._("profiles_from_devices_button"), command=self._profiles_from_connected_devices); self.btn_profiles_from_devices.pack(side=tk.LEFT, padx=5)
+        self.btn_discover = ttk.Button(toolbar, text=self._("discover_devices_button"), command=lambda: DiscoveryDialog(self.master, self.adb, on_finished=self.refresh_device_list)); self.btn_discover.pack(side=tk.LEFT, padx=5)
+        spin_stagger = ttk.Spinbox(toolbar, from_=0, to=10, increment=0.5, width=4, textvariable=self.launch_stagger_var, command=self._apply_launch_limits); spin_stagger.pack(side=tk.RIGHT, padx=5)
+        self.lbl_launch_stagger = ttk.Label(toolbar, text=self._("launch_stagger_label")); self.lbl_launch_stagger.pack(side=tk.RIGHT)
+        spin_concurrency = ttk.Spinbox(toolbar, from_=1, to=16, width=4, textvariable=self.launch_concurrency_var, command=self._apply_launch_limits); spin_concurrency.pack(side=tk.RIGHT, padx=5)
+        self.lbl_launch_concurrency = ttk.Label(toolbar, text=self._("launch_concurrency_label")); self.lbl_launch_concurrency.pack(side=tk.RIGHT)
+        for spin in (spin_stagger, spin_concurrency):
+            spin.bind("<Return>", lambda e: self._apply_launch_limits()); spin.bind("<FocusOut>", lambda e: self._apply_launch_limits())
+
+        scroll_frame = ttk.Frame(parent); scroll_frame.pack(pady=3, padx=5, fill="both", expand=True)
+        self.profiles_canvas = tk.Canvas(scroll_frame, highlightthickness=0, bd=0)
+        profiles_sb = ttk.Scrollbar(scroll_frame, orient="vertical", command=self.profiles_canvas.yview)
+        self.profiles_canvas.configure(yscrollcommand=profiles_sb.set)
+        profiles_sb.pack(side=tk.RIGHT, fill=tk.Y); self.profiles_canvas.pack(side=tk.LEFT, fill="both", expand=True)
+        self.profiles_container = ttk.Frame(self.profiles_canvas)
+        container_id = self.profiles_canvas.create_window((0, 0), window=self.profiles_container, anchor="nw")
+        self.profiles_container.bind("<Configure>", lambda e: self.profiles_canvas.configure(scrollregion=self.profiles_canvas.bbox("all")))
+        self.profiles_canvas.bind("<Configure>", lambda e: self.profiles_canvas.itemconfigure(container_id, width=e.width))
+        self._set_profiles(self.profile_settings)
+
+    def _add_profile(self, enabled=False, serial="", crop=None, name=""):
+        profile_frame = ttk.Frame(self.profiles_container); profile_frame.pack(pady=2, padx=5, fill="x", expand=False)
+        lbl_title = ttk.Label(profile_frame, width=6); lbl_title.pack(side=tk.LEFT, padx=(5, 0), pady=3)
+        name_var = tk.StringVar(value=name); entry_name = ttk.Entry(profile_frame, textvariable=name_var, width=10); entry_name.pack(side=tk.LEFT, padx=(0, 5), pady=3)
+        enable_var = tk.BooleanVar(value=enabled); chk_enable = ttk.Checkbutton(profile_frame, text=self._("profile_enable_checkbox"), variable=enable_var); chk_enable.pack(side=tk.LEFT, padx=5, pady=3)
+        device_var = tk.StringVar(value=serial); combo_device = ttk.Combobox(profile_frame, textvariable=device_var, values=self.online_devices, state="readonly", width=22); combo_device.pack(side=tk.LEFT, padx=5, pady=3, fill="x", expand=True)
+        lbl_crop = ttk.Label(profile_frame, text=self._("crop_label")); lbl_crop.pack(side=tk.LEFT, padx=5, pady=3)
+        crop_entries = {}
+        for i, key in enumerate("whxy"):
+            if i: ttk.Label(profile_frame, text=":").pack(side=tk.LEFT)
+            entry = ttk.Entry(profile_frame, width=5); entry.pack(side=tk.LEFT); crop_entries[key] = entry
+            entry.insert(0, (crop or {}).get(key, ""))
+        profile = {"frame": profile_frame, "title_label": lbl_title, "enable_checkbox": chk_enable, "crop_label": lbl_crop, "enable_var": enable_var, "name_var": name_var, "device_var": device_var, "combo_device": combo_device, "crop_entries": crop_entries}
+        profile["remove_button"] = ttk.Button(profile_frame, text=self._("remove_profile_button"), width=6, command=lambda: self._remove_profile(profile))
+        profile["remove_button"].pack(side=tk.LEFT, padx=5, pady=3)
+        self.profile_widgets.append(profile)
+        lbl_title.config(text=self._("profile_label").format(len(self.profile_widgets)))
+        return profile
+
+    def _remove_profile(self, profile):
+        profile["frame"].destroy()
+        self.profile_widgets.remove(profile)
+        for i, p in enumerate(self.profile_widgets):
+            p["title_label"].config(text=self._("profile_label").format(i + 1))
+
+    def _set_profiles(self, profile_settings):
+        for profile in list(self.profile_widgets):
+            profile["frame"].destroy()
+        self.profile_widgets.clear()
+        for p_setting in profile_settings:
+            self._add_profile(p_setting.get("enabled", False), p_setting.get("serial", ""), p_setting.get("crop", {}), p_setting.get("name", ""))
+
+    def _profiles_from_connected_devices(self):
+        # 为每台在线设备准备一个启用的预设：已有预设的设备沿用其裁剪设置，空白预设优先复用
+        existing = {p["device_var"].get(): p for p in self.profile_widgets if p["device_var"].get()}
+        blank = [p for p in self.profile_widgets if not p["device_var"].get()]
+        for serial in self.online_devices:
+            profile = existing.get(serial)
+            if profile is None:
+                profile = blank.pop(0) if blank else self._add_profile()
+                profile["device_var"].set(serial)
+            profile["enable_var"].set(True)
+        self.log_status(f"已为 {len(self.online_devices)} 台已连接设备启用预设。")
+
+    def _apply_launch_limits(self):
+        try:
+            self.launcher.set_limits(self.launch_concurrency_var.get(), self.launch_stagger_var.get())
+        except (tk.TclError, ValueError):
+            pass
 
     def _create_status_log(self, parent_frame):
-        parent_frame.grid_columnconfigure(0, weight=1); parent_frame.grid_rowconfigure(0, weight=1)
+        parent_frame.grid_columnconfigure(0, weight=1); parent_frame.grid_rowconfigure(1, weight=1)
+        filter_frame = ttk.Frame(parent_frame); filter_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.lbl_log_level = ttk.Label(filter_frame, text=self._("log_level_label")); self.lbl_log_level.pack(side=tk.LEFT, padx=(0, 2))
+        self.log_level_var = tk.StringVar(value=self._("log_filter_all")); self.combo_log_level = ttk.Combobox(filter_frame, textvariable=self.log_level_var, values=[self._("log_filter_all")] + list(LOG_LEVELS), state="readonly", width=9); self.combo_log_level.pack(side=tk.LEFT, padx=2)
+        self.lbl_log_device = ttk.Label(filter_frame, text=self._("log_device_label")); self.lbl_log_device.pack(side=tk.LEFT, padx=(8, 2))
+        self.log_device_var = tk.StringVar(value=self._("log_filter_all")); self.combo_log_device = ttk.Combobox(filter_frame, textvariable=self.log_device_var, values=[self._("log_filter_all")], state="readonly", width=22); self.combo_log_device.pack(side=tk.LEFT, padx=2)
+        for combo in (self.combo_log_level, self.combo_log_device): combo.bind("<<ComboboxSelected>>", lambda e: self._rerender_log())
         self.txt_status_sb = ttk.Scrollbar(parent_frame, orient=tk.VERTICAL)
         self.txt_status = tk.Text(parent_frame, height=8, relief="solid", borderwidth=1, yscrollcommand=self.txt_status_sb.set, wrap=tk.WORD, font=("Arial", 9))
-        self.txt_status_sb.config(command=self.txt_status.yview); self.txt_status.grid(row=0, column=0, sticky="nsew"); self.txt_status_sb.grid(row=0, column=1, sticky="ns"); self.txt_status.config(state=tk.DISABLED)
+        self.txt_status_sb.config(command=self.txt_status.yview); self.txt_status.grid(row=1, column=0, sticky="nsew"); self.txt_status_sb.grid(row=1, column=1, sticky="ns"); self.txt_status.config(state=tk.DISABLED)
+        self.master.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log_queue)
+
+    def _current_log_filter(self):
+        level = self.log_level_var.get()
+        serial = self.log_device_var.get()
+        return (level if level in LOG_LEVELS else None), (serial if serial != self._("log_filter_all") else None)
+
+    def _drain_log_queue(self):
+        # 工作线程只把记录放入队列，这里在 Tk 线程中批量写入文本框
+        records = self.log_sink.drain()
+        if records:
+            level, serial = self._current_log_filter()
+            lines = [r.message for r in records if r.matches(level, serial)]
+            if lines: self._append_log_lines(lines)
+        self.master.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log_queue)
+
+    def _append_log_lines(self, lines):
+        if not self.txt_status.winfo_exists(): return
+        self.txt_status.config(state=tk.NORMAL)
+        self.txt_status.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(self.txt_status.index("end-1c").split(".")[0]) - 1 - self.LOG_MAX_LINES
+        if excess > 0: self.txt_status.delete("1.0", f"{excess + 1}.0")
+        self.txt_status.see(tk.END); self.txt_status.config(state=tk.DISABLED)
+
+    def _rerender_log(self):
+        level, serial = self._current_log_filter()
+        lines = [r.message for r in self.log_sink.records(level, serial)][-self.LOG_MAX_LINES:]
+        self.txt_status.config(state=tk.NORMAL); self.txt_status.delete("1.0", tk.END); self.txt_status.config(state=tk.DISABLED)
+        if lines: self._append_log_lines(lines)
 
     def _create_tab3_widgets(self):
         parent = self.tab3_frame
@@ -472,12 +958,31 @@ class ScrcpyGUI:
         device_frame.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
         ttk.Label(device_frame, text=self._("devices_label")).pack(side=tk.LEFT, padx=5)
         self.combo_devices_tab3_var = tk.StringVar()
-        self.combo_devices_tab3 = ttk.Combobox(device_frame, textvariable=self.combo_devices_tab3_var, state="readonly")
+        self.combo_devices_tab3 = ttk.Combobox(device_frame, textvariable=self.combo_devices_tab3_var, values=self.online_devices, state="readonly")
+        if self.online_devices: self.combo_devices_tab3_var.set(self.online_devices[0])
         self.combo_devices_tab3.pack(side=tk.LEFT, padx=5, fill="x", expand=True)
+        self.var_transfer_all_devices = tk.BooleanVar(value=False)
+        ttk.Checkbutton(device_frame, text=self._("all_devices_checkbox"), variable=self.var_transfer_all_devices).pack(side=tk.LEFT, padx=5)
+
+        # 传输模式：完整复制、增量同步或打包流式传输 (适合含大量小文件的文件夹)
+        mode_frame = ttk.Frame(parent)
+        mode_frame.grid(row=1, column=0, padx=5, pady=(0, 5), sticky="ew")
+        sync_row = ttk.Frame(mode_frame); sync_row.pack(fill="x")
+        archive_row = ttk.Frame(mode_frame); archive_row.pack(fill="x")
+        self.var_transfer_sync_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sync_row, text=self._("sync_mode_checkbox"), variable=self.var_transfer_sync_mode, command=lambda: self.var_transfer_sync_mode.get() and self.var_transfer_archive_mode.set(False)).pack(side=tk.LEFT, padx=5)
+        self.var_sync_mirror_delete = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sync_row, text=self._("sync_mirror_delete_checkbox"), variable=self.var_sync_mirror_delete).pack(side=tk.LEFT, padx=5)
+        self.var_sync_use_hash = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sync_row, text=self._("sync_use_hash_checkbox"), variable=self.var_sync_use_hash).pack(side=tk.LEFT, padx=5)
+        self.var_transfer_archive_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(archive_row, text=self._("archive_mode_checkbox"), variable=self.var_transfer_archive_mode, command=lambda: self.var_transfer_archive_mode.get() and self.var_transfer_sync_mode.set(False)).pack(side=tk.LEFT, padx=5)
+        self.var_archive_compress = tk.BooleanVar(value=True)
+        ttk.Checkbutton(archive_row, text=self._("archive_compress_checkbox"), variable=self.var_archive_compress).pack(side=tk.LEFT, padx=5)
 
         # --- 从手机 Pull 到电脑 ---
         pull_frame = ttk.LabelFrame(parent, text=self._("pull_from_phone_frame"))
-        pull_frame.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
+        pull_frame.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
         pull_frame.columnconfigure(1, weight=1)
 
         ttk.Label(pull_frame, text=self._("phone_source_path_label")).grid(row=0, column=0, padx=5, pady=5, sticky="w")
@@ -494,7 +999,7 @@ class ScrcpyGUI:
 
         # --- 从电脑 Push 到手机 ---
         push_frame = ttk.LabelFrame(parent, text=self._("push_to_phone_frame"))
-        push_frame.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+        push_frame.grid(row=3, column=0, padx=5, pady=5, sticky="ew")
         push_frame.columnconfigure(1, weight=1)
 
         ttk.Label(push_frame, text=self._("pc_source_path_label")).grid(row=0, column=0, padx=5, pady=5, sticky="w")
@@ -507,7 +1012,50 @@ class ScrcpyGUI:
         self.entry_push_dest_phone.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         ttk.Button(push_frame, text=self._("browse_phone_button"), command=lambda: self._open_phone_browser(self.entry_push_dest_phone)).grid(row=1, column=2, padx=5, pady=5)
 
-        ttk.Button(push_frame, text=self._("start_push_button"), command=self._execute_push).grid(row=2, column=0, columnspan=3, padx=5, pady=10, sticky="ew")
+        ttk.Button(push_frame, text=self._("start_push_button"), command=self._execute_push).grid(row=2, column=0, columnspan=2, padx=5, pady=10, sticky="ew")
+        ttk.Button(push_frame, text=self._("broadcast_push_button"), command=self._open_broadcast_dialog).grid(row=2, column=2, padx=5, pady=10, sticky="ew")
+
+        # --- 传输队列 ---
+        queue_frame = ttk.LabelFrame(parent, text=self._("transfer_queue_frame"))
+        queue_frame.grid(row=4, column=0, padx=5, pady=5, sticky="nsew")
+        queue_frame.columnconfigure(0, weight=1); queue_frame.rowconfigure(1, weight=1)
+        parent.rowconfigure(4, weight=1)
+
+        limits_frame = ttk.Frame(queue_frame)
+        limits_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
+        ttk.Label(limits_frame, text=self._("global_workers_label")).pack(side=tk.LEFT, padx=5)
+        self.transfer_global_workers_var = tk.IntVar(value=self.transfer_engine.max_workers)
+        spin_global = ttk.Spinbox(limits_frame, from_=1, to=32, width=4, textvariable=self.transfer_global_workers_var, command=self._apply_transfer_limits)
+        spin_global.pack(side=tk.LEFT, padx=5)
+        ttk.Label(limits_frame, text=self._("per_device_workers_label")).pack(side=tk.LEFT, padx=5)
+        self.transfer_device_workers_var = tk.IntVar(value=self.transfer_engine.per_device_workers)
+        spin_device = ttk.Spinbox(limits_frame, from_=1, to=8, width=4, textvariable=self.transfer_device_workers_var, command=self._apply_transfer_limits)
+        spin_device.pack(side=tk.LEFT, padx=5)
+        for spin in (spin_global, spin_device):
+            spin.bind("<Return>", lambda e: self._apply_transfer_limits()); spin.bind("<FocusOut>", lambda e: self._apply_transfer_limits())
+        ttk.Button(limits_frame, text=self._("clear_finished_button"), command=self._clear_finished_transfers).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(limits_frame, text=self._("resume_transfers_button"), command=self._resume_interrupted_transfers).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(limits_frame, text=self._("cancel_job_button"), command=self._cancel_selected_transfers).pack(side=tk.RIGHT, padx=5)
+
+        # 任务按设备分组显示，设备行汇总该设备的总速度与剩余时间
+        columns = ("device", "direction", "source", "dest", "state", "transferred", "progress", "speed", "eta")
+        self.tree_transfers = ttk.Treeview(queue_frame, columns=columns, show="tree headings", height=6)
+        self.tree_transfers.column("#0", width=24, stretch=False)
+        headings = ("col_device", "col_direction", "col_source", "col_dest", "col_state", "col_transferred", "col_progress", "col_speed", "col_eta")
+        for col, key, width in zip(columns, headings, (110, 50, 150, 150, 70, 120, 60, 80, 60)):
+            self.tree_transfers.heading(col, text=self._(key)); self.tree_transfers.column(col, width=width, anchor="w")
+        queue_sb = ttk.Scrollbar(queue_frame, orient="vertical", command=self.tree_transfers.yview)
+        self.tree_transfers.configure(yscrollcommand=queue_sb.set)
+        self.tree_transfers.grid(row=1, column=0, sticky="nsew", padx=(5, 0), pady=5); queue_sb.grid(row=1, column=1, sticky="ns", pady=5)
+
+        overall_frame = ttk.Frame(queue_frame)
+        overall_frame.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=(0, 5))
+        overall_frame.columnconfigure(0, weight=1)
+        self.transfer_overall_bar = ttk.Progressbar(overall_frame, mode="determinate", maximum=100)
+        self.transfer_overall_bar.grid(row=0, column=0, sticky="ew")
+        self.transfer_overall_label = ttk.Label(overall_frame, text=self._("transfer_idle"))
+        self.transfer_overall_label.grid(row=0, column=1, padx=(10, 0))
+        self.master.after(500, self._refresh_transfer_queue_view)
 
     def _open_phone_browser(self, target_entry):
         serial = self.combo_devices_tab3_var.get()
@@ -517,7 +1065,7 @@ class ScrcpyGUI:
         def update_path_callback(path):
             target_entry.delete(0, tk.END)
             target_entry.insert(0, path)
-        browser = PhoneFileBrowser(master=self.master, adb_path=self.adb_executable_path, device_serial=serial, callback_func=update_path_callback)
+        browser = PhoneFileBrowser(master=self.master, listing_cache=self.remote_cache, device_serial=serial, callback_func=update_path_callback)
         browser.wait_window()
         
     def _open_pc_browser(self, target_var):
@@ -534,7 +1082,7 @@ class ScrcpyGUI:
         def update_path_callback(path):
             target_entry.delete(0, tk.END)
             target_entry.insert(0, path)
-        browser = PhoneFileBrowser(master=self.master, adb_path=self.adb_executable_path, device_serial=serial, callback_func=update_path_callback)
+        browser = PhoneFileBrowser(master=self.master, listing_cache=self.remote_cache, device_serial=serial, callback_func=update_path_callback)
         browser.wait_window()
         
     def _open_pc_browser(self, target_var):
@@ -543,55 +1091,161 @@ class ScrcpyGUI:
         browser = PCFileBrowser(master=self.master, callback_func=update_path_callback)
         browser.wait_window()
 
-    def _run_adb_transfer_thread(self, cmd, success_msg, failure_msg):
-        self.log_status(f"执行: {' '.join(cmd)}")
-        def target():
-            try:
-                # 使用 Popen 来实时读取输出
-                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace', creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-                
-                # 逐行读取，实时更新到状态栏
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        self.log_status(output.strip())
-                
-                # 检查最终结果
-                if process.poll() == 0:
-                    self.log_status(success_msg)
-                else:
-                    self.log_status(failure_msg)
-            except Exception as e:
-                self.log_status(f"执行传输时出错: {e}")
+    def _transfer_target_serials(self):
+        if self.var_transfer_all_devices.get():
+            return list(self.online_devices)
+        serial = self.combo_devices_tab3_var.get()
+        return [serial] if serial else []
 
-        threading.Thread(target=target, daemon=True).start()
+    def _transfer_mode_options(self):
+        if self.var_transfer_archive_mode.get():
+            return {"mode": "archive", "compression": "auto" if self.var_archive_compress.get() else None}
+        if not self.var_transfer_sync_mode.get():
+            return {"mode": "copy"}
+        return {"mode": "sync", "mirror_delete": self.var_sync_mirror_delete.get(), "use_hash": self.var_sync_use_hash.get()}
 
     def _execute_pull(self):
-        serial = self.combo_devices_tab3_var.get()
+        serials = self._transfer_target_serials()
         phone_path = self.entry_pull_source_phone.get().strip()
         phone_path = phone_path.rstrip('*')  # 去掉可能的 *
         pc_path = self.pull_dest_pc_path_var.get()
 
-        if not all([serial, phone_path, pc_path != self._("path_not_selected")]):
+        if not all([serials, phone_path, pc_path != self._("path_not_selected")]):
             messagebox.showerror(self._("error"), "请确保已选择设备，并已填写手机源路径和电脑目标文件夹。", parent=self.master)
             return
-            
-        cmd = [self.adb_executable_path, "-s", serial, "pull", phone_path, pc_path]
-        self._run_adb_transfer_thread(cmd, f"成功将 {phone_path} 复制到 {pc_path}", "从手机复制失败。")
+
+        for serial in serials:
+            dest = pc_path
+            if len(serials) > 1:
+                # 多台设备拉取同一路径时按序列号分开存放，避免互相覆盖
+                dest = os.path.join(pc_path, re.sub(r'[^\w.-]', '_', serial))
+                os.makedirs(dest, exist_ok=True)
+            self.transfer_engine.submit("pull", serial, phone_path, dest, **self._transfer_mode_options())
+        self.log_status(f"已加入传输队列: {phone_path} -> {pc_path} ({len(serials)} 台设备)")
 
     def _execute_push(self):
-        serial = self.combo_devices_tab3_var.get()
+        serials = self._transfer_target_serials()
         pc_path = self.push_source_pc_path_var.get()
         phone_path = self.entry_push_dest_phone.get().strip()
 
-        if not all([serial, phone_path, pc_path != self._("path_not_selected")]):
+        if not all([serials, phone_path, pc_path != self._("path_not_selected")]):
             messagebox.showerror(self._("error"), "请确保已选择设备，并已选择电脑源文件夹和填写手机目标路径。", parent=self.master)
             return
-            
-        cmd = [self.adb_executable_path, "-s", serial, "push", pc_path, phone_path]
-        self._run_adb_transfer_thread(cmd, f"成功将 {pc_path} 复制到 {phone_path}", "向手机复制失败。")
+
+        for serial in serials:
+            self.transfer_engine.submit("push", serial, pc_path, phone_path, **self._transfer_mode_options())
+        self.log_status(f"已加入传输队列: {pc_path} -> {phone_path} ({len(serials)} 台设备)")
+
+    def _open_broadcast_dialog(self):
+        if not self.online_devices:
+            messagebox.showerror(self._("error"), self._("select_device_error"), parent=self.master)
+            return
+        pc_path = self.push_source_pc_path_var.get()
+        BroadcastDialog(self.master, self.adb, self.online_devices, "" if pc_path == self._("path_not_selected") else pc_path,
+                        self.entry_push_dest_phone.get().strip(), log=self.log_status, remote_cache=self.remote_cache)
+
+    def _apply_transfer_limits(self):
+        try:
+            self.transfer_engine.set_limits(self.transfer_global_workers_var.get(), self.transfer_device_workers_var.get())
+        except (tk.TclError, ValueError):
+            pass
+
+    def _cancel_selected_transfers(self):
+        for iid in self.tree_transfers.selection():
+            if iid.startswith("dev:"):
+                for child in self.tree_transfers.get_children(iid):
+                    self.transfer_engine.cancel(int(child))
+            else:
+                self.transfer_engine.cancel(int(iid))
+
+    def _report_interrupted_transfers(self):
+        pending = self.transfer_engine.journal.incomplete()
+        if pending:
+            self.log_status(f"有 {len(pending)} 个大文件传输上次未完成，连接对应设备后在“{self._('tab_file_transfer')}”分页点击“{self._('resume_transfers_button')}”可从断点继续", "WARNING")
+
+    def _resume_interrupted_transfers(self):
+        jobs = self.transfer_engine.resume_incomplete(set(self.online_devices))
+        waiting = len(self.transfer_engine.journal.incomplete()) - len(jobs)
+        self.log_status(f"已从断点继续 {len(jobs)} 个传输" + (f"，另有 {waiting} 个传输的设备未连接或已在队列中" if waiting > 0 else ""))
+
+    def _clear_finished_transfers(self):
+        self.transfer_engine.clear_finished()
+        self._transfer_view_dirty = True
+
+    def _on_transfer_update(self, job):
+        # 在工作线程中调用，只做标记，由 Tk 定时器统一刷新界面
+        self._transfer_view_dirty = True
+
+    def _refresh_transfer_queue_view(self):
+        # 工作线程的进度回调只设置脏标记，这里每 500ms 最多刷新一次，且只更新内容有变化的行
+        if self._transfer_view_dirty:
+            self._transfer_view_dirty = False
+            jobs = self.transfer_engine.jobs()
+            device_stats = self.transfer_engine.device_stats()
+            seen = set()
+            for serial in dict.fromkeys(job.serial for job in jobs):
+                parent_iid = f"dev:{serial}"; seen.add(parent_iid)
+                stats = device_stats.get(serial)
+                if stats:
+                    summary = self._("transfer_device_summary").format(running=stats.running, queued=stats.queued)
+                    values = (serial, "", summary, "", "", format_bytes(stats.bytes_done), "", format_rate(stats.rate), format_eta(stats.eta))
+                else:
+                    values = (serial, "", "", "", "", "", "", "", "")
+                self._update_transfer_row(parent_iid, "", values, open=True)
+            for job in jobs:
+                iid = str(job.id); seen.add(iid)
+                direction = ("⬇" if job.direction == "pull" else "⬆") + {"sync": " ⇄", "archive": " ▣"}.get(job.mode, "")
+                transferred = format_bytes(job.bytes_done) + (f" / {format_bytes(job.bytes_total)}" if job.bytes_total else "")
+                percent = "" if job.percent is None else f"{job.percent:.0f}%"
+                rate = format_rate(job.rate) if job.state not in FINISHED_STATES else format_rate(job.average_rate)
+                values = (job.serial, direction, job.source, job.dest, self._(f"job_state_{job.state}"), transferred, percent, rate, format_eta(job.eta))
+                self._update_transfer_row(iid, f"dev:{job.serial}", values)
+            for iid in [i for i in self._transfer_rows if i not in seen and not i.startswith("dev:")]:
+                self.tree_transfers.delete(iid); del self._transfer_rows[iid]
+            for iid in [i for i in self._transfer_rows if i not in seen]:
+                self.tree_transfers.delete(iid); del self._transfer_rows[iid]
+            self._update_transfer_overall(jobs, device_stats)
+        self.master.after(500, self._refresh_transfer_queue_view)
+
+    def _update_transfer_row(self, iid, parent, values, **options):
+        old_values = self._transfer_rows.get(iid)
+        if old_values is None:
+            self.tree_transfers.insert(parent, "end", iid=iid, values=values, **options)
+        elif old_values != values:
+            self.tree_transfers.item(iid, values=values)
+        self._transfer_rows[iid] = values
+        return old_values
+
+    def _update_transfer_overall(self, jobs, device_stats):
+        active = [job for job in jobs if job.state not in FINISHED_STATES]
+        if not active:
+            self.transfer_overall_bar.configure(value=0)
+            self.transfer_overall_label.configure(text=self._("transfer_idle"))
+            return
+        measured = [job for job in active if job.bytes_total]
+        total = sum(job.bytes_total for job in measured)
+        done = sum(min(job.bytes_done, job.bytes_total) for job in measured)
+        self.transfer_overall_bar.configure(value=done * 100.0 / total if total else 0)
+        rate = sum(stats.rate for stats in device_stats.values())
+        # 总剩余时间取各设备中最慢的一台，因为不同设备的传输是并行进行的
+        etas = [stats.eta for stats in device_stats.values()]
+        eta = None if not etas or None in etas else max(etas)
+        self.transfer_overall_label.configure(text=self._("transfer_overall_summary").format(count=len(active), speed=format_rate(rate), eta=format_eta(eta)))
+
+    def _on_transfer_finished(self, job):
+        # 在工作线程中调用：缓存与日志队列都是线程安全的，不必等界面刷新 (任务可能在刷新前就被“清除已完成”移除)
+        if job.state == DONE and job.direction == "push":
+            # 推送完成后目标目录的内容已变化，使文件浏览器的缓存失效
+            self.remote_cache.invalidate(job.serial, job.dest)
+        if job.state == DONE and job.mode == "sync":
+            self.log_status(f"已同步 {job.source} 到 {job.dest} ({job.serial}): {job.summary}", serial=job.serial)
+        elif job.state == DONE:
+            self.log_status(f"成功将 {job.source} 复制到 {job.dest} ({job.serial})" + (f" [{job.summary}]" if job.mode == "archive" else ""), serial=job.serial)
+        elif job.state == FAILED:
+            failure_msg = "从手机复制失败。" if job.direction == "pull" else "向手机复制失败。"
+            self.log_status(f"{failure_msg} ({job.serial}) {job.error}", level="ERROR", serial=job.serial)
+        else:
+            self.log_status(f"已取消传输: {job.source} ({job.serial})", level="WARNING", serial=job.serial)
 
     def _create_tab4_shortcuts(self):
         parent = self.tab4_frame
@@ -665,34 +1319,82 @@ class ScrcpyGUI:
         # 设置为只读
         text_widget.config(state=tk.DISABLED)
 
+    def _create_tab5_diagnostics(self):
+        parent = self.tab5_frame
+        toolbar = ttk.Frame(parent); toolbar.pack(pady=(5, 0), padx=5, fill="x")
+        self.chk_metrics_by_device = ttk.Checkbutton(toolbar, text=self._("metrics_by_device_checkbox"), variable=self.var_metrics_by_device, command=lambda: self._refresh_diagnostics_view(reschedule=False)); self.chk_metrics_by_device.pack(side=tk.LEFT, padx=5)
+        self.btn_metrics_reset = ttk.Button(toolbar, text=self._("metrics_reset_button"), command=self._reset_metrics); self.btn_metrics_reset.pack(side=tk.LEFT, padx=5)
+        self.btn_export_prometheus = ttk.Button(toolbar, text=self._("metrics_export_prometheus_button"), command=self._export_prometheus); self.btn_export_prometheus.pack(side=tk.RIGHT, padx=5)
+        self.btn_export_json = ttk.Button(toolbar, text=self._("metrics_export_json_button"), command=self._export_metrics_json); self.btn_export_json.pack(side=tk.RIGHT, padx=5)
+        export_frame = ttk.Frame(parent); export_frame.pack(pady=(3, 0), padx=5, fill="x")
+        self.chk_prometheus_auto = ttk.Checkbutton(export_frame, text=self._("metrics_prometheus_auto_checkbox"), variable=self.var_prometheus_auto, command=self.save_settings); self.chk_prometheus_auto.pack(side=tk.LEFT, padx=5)
+        self.lbl_prometheus_path = ttk.Label(export_frame, text=self.prometheus_path, foreground="gray"); self.lbl_prometheus_path.pack(side=tk.LEFT, padx=5)
+
+        table_frame = ttk.Frame(parent); table_frame.pack(pady=5, padx=5, fill="both", expand=True)
+        columns = ("operation", "device", "count", "p50", "p95", "max", "errors", "output")
+        self.tree_metrics = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for col, width, anchor in zip(columns, (150, 140, 60, 70, 70, 70, 50, 80), ("w", "w", "e", "e", "e", "e", "e", "e")):
+            self.tree_metrics.column(col, width=width, anchor=anchor)
+        metrics_sb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree_metrics.yview)
+        self.tree_metrics.configure(yscrollcommand=metrics_sb.set)
+        metrics_sb.pack(side=tk.RIGHT, fill=tk.Y); self.tree_metrics.pack(side=tk.LEFT, fill="both", expand=True)
+        self.master.after(0, self._refresh_diagnostics_view)
+
+    def _update_tab5_texts(self):
+        self.chk_metrics_by_device.config(text=self._("metrics_by_device_checkbox")); self.btn_metrics_reset.config(text=self._("metrics_reset_button"))
+        self.btn_export_json.config(text=self._("metrics_export_json_button")); self.btn_export_prometheus.config(text=self._("metrics_export_prometheus_button")); self.chk_prometheus_auto.config(text=self._("metrics_prometheus_auto_checkbox"))
+        for col, key in zip(("operation", "device", "count", "max", "errors", "output"), ("col_operation", "col_device", "col_count", "col_max", "col_errors", "col_output")):
+            self.tree_metrics.heading(col, text=self._(key))
+        self.tree_metrics.heading("p50", text="p50"); self.tree_metrics.heading("p95", text="p95")
+        self._metrics_rows = None
+
     def update_all_ui_texts(self):
         self.master.title(self._("app_title")); self.notebook.tab(self.tab1_frame, text=self._("tab_single_device")); self.notebook.tab(self.tab2_frame, text=self._("tab_multi_device"))
         if self.notebook.index("end") > 2: # 确保第三个分页存在
              self.notebook.tab(self.tab3_frame, text=self._("tab_file_transfer"))
         if self.notebook.index("end") > 3: # 确保第四个分页存在
              self.notebook.tab(self.tab4_frame, text=self._("tab_shortcuts"))
+        if self.notebook.index("end") > 4:
+             self.notebook.tab(self.tab5_frame, text=self._("tab_diagnostics"))
         self.config_frame.config(text=self._("config_frame")); self.lbl_scrcpy_path.config(text=self._("scrcpy_path_label")); self.btn_browse_scrcpy.config(text=self._("browse_button")); self.lbl_theme.config(text=self._("theme_label")); self.lbl_language.config(text=self._("language_label"))
         self.lbl_notice.config(text=self._("notice_label")); self.conn_params_frame.config(text=self._("connection_frame")); self.lbl_bitrate.config(text=self._("bitrate_label")); self.btn_tcpip_mode.config(text=self._("usb_tcpip_button")); self.lbl_wifi_ip.config(text=self._("target_ip_label")); self.btn_adb_connect_ip.config(text=self._("connect_ip_button")); self.chk_auto_connect_startup.config(text=self._("autostart_checkbox")); self.lbl_devices.config(text=self._("devices_label")); self.btn_refresh_devices_tab1.config(text=self._("refresh_button"))
-        self.scrcpy_ctrl_frame.config(text=self._("scrcpy_options_frame")); self.lbl_video_encoder.config(text=self._("video_encoder_label")); self.chk_enable_recording.config(text=self._("record_checkbox")); self.btn_browse_record_path.config(text=self._("record_path_button")); self.lbl_record_path_display_label.config(text=self._("record_path_label")); self.lbl_crop.config(text=self._("crop_label")); self.chk_turn_off_screen.config(text=self._("turn_off_screen_checkbox")); self.chk_maximize_window.config(text=self._("large_window_checkbox")); self.chk_use_h265.config(text=self._("h265_checkbox")); self.chk_custom_resolution.config(text=self._("custom_res_checkbox")); self.btn_save_settings.config(text=self._("save_settings_button"))
+        self.scrcpy_ctrl_frame.config(text=self._("scrcpy_options_frame")); self.lbl_video_encoder.config(text=self._("video_encoder_label")); self.chk_enable_recording.config(text=self._("record_checkbox")); self.btn_browse_record_path.config(text=self._("record_path_button")); self.lbl_record_path_display_label.config(text=self._("record_path_label")); self.lbl_crop.config(text=self._("crop_label")); self.chk_turn_off_screen.config(text=self._("turn_off_screen_checkbox")); self.chk_maximize_window.config(text=self._("large_window_checkbox")); self.chk_use_h265.config(text=self._("h265_checkbox")); self.chk_auto_quality.config(text=self._("auto_quality_checkbox")); self.chk_custom_resolution.config(text=self._("custom_res_checkbox")); self.btn_save_settings.config(text=self._("save_settings_button"))
         self.btn_connect_selected.config(text=self._("connect_device_button")); self.btn_disconnect.config(text=self._("disconnect_button"))
         self.encoder_options[0] = self._("encoder_default"); self.combo_video_encoder.config(values=self.encoder_options); 
         if "Auto" in self.video_encoder_var.get() or "自动" in self.video_encoder_var.get(): self.video_encoder_var.set(self._("encoder_default"))
-        for i, widgets in enumerate(self.profile_widgets):
-            widgets["frame"].config(text=self._("profile_label").format(i + 1))
-            widgets["frame"].winfo_children()[0].winfo_children()[0].config(text=self._("profile_enable_checkbox"))
-            widgets["frame"].winfo_children()[0].winfo_children()[1].config(text=self._("devices_label"))
-            widgets["frame"].winfo_children()[1].winfo_children()[0].config(text=self._("crop_label"))
-        tab2_actions = self.tab2_frame.winfo_children()[1]; tab2_actions.winfo_children()[0].config(text=self._("refresh_button")); tab2_actions.winfo_children()[1].config(text=self._("connect_selected_profiles_button")); tab2_actions.winfo_children()[2].config(text=self._("disconnect_all_profiles_button"))
+        if self.tab_built(self.tab2_frame): self._update_tab2_texts()
+        if self.tab_built(self.tab5_frame): self._update_tab5_texts()
         self.status_frame.config(text=self._("status_frame"))
+        self.lbl_log_level.config(text=self._("log_level_label")); self.lbl_log_device.config(text=self._("log_device_label"))
+        all_labels = [LANGUAGES["log_filter_all"][lang] for lang in ("zh", "en")]
+        self.combo_log_level.config(values=[self._("log_filter_all")] + list(LOG_LEVELS)); self.combo_log_device.config(values=[self._("log_filter_all")] + list(self.online_devices))
+        if self.log_level_var.get() in all_labels: self.log_level_var.set(self._("log_filter_all"))
+        if self.log_device_var.get() in all_labels: self.log_device_var.set(self._("log_filter_all"))
+
+    def _update_tab2_texts(self):
+        for i, widgets in enumerate(self.profile_widgets):
+            widgets["title_label"].config(text=self._("profile_label").format(i + 1))
+            widgets["enable_checkbox"].config(text=self._("profile_enable_checkbox"))
+            widgets["crop_label"].config(text=self._("crop_label"))
+            widgets["remove_button"].config(text=self._("remove_profile_button"))
+        self.btn_refresh_tab2.config(text=self._("refresh_button")); self.btn_discover.config(text=self._("discover_devices_button")); self.btn_connect_multi.config(text=self._("connect_selected_profiles_button")); self.btn_disconnect_multi.config(text=self._("disconnect_all_profiles_button"))
+        self.btn_add_profile.config(text=self._("add_profile_button")); self.btn_profiles_from_devices.config(text=self._("profiles_from_devices_button"))
+        self.lbl_launch_concurrency.config(text=self._("launch_concurrency_label")); self.lbl_launch_stagger.config(text=self._("launch_stagger_label"))
+        self.btn_capture.config(text=self._("capture_button")); self.chk_capture_repeat.config(text=self._("capture_repeat_checkbox")); self.lbl_capture_seconds.config(text=self._("seconds_label")); self.btn_capture_dir.config(text=self._("capture_dir_button"))
+        self.chk_record_segments.config(text=self._("record_segments_checkbox")); self.lbl_record_minutes.config(text=self._("minutes_label")); self.lbl_record_budget.config(text=self._("record_budget_label")); self.btn_record_dir.config(text=self._("record_dir_button"))
+        self.sessions_frame.config(text=self._("sessions_frame")); self.chk_auto_restart.config(text=self._("auto_restart_checkbox")); self.chk_auto_reconnect.config(text=self._("auto_reconnect_checkbox")); self.btn_stop_session.config(text=self._("stop_session_button"))
+        for col, key in zip(("device", "state", "uptime", "restarts", "exit_code"), ("col_device", "col_state", "col_uptime", "col_restarts", "col_exit_code")):
+            self.tree_sessions.heading(col, text=self._(key))
 
     def change_language(self, event=None): self.current_language = "zh" if "中文" in self.language_var.get() else "en"; self.update_all_ui_texts(); self.save_settings()
     def change_theme(self, event=None):
-        if not TTKTHEMES_AVAILABLE: return
-        try: self.master.set_theme(self.theme_var.get()); self.log_status(f"{self._('theme_changed')}: {self.theme_var.get()}"); self.save_settings()
-        except tk.TclError: self.log_status(f"{self._('theme_change_fail')}: '{self.theme_var.get()}'")
+        if not self.theme_style: return
+        try: self.theme_style.set_theme(self.theme_var.get()); self.apply_custom_styles(); self.log_status(f"{self._('theme_changed')}: {self.theme_var.get()}"); self.save_settings()
+        except tk.TclError: self.log_status(f"{self._('theme_change_fail')}: '{self.theme_var.get()}'", level="ERROR")
         
     def save_settings(self):
-        profile_settings = [{"crop": {k: e.get() for k, e in p["crop_entries"].items()}} for p in self.profile_widgets]
+        if self.tab_built(self.tab2_frame):
+            self.profile_settings = [{"name": p["name_var"].get().strip(), "enabled": p["enable_var"].get(), "serial": p["device_var"].get(), "crop": {k: e.get() for k, e in p["crop_entries"].items()}} for p in self.profile_widgets]
         settings = {
             "scrcpy_path": self.entry_scrcpy_path.get().strip(),  # 保存当前scrcpy路径
             "language": self.current_language,
@@ -704,26 +1406,53 @@ class ScrcpyGUI:
             "crop_h": self.entry_crop_h.get().strip(),
             "crop_x": self.entry_crop_x.get().strip(),
             "crop_y": self.entry_crop_y.get().strip(),
-            "profiles": profile_settings
+            "profiles": self.profile_settings,
+            "launch_concurrency": self.launcher.max_concurrent,
+            "launch_stagger": self.launcher.stagger,
+            "auto_restart_sessions": self.var_auto_restart.get(),
+            "auto_reconnect_enabled": self.var_auto_reconnect.get(),
+            "reconnect_endpoints": self.watchdog.desired(),
+            "auto_quality_enabled": self.var_auto_quality.get(),
+            "screenshot_dir": self.screenshot_dir,
+            "capture_interval": self.capture_interval_var.get(),
+            "recording_dir": self.recording_dir,
+            "record_segment_minutes": self.record_segment_minutes_var.get(),
+            "record_budget_gb": self.record_budget_gb_var.get(),
+            "metrics_by_device": self.var_metrics_by_device.get(),
+            "prometheus_path": self.prometheus_path,
+            "prometheus_auto": self.var_prometheus_auto.get()
         }
+        # 只更新内存中的设置，由设置存储在后台合并写入
+        profiles = settings.pop("profiles")
+        changed = self.settings_store.update(**settings)
+        profiles_changed = self.settings_store.set_profiles(profiles)
+        if profiles_changed and duplicate_serials(profiles):
+            self.log_status(f"多个预设选择了同一台设备 ({', '.join(duplicate_serials(profiles))})：全部保存，按设备查找预设 (如命令行 run --all-devices) 时使用其中第一个启用的预设", "WARNING")
+        if changed or profiles_changed: self.log_status(self._("settings_saved"))
+
+    def on_close(self):
         try:
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, indent=4, ensure_ascii=False)
-            self.log_status(self._("settings_saved"))
-        except Exception as e:
-            self.log_status(f"保存设置失败: {e}")
+            self.settings_store.close()
+        except OSError as e:
+            self.log_status(f"保存设置失败: {e}", level="ERROR")
+        self.watchdog.stop(); self.device_tracker.stop()
+        if self.capture_pipeline: self.capture_pipeline.close()
+        if self.segment_recorder: self.segment_recorder.close()
+        if self.var_prometheus_auto.get(): self._write_prometheus(quiet=True)
+        self.log_sink.close()
+        self.master.destroy()
 
     def load_settings(self):
         try:
-            if not os.path.exists(self.settings_file): 
+            settings = self.settings_store
+            if settings.load_error:
+                self.log_status(f"{self._('settings_load_fail')}: {settings.load_error}", level="ERROR")
+            if not settings.exists(): 
                 self.log_status(self._("no_settings_file"))
                 # 如果没有设置文件，使用默认路径
                 self.entry_scrcpy_path.delete(0, tk.END)
                 self.entry_scrcpy_path.insert(0, self.default_scrcpy_path)
                 return
-                
-            with open(self.settings_file, 'r', encoding='utf-8') as f: 
-                settings = json.load(f)
             
             # 加载scrcpy路径设置
             self.custom_scrcpy_path = settings.get("scrcpy_path", "")
@@ -753,48 +1482,90 @@ class ScrcpyGUI:
             self.entry_crop_y.delete(0, tk.END)
             self.entry_crop_y.insert(0, settings.get("crop_y", ""))
             
-            profile_settings = settings.get("profiles", [])
-            for i, p_setting in enumerate(profile_settings):
-                if i < len(self.profile_widgets):
-                    for key, entry_widget in self.profile_widgets[i]["crop_entries"].items():
-                        entry_widget.delete(0, tk.END)
-                        entry_widget.insert(0, p_setting.get("crop", {}).get(key, ""))
+            profile_settings = settings.profiles()
+            if profile_settings:
+                self.profile_settings = profile_settings
+                if self.tab_built(self.tab2_frame): self._set_profiles(profile_settings)
+            self.launcher.set_limits(settings.get("launch_concurrency", self.launcher.max_concurrent), settings.get("launch_stagger", self.launcher.stagger))
+            self.launch_concurrency_var.set(self.launcher.max_concurrent); self.launch_stagger_var.set(self.launcher.stagger)
+            self.var_auto_restart.set(settings.get("auto_restart_sessions", True))
+            self.var_auto_reconnect.set(settings.get("auto_reconnect_enabled", True))
+            if self.var_auto_reconnect.get():
+                for address in settings.get("reconnect_endpoints", []): self.watchdog.want(address)
+            self.var_auto_quality.set(settings.get("auto_quality_enabled", False)); self.toggle_auto_quality_state()
+            self.screenshot_dir = settings.get("screenshot_dir", self.screenshot_dir); self.capture_interval_var.set(settings.get("capture_interval", 5.0))
+            self.recording_dir = settings.get("recording_dir", self.recording_dir); self.record_segment_minutes_var.set(settings.get("record_segment_minutes", 10)); self.record_budget_gb_var.set(settings.get("record_budget_gb", 20))
+            self.var_metrics_by_device.set(settings.get("metrics_by_device", True)); self.prometheus_path = settings.get("prometheus_path", self.prometheus_path); self.var_prometheus_auto.set(settings.get("prometheus_auto", False))
                         
             self.log_status(self._("settings_loaded"))
         except Exception as e: 
-            self.log_status(f"{self._('settings_load_fail')}: {e}")
+            self.log_status(f"{self._('settings_load_fail')}: {e}", level="ERROR")
 
     def refresh_device_list(self):
         self.log_status(self._("refresh_button") + "...");
-        try:
-            result = subprocess.run([self.adb_executable_path, "devices"], capture_output=True, text=True, check=True, timeout=10)
-            device_list = sorted([line.split('\t')[0] for line in result.stdout.strip().splitlines()[1:] if '\tdevice' in line])
-            
-            # 更新“精细控制”页面的设备列表
-            self.combo_devices['values'] = device_list
-            if device_list:
-                self.combo_devices.current(0)
-            else:
-                self.combo_devices_var.set('')
-            
-            # 更新“多设备预设”页面的设备列表
-            for profile in self.profile_widgets:
-                profile['combo_device']['values'] = device_list
-            
-            # 【修正部分】更新“文件传输”页面的设备列表
-            if hasattr(self, 'combo_devices_tab3'):
-                self.combo_devices_tab3['values'] = device_list
-                if device_list:
-                    self.combo_devices_tab3.current(0)
-                else:
-                    self.combo_devices_tab3.set('')
-            
-            if device_list:
-                self.log_status(f"找到设备: {', '.join(device_list)}")
-            else:
-                self.log_status("未找到已连接的ADB设备。")
-        except Exception as e:
-            self.log_status(f"刷新设备列表时发生错误: {e}")
+        def target():
+            try:
+                snapshot = dict(self.adb.devices())
+                self.master.after(0, lambda: self._apply_device_snapshot(snapshot))
+            except Exception as e:
+                self.log_status(f"刷新设备列表时发生错误: {e}", level="ERROR")
+        threading.Thread(target=target, daemon=True).start()
+
+    def _apply_device_snapshot(self, snapshot):
+        current = {serial: "device" for serial in self.online_devices}
+        online = {serial: state for serial, state in snapshot.items() if state == "device"}
+        self._apply_device_events(diff_device_states(current, online))
+        if self.online_devices:
+            self.log_status(f"找到设备: {', '.join(self.online_devices)}")
+        else:
+            self.log_status("未找到已连接的ADB设备。")
+
+    def _on_device_snapshot(self, events, snapshot):
+        # 在 DeviceTracker 的线程中调用：看门狗只更新内存状态，界面更新交给 Tk 线程
+        self.watchdog.update_devices(snapshot)
+        self.master.after(0, lambda: self._apply_device_events(events))
+    def _on_endpoint_reconnected(self, address):
+        if self.supervisor.restart_now(address): self.log_status(f"{address} 已重新连接，重新启动其 Scrcpy 会话。", serial=address)
+    def _toggle_auto_reconnect(self):
+        # 关闭后不再守护任何地址；重新打开时守护当前已连接的 Wi-Fi 设备
+        if self.var_auto_reconnect.get():
+            for serial in self.online_devices:
+                if ":" in serial: self.watchdog.want(serial)
+        else:
+            for address in self.watchdog.desired(): self.watchdog.unwant(address)
+        self.save_settings()
+    def _apply_device_events(self, events):
+        # 只处理发生变化的设备，不重建整个列表，也不打断用户已有的选择
+        changed = False
+        for kind, serial, state in events:
+            online = kind != "removed" and state == "device"
+            if online and serial not in self.online_devices:
+                bisect.insort(self.online_devices, serial); changed = True
+                self.log_status(f"设备已连接: {serial}", serial=serial)
+            elif not online and serial in self.online_devices:
+                self.online_devices.remove(serial); changed = True
+                self._encoders_by_serial.pop(serial, None); self.encoder_cache.forget_device(serial)
+                self.log_status(f"设备已断开: {serial} ({state})", level="WARNING", serial=serial)
+        if not changed: return
+        device_list = list(self.online_devices)
+
+        # 更新“精细控制”页面的设备列表
+        self.combo_devices['values'] = device_list
+        if self.combo_devices_var.get() not in device_list:
+            self.combo_devices_var.set(device_list[0] if device_list else '')
+
+        # 更新“多设备预设”页面的设备列表
+        for profile in self.profile_widgets:
+            profile['combo_device']['values'] = device_list
+
+        # 状态栏的设备筛选保留已断开设备的选择，便于继续查看其日志
+        self.combo_log_device['values'] = [self._("log_filter_all")] + device_list
+
+        # 更新“文件传输”页面的设备列表
+        if hasattr(self, 'combo_devices_tab3'):
+            self.combo_devices_tab3['values'] = device_list
+            if self.combo_devices_tab3_var.get() not in device_list:
+                self.combo_devices_tab3_var.set(device_list[0] if device_list else '')
 
     def connect_multi_devices(self):
         devices_to_launch = {}; enabled_profiles = [p for p in self.profile_widgets if p["enable_var"].get()]
@@ -803,43 +1574,154 @@ class ScrcpyGUI:
             if not serial: continue
             if serial in devices_to_launch: messagebox.showerror(self._("duplicate_device_error_title"), self._("duplicate_device_error_message").format(serial), parent=self.master); return
             crop_dict = {k: v.get().strip() for k, v in profile["crop_entries"].items()}
-            devices_to_launch[serial] = {"crop": crop_dict}
+            devices_to_launch[serial] = {"crop": crop_dict, "name": profile["name_var"].get().strip()}
         
+        scrcpy_exec = self.entry_scrcpy_path.get().strip()
+        if not os.path.isfile(scrcpy_exec) or not os.access(scrcpy_exec, os.X_OK): messagebox.showerror(self._("error"), f"{self._('scrcpy_path_invalid')}: '{scrcpy_exec}'", parent=self.master); return
+        launch_items = []
         for serial, config in devices_to_launch.items():
-            if serial in self.multi_scrcpy_processes: self.log_status(f"设备 {serial} 已连接，跳过。"); continue
-            scrcpy_exec = self.entry_scrcpy_path.get().strip()
-            if not os.path.isfile(scrcpy_exec) or not os.access(scrcpy_exec, os.X_OK): messagebox.showerror(self._("error"), f"{self._('scrcpy_path_invalid')}: '{scrcpy_exec}'", parent=self.master); return
-            cmd = [scrcpy_exec, f"--serial={serial}", f"--window-title={serial}"]
-            crop = config.get("crop", {}); w, h, x, y = crop.get('w'), crop.get('h'), crop.get('x'), crop.get('y')
-            if all(s.isdigit() for s in [w, h, x, y]) and int(w) > 0 and int(h) > 0: cmd.append(f"--crop={w}:{h}:{x}:{y}")
-            self._run_scrcpy_thread(cmd, serial, is_multi=True)
+            if self.supervisor.is_active(serial): self.log_status(f"设备 {serial} 已连接，跳过。"); continue
+            launch_items.append((serial, profile_command(scrcpy_exec, serial, config.get("crop"))))
+        # 由调度器错开启动时间并限制同时启动的数量，避免 adb server 与 USB Hub 过载
+        auto_restart = self.var_auto_restart.get()
+        accepted = self.launcher.launch(launch_items, lambda serial, cmd, ready: self.supervisor.start(serial, cmd, group="multi", auto_restart=auto_restart, ready=ready))
+        if accepted:
+            self.log_status(f"已排队启动 {len(accepted)} 台设备 (同时启动 {self.launcher.max_concurrent} 台，间隔 {self.launcher.stagger:g} 秒)。")
+        if self.var_record_segments.get() and devices_to_launch: self._start_segment_recording(scrcpy_exec, devices_to_launch)
 
     def disconnect_all_multi(self):
-        self.log_status("正在断开所有预设连接..."); serials_to_kill = list(self.multi_scrcpy_processes.keys())
-        for serial in serials_to_kill:
-            proc = self.multi_scrcpy_processes.pop(serial, None)
-            if proc and proc.poll() is None: proc.terminate()
-        if serials_to_kill: self._kill_scrcpy_fallback()
-    
-    def _run_scrcpy_thread(self, cmd_list, serial, is_multi=False):
-        def target():
-            proc = None
-            try:
-                self.log_status(f"为 {serial} 启动Scrcpy: {' '.join(cmd_list)}"); proc = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace', creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-                if is_multi: self.multi_scrcpy_processes[serial] = proc
-                else: self.scrcpy_process = proc
-                stdout, stderr = proc.communicate()
-                if proc.returncode != 0: self.log_status(f"Scrcpy ({serial}) 异常退出: {stderr.strip()}")
-                else: self.log_status(f"Scrcpy ({serial}) 会话正常结束。")
-            except Exception as e: self.log_status(f"Scrcpy ({serial}) 启动时发生错误: {e}")
-            finally:
-                if is_multi and serial in self.multi_scrcpy_processes: del self.multi_scrcpy_processes[serial]
-                if not is_multi and self.scrcpy_process and proc and self.scrcpy_process.pid == proc.pid: self.scrcpy_process = None
-        threading.Thread(target=target, daemon=True).start()
-
-    def log_status(self, message):
-        if not hasattr(self, 'txt_status') or not self.txt_status.winfo_exists(): return
-        self.txt_status.config(state=tk.NORMAL); self.txt_status.insert(tk.END, f"{message}\n"); self.txt_status.see(tk.END); self.txt_status.config(state=tk.DISABLED); print(message)
+        dropped = self.launcher.cancel_pending()
+        if dropped: self.log_status(f"已取消尚未启动的设备: {', '.join(dropped)}", level="WARNING")
+        self.log_status("正在断开所有预设连接...")
+        self.supervisor.stop_all(group="multi")
+        if self.segment_recorder and self.segment_recorder.stop_all(): self.log_status("正在停止分段录制...")
+
+    def _start_segment_recording(self, scrcpy_exec, devices):
+        try: minutes, budget_gb = max(1, int(self.record_segment_minutes_var.get())), max(1, int(self.record_budget_gb_var.get()))
+        except (tk.TclError, ValueError): minutes, budget_gb = 10, 20
+        recorder = self.segment_recorder
+        options = (scrcpy_exec, self.recording_dir, minutes * 60, budget_gb * 1024 ** 3)
+        if recorder is None or (not any(r.active for r in recorder.recordings()) and (recorder.scrcpy_exec, recorder.out_dir, recorder.segment_seconds, recorder.budget_bytes) != options):
+            # 没有正在进行的录制时才按新的设置重新创建
+            if recorder: recorder.close()
+            recorder = self.segment_recorder = SegmentRecorder(*options, on_event=lambda serial, message, level: self.log_status(message, level=level, serial=serial))
+        try: started = [serial for serial, config in devices.items() if recorder.start(serial, config.get("name") or serial, config.get("crop"))]
+        except OSError as e: self.log_status(f"无法创建录制文件夹: {e}", level="ERROR"); return
+        if started: self.log_status(f"开始分段录制 {len(started)} 台设备，每段 {recorder.segment_seconds // 60} 分钟，磁盘预算 {format_bytes(recorder.budget_bytes)} ({recorder.out_dir})")
+
+    def _capture_targets(self):
+        serials = [p["device_var"].get() for p in self.profile_widgets if p["enable_var"].get() and p["device_var"].get() in self.online_devices]
+        return list(dict.fromkeys(serials)) or list(self.online_devices)
+
+    def _capture_screens(self):
+        serials = self._capture_targets()
+        if not serials:
+            if not self.var_capture_repeat.get(): messagebox.showerror(self._("error"), self._("select_device_error"), parent=self.master)
+            return
+        if self.capture_pipeline is None or self.capture_pipeline.out_dir != self.screenshot_dir:
+            if self.capture_pipeline: self.capture_pipeline.close()
+            self.capture_pipeline = CapturePipeline(self.adb, self.screenshot_dir, on_event=self._on_capture_event)
+        self.capture_pipeline.capture_once(serials)
+
+    def _on_capture_event(self, kind, serial, detail):
+        # 在后台线程中调用；连续截图时只记录错误，停止时汇总
+        if kind == "error": self.log_status(f"{serial} 截图失败: {detail}", "WARNING", serial)
+        elif kind == "saved" and not self._capture_repeating: self.log_status(f"截图已保存: {detail}", serial=serial)
+
+    def _toggle_capture_repeat(self):
+        if self._capture_after_id: self.master.after_cancel(self._capture_after_id); self._capture_after_id = None
+        self._capture_repeating = self.var_capture_repeat.get()
+        if self._capture_repeating:
+            self._capture_start_stats = (0, 0, 0) if self.capture_pipeline is None else (self.capture_pipeline.stats.saved, self.capture_pipeline.stats.duplicates, self.capture_pipeline.stats.skipped)
+            self._capture_tick()
+        elif self.capture_pipeline:
+            stats, (saved, duplicates, skipped) = self.capture_pipeline.stats, self._capture_start_stats
+            self.log_status(f"连续截图已停止：保存 {stats.saved - saved} 张，丢弃重复画面 {stats.duplicates - duplicates} 张，设备忙跳过 {stats.skipped - skipped} 次 ({self.screenshot_dir})")
+
+    def _capture_tick(self):
+        if not self.var_capture_repeat.get(): return
+        self._capture_screens()
+        try: interval = max(1.0, float(self.capture_interval_var.get()))
+        except (tk.TclError, ValueError): interval = 5.0
+        self._capture_after_id = self.master.after(int(interval * 1000), self._capture_tick)
+
+    def _choose_recording_dir(self):
+        path = filedialog.askdirectory(parent=self.master, initialdir=self.recording_dir if os.path.isdir(self.recording_dir) else os.path.expanduser("~"))
+        if path: self.recording_dir = path; self.log_status(f"录制保存位置: {path}"); self.save_settings()
+
+    def _choose_screenshot_dir(self):
+        path = filedialog.askdirectory(parent=self.master, initialdir=self.screenshot_dir if os.path.isdir(self.screenshot_dir) else os.path.expanduser("~"))
+        if path: self.screenshot_dir = path; self.log_status(f"截图保存位置: {path}"); self.save_settings()
+
+    def _stop_selected_sessions(self):
+        for serial in self.tree_sessions.selection():
+            self.supervisor.stop(serial)
+
+    def _refresh_sessions_view(self):
+        sessions = {session.serial: session for session in self.supervisor.sessions()}
+        for serial in self.tree_sessions.get_children():
+            if serial not in sessions: self.tree_sessions.delete(serial)
+        for serial, session in sessions.items():
+            uptime = int(session.uptime)
+            values = (serial, self._(f"session_state_{session.state}"), f"{uptime // 3600}:{uptime % 3600 // 60:02d}:{uptime % 60:02d}", session.restarts, "" if session.exit_code is None else session.exit_code)
+            if self.tree_sessions.exists(serial): self.tree_sessions.item(serial, values=values)
+            else: self.tree_sessions.insert("", "end", iid=serial, values=values)
+        recording = [r for r in self.segment_recorder.recordings() if r.active] if self.segment_recorder else []
+        self.lbl_record_status.config(text=f"● {len(recording)} | {format_bytes(self.segment_recorder.used_bytes)} / {format_bytes(self.segment_recorder.budget_bytes)}" if recording else "")
+        self.master.after(1000, self._refresh_sessions_view)
+
+    def _refresh_diagnostics_view(self, reschedule=True):
+        # 只在诊断分页可见时重建列表；统计本身一直在后台累计
+        if self.notebook.select() == str(self.tab5_frame):
+            by_device = self.var_metrics_by_device.get()
+            rows = [(operation, serial or ("—" if by_device else self._("log_filter_all")), count, format_duration(p50), format_duration(p95), format_duration(peak), errors or "", format_bytes(nbytes) if nbytes else "")
+                    for operation, serial, count, p50, p95, peak, errors, nbytes in self.metrics.rows(by_device)]
+            if rows != self._metrics_rows:
+                self._metrics_rows = rows
+                self.tree_metrics.delete(*self.tree_metrics.get_children())
+                for values in rows: self.tree_metrics.insert("", "end", values=values)
+        if reschedule: self.master.after(2000, self._refresh_diagnostics_view)
+
+    def _reset_metrics(self):
+        self.metrics.reset(); self._refresh_diagnostics_view(reschedule=False)
+
+    def _sample_event_loop_lag(self):
+        now = time.perf_counter()
+        self.metrics.record("tk event-loop lag", duration=max(0.0, now - self._event_loop_tick - self.EVENT_LOOP_SAMPLE_MS / 1000))
+        self._event_loop_tick = now
+        self.master.after(self.EVENT_LOOP_SAMPLE_MS, self._sample_event_loop_lag)
+
+    def _export_metrics_json(self):
+        path = filedialog.asksaveasfilename(parent=self.master, defaultextension=".json", filetypes=[("JSON", "*.json")], initialfile=f"artocarpus_metrics_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+        if not path: return
+        try: self.metrics.write_json(path); self.log_status(f"{self._('metrics_exported')}: {path}")
+        except OSError as e: self.log_status(f"导出统计数据失败: {e}", level="ERROR")
+
+    def _export_prometheus(self):
+        # 选择的路径同时作为自动更新的目标 (一般放在 node exporter 的 --collector.textfile.directory 中)
+        path = filedialog.asksaveasfilename(parent=self.master, defaultextension=".prom", filetypes=[("Prometheus", "*.prom")],
+                                            initialdir=os.path.dirname(self.prometheus_path), initialfile=os.path.basename(self.prometheus_path))
+        if not path: return
+        self.prometheus_path = path; self.lbl_prometheus_path.config(text=path); self.save_settings()
+        if self._write_prometheus(): self.log_status(f"{self._('metrics_exported')}: {path}")
+
+    def _write_prometheus(self, quiet=False):
+        try:
+            self.metrics.write_prometheus(self.prometheus_path)
+            return True
+        except OSError as e:
+            if not quiet: self.log_status(f"写入 Prometheus 文件失败: {e}", level="ERROR")
+            return False
+
+    def _write_prometheus_tick(self):
+        # 写入失败 (例如目录被删除) 时关闭自动更新，避免每 15 秒重复报错
+        if self.var_prometheus_auto.get() and not self._write_prometheus(): self.var_prometheus_auto.set(False)
+        self.master.after(self.PROMETHEUS_INTERVAL_MS, self._write_prometheus_tick)
+
+    def log_status(self, message, level="INFO", serial=None):
+        # 可在任意线程调用：只写入日志队列，由 _drain_log_queue 批量显示
+        if serial is None: serial = next((s for s in getattr(self, "online_devices", ()) if s in str(message)), None)
+        self.log_sink.emit(message, level, serial)
     def browse_scrcpy_path(self):
         path = filedialog.askopenfilename(title=self._("browse_scrcpy_title"), parent=self.master)
         if path: 
@@ -851,14 +1733,36 @@ class ScrcpyGUI:
         try: s = ttk.Style(); s.configure("Accent.TButton", font=('Arial', 10, 'bold')); self.btn_connect_selected.config(style="Accent.TButton"); s.configure("Danger.TButton", font=('Arial', 10, 'bold')); self.btn_disconnect.config(style="Danger.TButton")
         except tk.TclError: pass
     def update_bitrate_label_display(self, value): self.lbl_bitrate_value.config(text=f"{int(float(value))} Mbps")
-    def run_command_thread(self, command_list, success_message, failure_message):
+    def run_command_thread(self, command_desc, action, success_message, failure_message):
+        # action 为在后台线程中执行的 adb 操作 (通常是 self.adb 的方法)
         def target():
             try:
-                self.log_status(f"执行: {' '.join(command_list)}"); subprocess.run(command_list, check=True, capture_output=True, text=True, timeout=15, creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0); self.log_status(success_message); self.master.after(0, self.refresh_device_list)
-            except subprocess.CalledProcessError as e: self.log_status(f"{failure_message}\n{e.stderr.strip()}"); self.master.after(0, self.refresh_device_list)
-            except Exception as e: self.log_status(f"{failure_message}: {e}"); self.master.after(0, self.refresh_device_list)
+                self.log_status(f"执行: {command_desc}"); action(); self.log_status(success_message); self.master.after(0, self.refresh_device_list)
+            except AdbError as e: self.log_status(f"{failure_message}\n{str(e).strip()}", level="ERROR"); self.master.after(0, self.refresh_device_list)
+            except Exception as e: self.log_status(f"{failure_message}: {e}", level="ERROR"); self.master.after(0, self.refresh_device_list)
+        threading.Thread(target=target, daemon=True).start()
+    def enable_tcpip_mode(self):
+        # 所有 USB 设备并行切换到 TCP/IP 并连接，序列号与地址的对应关系保存到设置中
+        serials = [s for s in self.online_devices if is_usb_serial(s)]
+        if not serials: self.log_status("没有通过 USB 连接的设备。", level="WARNING"); return
+        auto_reconnect = self.var_auto_reconnect.get()
+        self.btn_tcpip_mode.config(state=tk.DISABLED)
+        self.log_status(f"正在为 {len(serials)} 台 USB 设备开启 TCP/IP 模式...")
+        def on_result(result):
+            if result.ok:
+                self.log_status(f"{result.serial} -> {result.address} ({result.elapsed:.1f} 秒)", serial=result.serial)
+                if auto_reconnect: self.watchdog.want(result.address)
+            else: self.log_status(f"{result.serial} 开启 TCP/IP 失败: {result.message}", level="ERROR", serial=result.serial)
+        def target():
+            results = provision_all(self.adb, serials, 5555, on_result=on_result)
+            self.master.after(0, lambda: self._on_tcpip_provisioned(results))
         threading.Thread(target=target, daemon=True).start()
-    def enable_tcpip_mode(self): self.run_command_thread([self.adb_executable_path, "-d", "tcpip", "5555"], "TCP IP 模式已在USB设备上请求。", "开启 TCP IP 模式失败。")
+    def _on_tcpip_provisioned(self, results):
+        self.btn_tcpip_mode.config(state=tk.NORMAL)
+        addresses = self.settings_store.get("tcpip_addresses", {})
+        addresses.update({r.serial: r.address for r in results if r.ok})
+        self.settings_store.update(tcpip_addresses=addresses)
+        self.log_status(f"TCP/IP 模式: {sum(1 for r in results if r.ok)} / {len(results)} 台设备已通过 Wi-Fi 连接。")
     def generic_adb_connect(self, ip_address, post_connect_action_callback=None):
      if not ip_address:
          if post_connect_action_callback is None:
@@ -866,7 +1770,7 @@ class ScrcpyGUI:
          return
 
      device_address = ip_address if ":" in ip_address else f"{ip_address}:5555"
-     cmd = [self.adb_executable_path, "connect", device_address]
+     auto_reconnect = self.var_auto_reconnect.get()
 
      def on_connect_done(success):
          self.refresh_device_list()
@@ -877,17 +1781,24 @@ class ScrcpyGUI:
      # 使用一个简化的 run_command_thread 版本来处理这个特定任务
      def target():
          try:
-             self.log_status(f"执行: {' '.join(cmd)}")
-             subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=15)
-             self.log_status(f"已请求连接到 {device_address}。")
-             self.master.after(0, lambda: on_connect_done(True))
+             self.log_status(f"执行: adb connect {device_address}")
+             success, message = self.adb.connect(device_address)
+             if message: self.log_status(message)
+             if success:
+                 self.log_status(f"已请求连接到 {device_address}。")
+                 if auto_reconnect: self.watchdog.want(device_address)
+             else: self.log_status(f"连接到 {device_address} 失败。", level="ERROR", serial=device_address)
+             self.master.after(0, lambda: on_connect_done(success))
          except Exception as e:
-             self.log_status(f"连接到 {device_address} 失败。")
+             self.log_status(f"连接到 {device_address} 失败。", level="ERROR", serial=device_address)
              self.master.after(0, lambda: on_connect_done(False))
 
      threading.Thread(target=target, daemon=True).start()
     def adb_connect_wifi_ip_manual(self): self.generic_adb_connect(self.target_ip_var.get().strip())
-    def toggle_resolution_controls_state(self): state = tk.NORMAL if self.var_custom_resolution.get() else tk.DISABLED; self.scale_resolution.config(state=state); self.lbl_resolution_value.config(state=state)
+    def toggle_resolution_controls_state(self): state = tk.NORMAL if self.var_custom_resolution.get() and not self.var_auto_quality.get() else tk.DISABLED; self.scale_resolution.config(state=state); self.lbl_resolution_value.config(state=state)
+    def toggle_auto_quality_state(self):
+        # 自动画质时码率与分辨率由测速结果决定，手动设置暂时禁用
+        auto = self.var_auto_quality.get(); self.scale_bitrate.config(state=tk.DISABLED if auto else tk.NORMAL); self.chk_custom_resolution.config(state=tk.DISABLED if auto else tk.NORMAL); self.toggle_resolution_controls_state()
     def update_resolution_label_display(self, event=None): self.lbl_resolution_value.config(text=f"{self.resolution_scale_var.get()}px")
     def toggle_recording_controls_state(self): state = tk.NORMAL if self.var_enable_recording.get() else tk.DISABLED; self.combo_record_format.config(state="readonly" if state == tk.NORMAL else "disabled"); self.btn_browse_record_path.config(state=state); self.lbl_record_path_display_label.config(state=state); self.lbl_record_path_display.config(state=state)
     def browse_record_save_path(self):
@@ -903,34 +1814,53 @@ class ScrcpyGUI:
                 self.log_status(f"录像保存路径已设置为: {fp}")
 
     def connect_selected_device(self):
-        if self.scrcpy_process and self.scrcpy_process.poll() is None:
+        if self.scrcpy_serial and self.supervisor.is_active(self.scrcpy_serial):
             self.log_status("已有 Scrcpy 正在运行，跳过本次启动。")
             return
         serial = self.combo_devices_var.get()
         if not serial: messagebox.showerror(self._("error"), self._("select_device_error"), parent=self.master); return
         scrcpy_exec = self.entry_scrcpy_path.get().strip();
         if not os.path.isfile(scrcpy_exec) or not os.access(scrcpy_exec, os.X_OK): messagebox.showerror(self._("error"), f"{self._('scrcpy_path_invalid')}: '{scrcpy_exec}'", parent=self.master); return
-        cmd = [scrcpy_exec, f"-b{int(self.scale_bitrate_var.get())}M", f"--serial={serial}", f"--window-title={serial}"]
+        auto_quality = self.var_auto_quality.get()
+        cmd = [scrcpy_exec, f"--serial={serial}", f"--window-title={serial}"]
+        if not auto_quality: cmd.append(f"-b{int(self.scale_bitrate_var.get())}M")
         if self.var_turn_off_screen.get(): cmd.append("-S");
         if self.var_use_h265.get(): cmd.append("--video-codec=h265")
         sel_enc = self.video_encoder_var.get();
-        if sel_enc != self._("encoder_default"): cmd.extend(["--video-encoder", sel_enc])
+        if sel_enc != self._("encoder_default"): cmd.extend(["--video-encoder", sel_enc.split()[0]])
         if self.var_maximize_window.get():
             try: cmd.extend([f"--window-width={self.master.winfo_screenwidth()}", f"--window-height={self.master.winfo_screenheight()}"])
-            except tk.TclError: self.log_status("警告：无法获取屏幕尺寸。")
+            except tk.TclError: self.log_status("警告：无法获取屏幕尺寸。", level="WARNING")
         crop_w, crop_h, crop_x, crop_y = (self.entry_crop_w.get().strip(), self.entry_crop_h.get().strip(), self.entry_crop_x.get().strip(), self.entry_crop_y.get().strip())
         if all(s.isdigit() for s in [crop_w, crop_h, crop_x, crop_y]) and all([crop_w, crop_h, crop_x, crop_y]) and int(crop_w) > 0 and int(crop_h) > 0: cmd.append(f"--crop={crop_w}:{crop_h}:{crop_x}:{crop_y}")
         elif any(s for s in [crop_w, crop_h, crop_x, crop_y]): messagebox.showwarning(self._("warning"), self._("crop_warning"), parent=self.master)
-        if self.var_custom_resolution.get(): cmd.append(f"--max-size={self.resolution_scale_var.get()}")
+        if self.var_custom_resolution.get() and not auto_quality: cmd.append(f"--max-size={self.resolution_scale_var.get()}")
         if self.var_enable_recording.get():
             rec_fp = self.entry_record_path_var.get();
             if rec_fp: cmd.extend(["--record", rec_fp, "--record-format", self.record_format_var.get()])
             else: messagebox.showerror(self._("error"), self._("record_path_error"), parent=self.master); return
-        self.last_connected_serial = serial; self._run_scrcpy_thread(cmd, serial, is_multi=False)
+        self.last_connected_serial = serial; self.scrcpy_serial = serial
+        auto_restart = self.var_auto_restart.get()
+        if not auto_quality: self.supervisor.start(serial, cmd, group="single", auto_restart=auto_restart); return
+        def target():
+            # 测速结果按设备与连接方式缓存，通常只有第一次连接需要等待约一秒
+            try:
+                tuning = self.link_tuner.tune(serial)
+                self.log_status(f"自动画质 {serial}: {tuning.describe()}", serial=serial)
+                args = tuning.scrcpy_args()
+            except (AdbError, OSError) as e:
+                self.log_status(f"链路测速失败，使用手动设置的码率: {e}", level="WARNING", serial=serial)
+                args = [f"-b{int(self.scale_bitrate_var.get())}M"]
+            self.master.after(0, lambda: self.scrcpy_serial == serial and self.supervisor.start(serial, cmd + args, group="single", auto_restart=auto_restart))
+        threading.Thread(target=target, daemon=True).start()
     def disconnect_scrcpy(self):
-        if self.scrcpy_process and self.scrcpy_process.poll() is None: self.scrcpy_process.terminate()
-        else: self._kill_scrcpy_fallback()
-        if self.last_connected_serial and ":" in self.last_connected_serial: self.run_command_thread([self.adb_executable_path, "disconnect", self.last_connected_serial], f"已断开 {self.last_connected_serial}", f"断开 {self.last_connected_serial} 失败")
+        # 只结束本程序启动的该设备会话 (含其子进程)，不影响其他 scrcpy 进程
+        if self.scrcpy_serial: self.supervisor.stop(self.scrcpy_serial)
+        self.scrcpy_serial = None
+        if self.last_connected_serial and ":" in self.last_connected_serial:
+            address = self.last_connected_serial
+            self.watchdog.unwant(address)  # 用户主动断开的设备不再自动重连
+            self.run_command_thread(f"adb disconnect {address}", lambda: self.adb.disconnect(address), f"已断开 {address}", f"断开 {address} 失败")
         self.last_connected_serial = None
     def perform_startup_auto_connect(self):
         if self.auto_connect_performed:
@@ -940,32 +1870,19 @@ class ScrcpyGUI:
         if self.var_auto_connect_startup.get():
             saved_ip = self.target_ip_var.get().strip();
             if saved_ip:
-                self.scrcpy_process = None  # ✅ 强制清除状态（预防误判）
+                self.scrcpy_serial = None  # ✅ 强制清除状态（预防误判）
                 self.log_status(f"启动时自动连接: {saved_ip}")
                 self.generic_adb_connect(saved_ip, self._try_auto_launch_scrcpy)
-    def _kill_scrcpy_fallback(self):
-        cmd_name = os.path.basename(self.entry_scrcpy_path.get().strip() or "scrcpy");
-        if os.name == 'nt':
-            if not cmd_name.endswith(".exe"): cmd_name += ".exe";
-            subprocess.run(["taskkill", "/F", "/IM", cmd_name], check=False, capture_output=True)
-        else: subprocess.run(["pkill", "-f", cmd_name], check=False, capture_output=True)
 
 if __name__ == '__main__':
     saved_theme = "arc"; saved_lang = "zh"
-    settings_path = os.path.join(os.path.expanduser("~"), ".scrcpy_gui_v4.json")
-    if os.path.exists(settings_path):
-        try:
-            with open(settings_path, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-                saved_theme = settings.get("selected_theme", "arc")
-                saved_lang = settings.get("language", "zh")
-        except Exception as e: print(f"启动时加载配置文件失败: {e}")
-    root = None
-    if TTKTHEMES_AVAILABLE:
-        try: root = ThemedTk(theme=saved_theme)
-        except tk.TclError: root = tk.Tk()
-    else: root = tk.Tk()
-    my_gui = ScrcpyGUI(root, initial_theme=saved_theme, initial_lang=saved_lang)
+    settings_store = SettingsStore().load()  # 设置文件只解析一次，交给界面继续使用
+    if settings_store.load_error: print(f"启动时加载配置文件失败: {settings_store.load_error}")
+    saved_theme = settings_store.get("selected_theme", "arc")
+    saved_lang = settings_store.get("language", "zh")
+    root = tk.Tk()
+    my_gui = ScrcpyGUI(root, initial_theme=saved_theme, initial_lang=saved_lang, settings_store=settings_store)
+    root.protocol("WM_DELETE_WINDOW", my_gui.on_close)
     import traceback
 
     root.mainloop()
@@ -0,0 +1,253 @@
+"""
+多设备并发截图：`adb exec-out screencap` 取原始像素 (设备不做 PNG 编码，比 screencap -p 快得多)，
+与上一帧完全相同的画面按哈希丢弃，PNG 编码与写盘在后台工作线程池中完成。
+
+内存有上限：同时进行的截图数受 max_captures 限制，等待编码的帧最多 max_pending 个，队列满时截图线程等待；
+定时截图时，上一次还没完成的设备跳过本轮，不会越积越多。
+不依赖 Pillow：PNG 由 zlib 直接编码 (zlib 压缩时释放 GIL，多个工作线程可以真正并行)。
+"""
+import datetime
+import hashlib
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+from adb_client import AdbError
+
+PNG_LEVEL = 1  # zlib 压缩级别：速度优先，截图的文件大小与级别 6 相差不大
+# screencap 原始格式 (android.graphics.PixelFormat)：每像素字节数与通道顺序
+RGBA_8888, RGBX_8888, RGB_888, BGRA_8888 = 1, 2, 3, 5
+_BYTES_PER_PIXEL = {RGBA_8888: 4, RGBX_8888: 4, RGB_888: 3, BGRA_8888: 4}
+
+
+class RawFrame:
+    __slots__ = ("width", "height", "format", "stride", "pixels")
+
+    def __init__(self, width, height, pixel_format, stride, pixels):
+        self.width = width
+        self.height = height
+        self.format = pixel_format
+        self.stride = stride  # 每行的像素数 (可能大于 width)
+        self.pixels = pixels
+
+
+def parse_raw(data):
+    """
+    解析 `screencap` (不带 -p) 的输出：头部为 width、height、format (Android 8 起还有 colorspace)，
+    各 4 字节小端，之后是像素数据。不支持的格式抛出 ValueError。
+    """
+    if len(data) < 12:
+        raise ValueError("截图数据过短")
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    bpp = _BYTES_PER_PIXEL.get(pixel_format)
+    if bpp is None or not width or not height:
+        raise ValueError(f"不支持的像素格式 {pixel_format}")
+    for header in (16, 12):
+        size = len(data) - header
+        if size >= width * height * bpp and size % (height * bpp) == 0:
+            return RawFrame(width, height, pixel_format, size // (height * bpp), memoryview(data)[header:])
+    raise ValueError(f"截图数据长度与尺寸 {width}x{height} 不符")
+
+
+def _png_chunk(tag, payload):
+    return struct.pack(">I", len(payload)) + tag + payload + struct.pack(">I", zlib.crc32(tag + payload) & 0xffffffff)
+
+
+def encode_png(frame, level=PNG_LEVEL):
+    bpp = _BYTES_PER_PIXEL[frame.format]
+    row_bytes = frame.width * bpp
+    pixels = frame.pixels
+    if frame.stride != frame.width:
+        pixels = b"".join(pixels[y * frame.stride * bpp:y * frame.stride * bpp + row_bytes] for y in range(frame.height))
+    else:
+        pixels = bytes(pixels[:row_bytes * frame.height])  # 间隔切片需要连续的缓冲区
+    if frame.format == BGRA_8888:
+        swapped = bytearray(pixels)
+        swapped[0::4], swapped[2::4] = pixels[2::4], pixels[0::4]
+        pixels = swapped
+    if frame.format == RGBX_8888:
+        # 没有透明通道：去掉第 4 个字节，存为 RGB
+        rgb = bytearray(frame.width * frame.height * 3)
+        rgb[0::3], rgb[1::3], rgb[2::3] = pixels[0::4], pixels[1::4], pixels[2::4]
+        pixels, bpp, color_type = rgb, 3, 2
+    else:
+        color_type = 6 if bpp == 4 else 2
+    row_bytes = frame.width * bpp
+    # 每行前加过滤类型 0 (None)
+    raw = bytearray((row_bytes + 1) * frame.height)
+    view = memoryview(pixels)
+    for y in range(frame.height):
+        start = y * (row_bytes + 1) + 1
+        raw[start:start + row_bytes] = view[y * row_bytes:(y + 1) * row_bytes]
+    header = struct.pack(">IIBBBBB", frame.width, frame.height, 8, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header) + _png_chunk(b"IDAT", zlib.compress(raw, level)) + _png_chunk(b"IEND", b"")
+
+
+def capture(client, serial, raw=True, timeout=20):
+    chunks = []
+    client.exec_out(serial, "screencap" if raw else "screencap -p", chunks.append, timeout=timeout)
+    data = b"".join(chunks)
+    if not data:
+        raise AdbError("screencap 没有输出 (设备是否已解锁?)")
+    return data
+
+
+def _safe_name(serial):
+    return re.sub(r'[^\w.-]', '_', serial)
+
+
+class CaptureStats:
+    __slots__ = ("captured", "saved", "duplicates", "skipped", "failed", "bytes_written")
+
+    def __init__(self):
+        self.captured = self.saved = self.duplicates = self.skipped = self.failed = self.bytes_written = 0
+
+
+class CapturePipeline:
+    """
+    on_event(kind, serial, detail) 在后台线程中调用，kind 为 "saved" (detail 为文件路径)、
+    "duplicate"、"skipped" (上一次截图尚未完成) 或 "error" (detail 为错误信息)。
+    文件保存为 out_dir/<序列号>/<时间>.png。
+    """
+
+    def __init__(self, client, out_dir, workers=4, max_captures=8, max_pending=8, dedupe=True, on_event=None):
+        self.client = client
+        self.out_dir = out_dir
+        self.dedupe = dedupe
+        self.on_event = on_event
+        self.stats = CaptureStats()
+        self._capture_slots = threading.BoundedSemaphore(max_captures)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._busy = set()  # 截图或编码尚未完成的设备
+        self._last_hash = {}
+        self._raw_supported = {}  # 序列号 -> 原始格式是否可用；不可用时改用 screencap -p
+        self._stop = threading.Event()
+        self._repeat_thread = None
+        self._closed = False
+        self._workers = [threading.Thread(target=self._encode_loop, daemon=True) for _ in range(max(1, workers))]
+        for t in self._workers: t.start()
+
+    def capture_once(self, serials):
+        """为每台设备启动一次截图 (立即返回)；上一次尚未完成的设备跳过。"""
+        for serial in serials:
+            if self._closed:
+                return
+            with self._lock:
+                if serial in self._busy:
+                    self.stats.skipped += 1
+                    skipped = True
+                else:
+                    self._busy.add(serial)
+                    skipped = False
+            if skipped:
+                self._emit("skipped", serial, "")
+                continue
+            threading.Thread(target=self._capture, args=(serial,), daemon=True).start()
+
+    def start_repeating(self, serials_func, interval):
+        """每隔 interval 秒对 serials_func() 返回的设备截图，直到 stop_repeating()。"""
+        self.stop_repeating()
+        self._stop = stop = threading.Event()
+        def loop():
+            while not stop.is_set():
+                started = time.monotonic()
+                self.capture_once(serials_func())
+                stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        self._repeat_thread = threading.Thread(target=loop, daemon=True)
+        self._repeat_thread.start()
+
+    def stop_repeating(self):
+        self._stop.set()
+
+    @property
+    def repeating(self):
+        return self._repeat_thread is not None and self._repeat_thread.is_alive() and not self._stop.is_set()
+
+    def wait_idle(self, timeout=None):
+        """等待所有已开始的截图保存完毕，超时返回 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._busy:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def close(self):
+        """不再接受新的截图；已在队列中的帧仍会保存，之后工作线程退出。不会阻塞。"""
+        self.stop_repeating()
+        self._closed = True
+
+    def _capture(self, serial):
+        handed_off = False
+        try:
+            with self._capture_slots:
+                taken_at = datetime.datetime.now()
+                raw = self._raw_supported.get(serial, True)
+                data = capture(self.client, serial, raw)
+                frame = None
+                if raw:
+                    try:
+                        frame = parse_raw(data)
+                    except ValueError:
+                        # 不支持的原始格式：以后这台设备直接取设备端编码的 PNG
+                        self._raw_supported[serial] = False
+                        data = capture(self.client, serial, raw=False)
+                digest = hashlib.blake2b(frame.pixels if frame else data, digest_size=16).digest()
+            with self._lock:
+                self.stats.captured += 1
+                duplicate = self.dedupe and self._last_hash.get(serial) == digest
+                self._last_hash[serial] = digest
+            if duplicate:
+                with self._lock: self.stats.duplicates += 1
+                self._emit("duplicate", serial, "")
+                return
+            # 队列满时在这里等待，截图速度自动降到编码与写盘的速度
+            self._queue.put((serial, taken_at, frame, None if frame else data))
+            handed_off = True
+        except (AdbError, OSError) as e:
+            with self._lock: self.stats.failed += 1
+            self._emit("error", serial, str(e))
+        finally:
+            if not handed_off:
+                with self._lock: self._busy.discard(serial)
+
+    def _encode_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            serial, taken_at, frame, png = item
+            try:
+                if png is None:
+                    png = encode_png(frame)
+                folder = os.path.join(self.out_dir, _safe_name(serial))
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, taken_at.strftime("%Y%m%d_%H%M%S_%f")[:-3] + ".png")
+                with open(path, 'wb') as f:
+                    f.write(png)
+                with self._lock:
+                    self.stats.saved += 1
+                    self.stats.bytes_written += len(png)
+                self._emit("saved", serial, path)
+            except (OSError, ValueError) as e:
+                with self._lock: self.stats.failed += 1
+                self._emit("error", serial, str(e))
+            finally:
+                with self._lock: self._busy.discard(serial)
+
+    def _emit(self, kind, serial, detail):
+        if self.on_event:
+            try:
+                self.on_event(kind, serial, detail)
+            except Exception:
+                pass
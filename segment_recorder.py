@@ -0,0 +1,405 @@
+"""
+多设备分段录制：每个预设在镜像窗口之外另起一个无窗口的 scrcpy 录制进程，
+按时间 (--time-limit) 或文件大小切换到新的分段文件，适合长时间的多设备测试。
+
+- 分段先写成 mkv：进程崩溃或被强制结束时，已写入的部分仍可播放，最多损失正在写的那一段的结尾。
+- 所有预设的分段共享一个磁盘预算，超出时从最旧的已完成分段开始删除；正在写入的分段不会被删除。
+  磁盘剩余空间低于 min_free 且无分段可删时停止录制，不会把磁盘写满。
+- 已完成的分段由一个后台队列用 ffmpeg 无损转封装为 mp4 (找不到 ffmpeg 时保留 mkv)，
+  merge=True 时停止录制后再把同一次录制的分段拼接为一个文件。
+
+录制进程不采集音频：设备同一时间只允许一个客户端采集音频，留给镜像窗口。
+"""
+import collections
+import datetime
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from launch_orchestrator import profile_command
+from session_supervisor import spawn_in_group, terminate_group
+
+SEGMENT_SECONDS = 600
+SEGMENT_BYTES = 1024 ** 3
+BUDGET_BYTES = 20 * 1024 ** 3
+MIN_FREE_BYTES = 2 * 1024 ** 3
+MONITOR_INTERVAL = 2.0  # 秒；检查分段大小与磁盘空间的间隔
+ROTATE_GRACE = 5.0  # 秒；使用 --time-limit 时，超时这么久仍未结束才由这里切换分段
+STABLE_AFTER = 30.0  # 秒；录制超过这么久后再退出不计为连续失败
+MIN_SEGMENT_BYTES = 1024  # 小于此大小的分段视为没有录到画面，直接删除
+# 本模块创建的文件：<名称>_<日期>_<时间>_<序号>.mkv/.mp4，拼接结果序号为 all
+SEGMENT_NAME = re.compile(r"_\d{8}_\d{6}_(\d{3}|all)\.(mkv|mp4)$")
+_help_cache = {}
+
+
+def scrcpy_flags(scrcpy_exec):
+    """scrcpy --help 中出现的选项名集合 (按可执行文件缓存)；无法运行时返回空集合。"""
+    if scrcpy_exec not in _help_cache:
+        try:
+            output = subprocess.run([scrcpy_exec, "--help"], capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            output = ""
+        _help_cache[scrcpy_exec] = set(re.findall(r"--[a-z][a-z-]+", output))
+    return _help_cache[scrcpy_exec]
+
+
+def recorder_command(scrcpy_exec, serial, path, crop=None, segment_seconds=SEGMENT_SECONDS):
+    """无窗口、只录制的 scrcpy 命令行；裁剪区域与镜像窗口相同。"""
+    flags = scrcpy_flags(scrcpy_exec)
+    cmd = [arg for arg in profile_command(scrcpy_exec, serial, crop) if not arg.startswith("--window-title=")]
+    # scrcpy 2.5 起 --no-display 改名为 --no-playback；无法判断版本时按新版本处理
+    cmd.append("--no-display" if "--no-display" in flags and "--no-playback" not in flags else "--no-playback")
+    cmd += [f"--record={path}", "--record-format=mkv"]
+    if "--no-audio" in flags: cmd.append("--no-audio")
+    if "--no-control" in flags: cmd.append("--no-control")
+    if "--time-limit" in flags and segment_seconds: cmd.append(f"--time-limit={int(segment_seconds)}")
+    return cmd
+
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+class Recording:
+    __slots__ = ("serial", "label", "crop", "folder", "session", "proc", "current", "segment_started", "segments",
+                 "session_files", "failures", "rotating", "active", "stop_event", "thread", "output_tail")
+
+    def __init__(self, serial, label, crop, folder):
+        self.serial = serial
+        self.label = label
+        self.crop = crop
+        self.folder = folder
+        self.session = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")  # 本次录制的分段共用的时间戳
+        self.proc = None
+        self.current = None  # 正在写入的分段
+        self.segment_started = 0.0
+        self.segments = 0
+        self.session_files = []  # 本次录制已完成的分段 (不含扩展名)，拼接时使用
+        self.failures = 0
+        self.rotating = False
+        self.active = True
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.output_tail = collections.deque(maxlen=10)
+
+    @property
+    def current_bytes(self):
+        try:
+            return os.path.getsize(self.current) if self.current else 0
+        except OSError:
+            return 0
+
+
+class SegmentRecorder:
+    """
+    on_event(serial, message, level) 在后台线程中调用。
+    start() 时扫描 out_dir 中以前留下的分段并计入预算，未转封装的 mkv 重新加入转封装队列。
+    """
+
+    def __init__(self, scrcpy_exec, out_dir, segment_seconds=SEGMENT_SECONDS, segment_bytes=SEGMENT_BYTES,
+                 budget_bytes=BUDGET_BYTES, min_free=MIN_FREE_BYTES, merge=False, ffmpeg=None, on_event=None):
+        self.scrcpy_exec = scrcpy_exec
+        self.out_dir = out_dir
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.budget_bytes = budget_bytes
+        self.min_free = min_free
+        self.merge = merge
+        self.ffmpeg = ffmpeg if ffmpeg is not None else shutil.which("ffmpeg")
+        self.on_event = on_event
+        self.evicted = 0
+        self._time_limit = "--time-limit" in scrcpy_flags(scrcpy_exec)
+        self._lock = threading.Lock()
+        self._recordings = {}  # serial -> Recording
+        self._finished = collections.OrderedDict()  # 已完成的分段路径 -> 大小，按完成时间从旧到新
+        self._busy = set()  # 正在转封装或拼接的文件，不能删除
+        self._jobs = queue.Queue()
+        self._scanned = False
+        self._budget_warned = False
+        self._closed = threading.Event()
+        self._monitor = None
+        self._worker = None
+
+    def start(self, serial, label=None, crop=None):
+        """开始录制；该设备已在录制时返回 None。"""
+        label = label or serial
+        with self._lock:
+            existing = self._recordings.get(serial)
+            if existing and existing.active:
+                return None
+            recording = self._recordings[serial] = Recording(serial, label, crop, os.path.join(self.out_dir, _safe_name(label)))
+            active = sum(1 for r in self._recordings.values() if r.active)
+        os.makedirs(recording.folder, exist_ok=True)
+        self._ensure_threads()
+        if self.budget_bytes < 2 * active * self.segment_bytes and not self._budget_warned:
+            self._budget_warned = True
+            self._emit(serial, f"磁盘预算小于 {active} 台设备各两个分段的大小，旧分段会很快被删除。", "WARNING")
+        recording.thread = threading.Thread(target=self._record_loop, args=(recording,), daemon=True)
+        recording.thread.start()
+        return recording
+
+    def stop(self, serial, timeout=5.0):
+        with self._lock:
+            recording = self._recordings.get(serial)
+        if not recording or not recording.active:
+            return False
+        recording.stop_event.set()
+        proc = recording.proc
+        if proc and proc.poll() is None:
+            threading.Thread(target=terminate_group, args=(proc, timeout), daemon=True).start()
+        return True
+
+    def stop_all(self):
+        return [r.serial for r in self.recordings() if self.stop(r.serial)]
+
+    def recordings(self):
+        with self._lock:
+            return list(self._recordings.values())
+
+    def is_recording(self, serial):
+        with self._lock:
+            recording = self._recordings.get(serial)
+        return bool(recording and recording.active)
+
+    @property
+    def used_bytes(self):
+        with self._lock:
+            finished = sum(self._finished.values())
+            active = [r for r in self._recordings.values() if r.current]
+        return finished + sum(r.current_bytes for r in active)
+
+    def wait(self, timeout=None):
+        """等待所有录制结束且转封装队列清空，超时返回 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(r.active for r in self.recordings()) or self._jobs.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def close(self):
+        """停止所有录制；转封装队列中剩下的任务仍会完成 (后台线程)，之后线程退出。"""
+        self.stop_all()
+        self._closed.set()
+
+    def _ensure_threads(self):
+        with self._lock:
+            if not self._scanned:
+                self._scanned = True
+                self._scan_existing()
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+                self._monitor.start()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._job_loop, daemon=True)
+                self._worker.start()
+
+    def _scan_existing(self):
+        found = []
+        for root, _dirs, names in os.walk(self.out_dir):
+            for name in names:
+                if SEGMENT_NAME.search(name):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, path, st.st_size))
+        for _mtime, path, size in sorted(found):
+            self._finished[path] = size
+            # 上次退出前没有转封装的分段 (包括崩溃时正在写的分段)
+            if path.endswith(".mkv") and self.ffmpeg and not os.path.exists(path[:-4] + ".mp4"):
+                self._jobs.put(("remux", path))
+
+    def _record_loop(self, recording):
+        if not self.ffmpeg:
+            self._emit(recording.serial, "未找到 ffmpeg，录制分段将保留为 mkv 格式。", "INFO")
+        index = 0
+        while not recording.stop_event.is_set():
+            if not self._make_room():
+                recording.stop_event.set()
+                break
+            index += 1
+            base = os.path.join(recording.folder, f"{_safe_name(recording.label)}_{recording.session}_{index:03d}")
+            path = base + ".mkv"
+            cmd = recorder_command(self.scrcpy_exec, recording.serial, path, recording.crop, self.segment_seconds)
+            try:
+                proc = spawn_in_group(cmd)
+            except OSError as e:
+                self._emit(recording.serial, f"{recording.label} 启动录制时发生错误: {e}", "ERROR")
+                break
+            with self._lock:
+                recording.proc, recording.current, recording.segment_started = proc, path, time.monotonic()
+            if recording.stop_event.is_set():
+                terminate_group(proc, 5.0)
+            recording.output_tail.clear()
+            for line in proc.stdout:
+                recording.output_tail.append(line.rstrip())
+            code = proc.wait()
+            elapsed = time.monotonic() - recording.segment_started
+            with self._lock:
+                recording.proc = recording.current = None
+                rotated, recording.rotating = recording.rotating, False
+            if self._finish_segment(recording, path):
+                recording.session_files.append(base)
+                recording.segments += 1
+            if recording.stop_event.is_set():
+                break
+            if code == 0 or rotated:
+                recording.failures = 0
+                continue
+            recording.failures = 1 if elapsed >= STABLE_AFTER else recording.failures + 1
+            delay = min(60.0, 2.0 ** (recording.failures - 1))
+            detail = "\n".join(recording.output_tail).strip()
+            self._emit(recording.serial, f"{recording.label} 录制进程异常退出 (退出码 {code})，{delay:.0f} 秒后继续录制: {detail}", "WARNING")
+            recording.stop_event.wait(delay)
+        if self.merge and self.ffmpeg and len(recording.session_files) > 1:
+            self._jobs.put(("merge", recording))
+        recording.active = False
+        self._emit(recording.serial, f"{recording.label} 录制已停止，共 {recording.segments} 个分段 ({recording.folder})", "INFO")
+
+    def _finish_segment(self, recording, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        if size < MIN_SEGMENT_BYTES:
+            _remove(path)
+            return False
+        with self._lock:
+            self._finished[path] = size
+        if self.ffmpeg:
+            self._jobs.put(("remux", path))
+        return True
+
+    def _make_room(self):
+        """按预算与剩余空间删除最旧的已完成分段；剩余空间仍不足时停止所有录制并返回 False。"""
+        used = self.used_bytes
+        while True:
+            try:
+                free = shutil.disk_usage(self.out_dir).free
+            except OSError:
+                return True
+            if used <= self.budget_bytes and free >= self.min_free:
+                return True
+            with self._lock:
+                victim = next((path for path in self._finished if path not in self._busy), None)
+                size = self._finished.pop(victim, 0)
+            if victim is None:
+                break
+            _remove(victim)
+            used -= size
+            self.evicted += 1
+            self._emit(None, f"磁盘预算已满，删除最旧的录制分段: {victim}", "INFO")
+        if free < self.min_free:
+            if self.stop_all():
+                self._emit(None, f"磁盘剩余空间不足 {self.min_free / 1024 ** 3:.1f} GB 且没有可删除的分段，已停止录制。", "ERROR")
+            return False
+        return True
+
+    def _monitor_loop(self):
+        while not self._closed.wait(MONITOR_INTERVAL):
+            self._make_room()
+            for recording in self.recordings():
+                with self._lock:
+                    proc, started = recording.proc, recording.segment_started
+                if proc is None or recording.rotating or proc.poll() is not None:
+                    continue
+                limit = self.segment_seconds + (ROTATE_GRACE if self._time_limit else 0)
+                if recording.current_bytes >= self.segment_bytes or (self.segment_seconds and time.monotonic() - started >= limit):
+                    recording.rotating = True
+                    threading.Thread(target=terminate_group, args=(proc, 5.0), daemon=True).start()
+
+    def _job_loop(self):
+        while True:
+            try:
+                job = self._jobs.get(timeout=1.0)
+            except queue.Empty:
+                # 关闭后还要等正在结束的录制把最后一个分段放入队列
+                if self._closed.is_set() and not any(r.active for r in self.recordings()):
+                    return
+                continue
+            try:
+                if job[0] == "remux":
+                    self._remux(job[1])
+                else:
+                    self._merge(job[1])
+            except (OSError, subprocess.SubprocessError) as e:
+                self._emit(None, f"处理录制分段失败: {e}", "WARNING")
+            finally:
+                self._jobs.task_done()
+
+    def _run_ffmpeg(self, args, output):
+        tmp = output + ".part"
+        with self._lock:
+            self._busy.add(tmp)
+        try:
+            result = subprocess.run([self.ffmpeg, "-nostdin", "-v", "error", "-y", *args, "-c", "copy", "-f", "mp4", "-movflags", "+faststart", tmp],
+                                    capture_output=True, text=True, encoding='utf-8', errors='replace')
+            if result.returncode != 0:
+                _remove(tmp)
+                raise OSError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"ffmpeg 退出码 {result.returncode}")
+            os.replace(tmp, output)
+        finally:
+            with self._lock:
+                self._busy.discard(tmp)
+
+    def _remux(self, path):
+        with self._lock:
+            if path not in self._finished:
+                return  # 已被删除
+            self._busy.add(path)
+        try:
+            output = path[:-4] + ".mp4"
+            self._run_ffmpeg(["-i", path], output)
+            _remove(path)
+            with self._lock:
+                self._finished.pop(path, None)
+                self._finished[output] = os.path.getsize(output)
+        finally:
+            with self._lock:
+                self._busy.discard(path)
+
+    def _merge(self, recording):
+        with self._lock:
+            # 每个分段优先使用转封装后的 mp4；已被预算删除的分段跳过
+            paths = [p for p in (next((b + ext for ext in (".mp4", ".mkv") if b + ext in self._finished), None) for b in recording.session_files) if p]
+            self._busy.update(paths)
+        list_path = os.path.join(recording.folder, f".concat_{recording.session}.txt")
+        try:
+            if len(paths) < 2:
+                return
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for path in paths:
+                    f.write("file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n")
+            output = os.path.join(recording.folder, f"{_safe_name(recording.label)}_{recording.session}_all.mp4")
+            self._run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path], output)
+            for path in paths:
+                _remove(path)
+            with self._lock:
+                for path in paths:
+                    self._finished.pop(path, None)
+                self._finished[output] = os.path.getsize(output)
+            self._emit(recording.serial, f"{recording.label} 的 {len(paths)} 个分段已合并为 {output}", "INFO")
+        finally:
+            _remove(list_path)
+            with self._lock:
+                self._busy.difference_update(paths)
+
+    def _emit(self, serial, message, level):
+        if self.on_event:
+            try:
+                self.on_event(serial, message, level)
+            except Exception:
+                pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,221 @@
+"""
+scrcpy 会话监管：每个会话运行在独立的进程组中并按设备序列号登记，
+记录运行时长、退出码与重启次数，异常退出时按指数退避自动重启。
+
+停止某台设备只需按序列号找到对应的进程组并结束它，不会误伤本机上其他的 scrcpy 进程。
+"""
+import collections
+import os
+import signal
+import subprocess
+import threading
+import time
+
+STARTING, RUNNING, BACKOFF, STOPPED, EXITED, FAILED = "starting", "running", "backoff", "stopped", "exited", "failed"
+ACTIVE_STATES = (STARTING, RUNNING, BACKOFF)
+READY_MARKERS = ("Renderer:", "Texture:")  # scrcpy 打印这些信息时画面已经建立
+
+
+class ScrcpySession:
+    def __init__(self, serial, cmd, group="single", auto_restart=True):
+        self.serial = serial
+        self.cmd = list(cmd)
+        self.group = group
+        self.auto_restart = auto_restart
+        self.state = STARTING
+        self.proc = None
+        self.started_at = None
+        self.exit_code = None
+        self.restarts = 0
+        self.failures = 0  # 连续失败次数，决定下一次重启的等待时间以及是否放弃
+        self.next_restart_at = None
+        self.output_tail = collections.deque(maxlen=20)
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()  # 提前结束退避等待 (例如设备已重新连接)
+
+    @property
+    def uptime(self):
+        if self.started_at is None or self.state not in (STARTING, RUNNING):
+            return 0.0
+        return time.time() - self.started_at
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+
+class SessionSupervisor:
+    """
+    on_event(session, message, level) 在会话启动、退出、重启时于后台线程中调用。
+    运行超过 stable_after 秒后再退出视为一次新的故障，退避时间从 base_delay 重新计算；
+    只有连续 max_restarts 次重启都很快失败才放弃，长期无人值守时偶发的崩溃不会累计到上限。
+    metrics (CallMetrics) 不为 None 时记录 "scrcpy startup" (到画面建立的时间) 与 "scrcpy session" (整个进程的运行时间)。
+    """
+
+    def __init__(self, on_event=None, base_delay=1.0, max_delay=60.0, max_restarts=10, stable_after=30.0, metrics=None):
+        self.on_event = on_event
+        self.metrics = metrics
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_restarts = max_restarts
+        self.stable_after = stable_after
+        self._lock = threading.Lock()
+        self._sessions = {}  # serial -> ScrcpySession
+
+    def start(self, serial, cmd, group="single", auto_restart=True, ready=None):
+        """启动会话；该设备已有活动会话时不重复启动并返回 None。ready() 在画面建立或启动失败时调用。"""
+        with self._lock:
+            existing = self._sessions.get(serial)
+            if existing and existing.active:
+                if ready: ready()
+                return None
+            session = self._sessions[serial] = ScrcpySession(serial, cmd, group, auto_restart)
+        threading.Thread(target=self._supervise, args=(session, ready), daemon=True).start()
+        return session
+
+    def stop(self, serial, timeout=3.0):
+        with self._lock:
+            session = self._sessions.get(serial)
+        if not session or not session.active:
+            return False
+        session.stop_event.set()
+        session.wake_event.set()
+        proc = session.proc
+        if proc and proc.poll() is None:
+            threading.Thread(target=terminate_group, args=(proc, timeout), daemon=True).start()
+        return True
+
+    def restart_now(self, serial):
+        """
+        设备重新上线时调用：正在退避等待的会话立即重启；因错误结束的会话用原来的命令重新启动。
+        正常结束 (用户关闭窗口) 或被停止的会话不受影响。返回是否触发了重启。
+        """
+        session = self.get(serial)
+        if not session:
+            return False
+        if session.state == BACKOFF:
+            session.wake_event.set()
+            return True
+        if session.state == FAILED and session.exit_code not in (None, 0):
+            return self.start(serial, session.cmd, session.group, session.auto_restart) is not None
+        return False
+
+    def stop_all(self, group=None):
+        stopped = [s.serial for s in self.sessions() if (group is None or s.group == group) and self.stop(s.serial)]
+        return stopped
+
+    def get(self, serial):
+        with self._lock:
+            return self._sessions.get(serial)
+
+    def is_active(self, serial):
+        session = self.get(serial)
+        return bool(session and session.active)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def forget_finished(self):
+        with self._lock:
+            for serial in [s for s, session in self._sessions.items() if not session.active]:
+                del self._sessions[serial]
+
+    def _supervise(self, session, ready):
+        while not session.stop_event.is_set():
+            session.state = STARTING
+            session.exit_code = None
+            session.started_at = time.time()
+            command = " ".join(session.cmd)
+            startup = self.metrics.start("scrcpy startup", session.serial, command) if self.metrics else None
+            try:
+                session.proc = spawn_in_group(session.cmd)
+            except OSError as e:
+                if startup: startup.finish(exit_code=-1)
+                session.state = FAILED
+                self._emit(session, f"Scrcpy ({session.serial}) 启动时发生错误: {e}", "ERROR")
+                if ready: ready()
+                return
+            if session.stop_event.is_set():
+                # stop() 在进程创建之前被调用，此时它无法结束进程，由这里补上
+                terminate_group(session.proc, 3.0)
+            self._emit(session, f"为 {session.serial} 启动Scrcpy: {command}" + (f" (第 {session.restarts} 次重启)" if session.restarts else ""), "INFO")
+            output_bytes = 0
+            for line in session.proc.stdout:
+                output_bytes += len(line)
+                session.output_tail.append(line.rstrip())
+                if session.state == STARTING and any(marker in line for marker in READY_MARKERS):
+                    session.state = RUNNING
+                    if startup: startup.finish(exit_code=0)
+                    if ready: ready(); ready = None
+            session.exit_code = session.proc.wait()
+            uptime = time.time() - session.started_at
+            if startup and not session.stop_event.is_set():
+                startup.finish(exit_code=session.exit_code or -1)  # 画面建立之前就退出了
+            if self.metrics:
+                # 被 stop() 结束的会话退出码来自信号，不算失败
+                exit_code = None if session.stop_event.is_set() else session.exit_code
+                self.metrics.record("scrcpy session", session.serial, uptime, exit_code, output_bytes, command)
+            if ready: ready(); ready = None
+            if session.stop_event.is_set():
+                break
+            if session.exit_code == 0:
+                # 用户关闭了 scrcpy 窗口，不应自动重启
+                session.state = EXITED
+                self._emit(session, f"Scrcpy ({session.serial}) 会话正常结束。", "INFO")
+                return
+            detail = "\n".join(session.output_tail).strip()
+            self._emit(session, f"Scrcpy ({session.serial}) 异常退出 (退出码 {session.exit_code}，运行 {uptime:.0f} 秒): {detail}", "ERROR")
+            session.failures = 1 if uptime >= self.stable_after else session.failures + 1
+            if not session.auto_restart or session.failures > self.max_restarts:
+                session.state = FAILED
+                if session.auto_restart:
+                    self._emit(session, f"Scrcpy ({session.serial}) 连续重启 {session.failures - 1} 次仍然失败，不再自动重启。", "ERROR")
+                return
+            delay = min(self.max_delay, self.base_delay * 2 ** (session.failures - 1))
+            session.state = BACKOFF
+            session.next_restart_at = time.time() + delay
+            self._emit(session, f"Scrcpy ({session.serial}) 将在 {delay:.0f} 秒后重启。", "WARNING")
+            session.wake_event.wait(delay)
+            session.wake_event.clear()
+            if session.stop_event.is_set():
+                break
+            session.restarts += 1
+        session.state = STOPPED
+        session.next_restart_at = None
+        self._emit(session, f"Scrcpy ({session.serial}) 已停止。", "INFO")
+
+    def _emit(self, session, message, level):
+        if self.on_event:
+            try:
+                self.on_event(session, message, level)
+            except Exception:
+                pass
+
+
+def spawn_in_group(cmd):
+    # scrcpy 会再启动 adb 等子进程，放进独立的进程组后可以连同子进程一起结束
+    if os.name == 'nt':
+        options = {"creationflags": subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {"start_new_session": True}
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace', **options)
+
+
+def terminate_group(proc, timeout):
+    try:
+        if os.name == 'nt':
+            subprocess.run(["taskkill", "/T", "/PID", str(proc.pid)], check=False, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            if os.name == 'nt':
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], check=False, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    except OSError:
+        pass
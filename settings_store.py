@@ -0,0 +1,217 @@
+"""
+设置存储：设置保存在内存中，修改后由后台线程延迟合并写入，
+写入时先写临时文件再原子替换，中途崩溃也不会损坏原有的设置文件。
+
+文件结构 (version 3)：
+    {"version": 3, "language": ..., "selected_theme": ..., ...,
+     "profiles": {"<序列号>": {"name": ..., "enabled": ..., "crop": {...}}, ...},
+     "unassigned_profiles": [{"name": ..., "enabled": ..., "crop": {...}, "serial": ...}, ...],
+     "profile_order": ["<序列号>", null, ...]}
+
+多设备预设以设备序列号为键，查找与更新单台设备的预设不需要遍历全部预设；
+尚未选择设备的预设按顺序保存在 unassigned_profiles 中。多个预设选择了同一台设备时 (界面允许停用的预设重复)，
+按序列号查找的是其中第一个启用的预设，其余的也放在 unassigned_profiles 中并保留 serial 字段。
+profile_order 记录界面上的顺序：序列号指向 profiles 中的预设，null 依次指向 unassigned_profiles 中的下一个。
+"""
+import copy
+import json
+import os
+import threading
+
+from app_config import SETTINGS_FILE
+
+SCHEMA_VERSION = 3
+PROFILE_FIELDS = ("name", "enabled", "crop")
+
+
+def _profile_entry(record):
+    return {"name": record.get("name", ""), "enabled": bool(record.get("enabled", False)), "crop": copy.deepcopy(record.get("crop") or {})}
+
+
+def duplicate_serials(records):
+    """返回在多个预设中出现的设备序列号 (按首次出现的顺序)。"""
+    counts = {}
+    for record in records:
+        serial = record.get("serial")
+        if serial: counts[serial] = counts.get(serial, 0) + 1
+    return [serial for serial, count in counts.items() if count > 1]
+
+
+def _split_profiles(records):
+    # 按界面顺序的预设列表 -> (profiles, unassigned_profiles, profile_order)
+    records = [record for record in records if isinstance(record, dict)]
+    keyed_index = {}
+    for index, record in enumerate(records):
+        serial = record.get("serial")
+        if not serial:
+            continue
+        first = keyed_index.get(serial)
+        # 同一序列号出现多次时，按序列号查找应得到启用的那一个
+        if first is None or (record.get("enabled") and not records[first].get("enabled")):
+            keyed_index[serial] = index
+    keyed, unassigned, order = {}, [], []
+    for index, record in enumerate(records):
+        entry = _profile_entry(record)
+        serial = record.get("serial")
+        if serial and keyed_index[serial] == index:
+            keyed[serial] = entry
+            order.append(serial)
+        else:
+            if serial: entry["serial"] = serial
+            unassigned.append(entry)
+            order.append(None)
+    return keyed, unassigned, order
+
+
+def migrate(data):
+    """把旧版本的设置升级到当前版本，返回新的字典 (不修改传入的对象)。"""
+    data = dict(data)
+    version = data.get("version", 1)
+    if version < 2:
+        # version 1：profiles 是按位置保存的列表，早期版本的条目只有 crop
+        data["profiles"], data["unassigned_profiles"], data["profile_order"] = _split_profiles(data.get("profiles", []))
+    data.setdefault("profiles", {})
+    data.setdefault("unassigned_profiles", [])
+    if version < 3 and "profile_order" not in data:
+        # version 2 没有记录顺序，读取时绑定设备的预设在前
+        data["profile_order"] = list(data["profiles"]) + [None] * len(data["unassigned_profiles"])
+    data["version"] = SCHEMA_VERSION
+    return data
+
+
+class SettingsStore:
+    def __init__(self, path=SETTINGS_FILE, debounce=0.5):
+        self.path = path
+        self.debounce = debounce
+        self.load_error = None  # 设置文件损坏时的错误信息
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._data = migrate({})
+        self._timer = None
+        self._generation = 0  # 每次修改加一，写入时据此判断是否还有未保存的修改
+        self._saved_generation = 0
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("设置文件格式错误")
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            # 使用默认设置；损坏的文件在第一次写入时另存为 .corrupt 以便排查
+            self.load_error = str(e)
+            data = {}
+        with self._lock:
+            self._data = migrate(data)
+        return self
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return copy.deepcopy(self._data.get(key, default))
+
+    def update(self, **values):
+        with self._lock:
+            changed = {k: v for k, v in values.items() if self._data.get(k) != v}
+            if not changed:
+                return False
+            self._data.update(copy.deepcopy(changed))
+            self._generation += 1
+        self._schedule()
+        return True
+
+    def profiles(self):
+        """按保存时的顺序返回全部预设 (均含 serial 字段，未绑定设备时为空字符串)。"""
+        with self._lock:
+            keyed, unassigned = self._data["profiles"], iter(self._data["unassigned_profiles"])
+            result, seen = [], set()
+            for serial in self._data.get("profile_order", []):
+                if serial is None:
+                    record = next(unassigned, None)
+                    if record is not None: result.append(dict({"serial": ""}, **copy.deepcopy(record)))
+                elif serial in keyed and serial not in seen:
+                    seen.add(serial)
+                    result.append(dict(copy.deepcopy(keyed[serial]), serial=serial))
+            # 手工编辑过的文件中 profile_order 可能不完整，遗漏的预设放在最后
+            result += [dict(copy.deepcopy(record), serial=serial) for serial, record in keyed.items() if serial not in seen]
+            result += [dict({"serial": ""}, **copy.deepcopy(record)) for record in unassigned]
+            return result
+
+    def profile(self, serial):
+        with self._lock:
+            record = self._data["profiles"].get(serial)
+            return dict(copy.deepcopy(record), serial=serial) if record is not None else None
+
+    def update_profile(self, serial, **fields):
+        with self._lock:
+            if serial not in self._data["profiles"]:
+                self._data["profiles"][serial] = {"name": "", "enabled": False, "crop": {}}
+                self._data.setdefault("profile_order", []).append(serial)
+            record = self._data["profiles"][serial]
+            record.update({k: copy.deepcopy(v) for k, v in fields.items() if k in PROFILE_FIELDS})
+            self._generation += 1
+        self._schedule()
+
+    def set_profiles(self, records):
+        """
+        用界面上的预设列表整体替换并保留其顺序。同一序列号出现多次时全部保留，
+        按序列号查找时使用其中第一个启用的预设 (调用方可用 duplicate_serials 提示用户)。
+        """
+        keyed, unassigned, order = _split_profiles(records)
+        with self._lock:
+            if (keyed, unassigned, order) == (self._data["profiles"], self._data["unassigned_profiles"], self._data.get("profile_order")):
+                return False
+            self._data["profiles"], self._data["unassigned_profiles"], self._data["profile_order"] = keyed, unassigned, order
+            self._generation += 1
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        # 短时间内的多次修改只写一次文件
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.debounce, self._timer_fired)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_fired(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def flush(self):
+        """立即写入尚未保存的修改。"""
+        with self._write_lock:
+            with self._lock:
+                if self._generation == self._saved_generation:
+                    return False
+                generation = self._generation
+                text = json.dumps(self._data, indent=2, ensure_ascii=False)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.load_error and os.path.exists(self.path):
+                os.replace(self.path, self.path + ".corrupt")
+                self.load_error = None
+            os.replace(tmp_path, self.path)
+            self._saved_generation = generation
+            return True
+
+    def close(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer:
+            timer.cancel()
+        self.flush()
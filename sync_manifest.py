@@ -0,0 +1,242 @@
+"""
+增量同步 (类似 rsync) 的比较逻辑。
+
+远程文件的元数据通过一次 find + stat 调用批量取得，本地文件的元数据与哈希缓存在
+~/.artocarpus/sync_manifests/ 下的清单中，只有新增或变化的文件才需要传输。
+"""
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import stat
+
+from adb_client import AdbError
+
+MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".artocarpus", "sync_manifests")
+MTIME_TOLERANCE = 2  # 秒；FAT/exFAT 等文件系统的时间精度只有 2 秒
+HASH_BATCH = 200  # 每次 md5sum 调用携带的最大文件数
+
+
+def remote_listing(client, serial, remote_root):
+    """返回 {相对路径: (size, mtime)}；远程目录不存在时返回空字典。"""
+    command = f"if cd {shlex.quote(remote_root)} 2>/dev/null; then find . -type f -exec stat -c '%s %Y %n' {{}} +; fi"
+    output = client.shell(serial, command, timeout=120, check=True)
+    return parse_stat_output(output)
+
+
+def parse_stat_output(output):
+    listing = {}
+    for line in output.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        try:
+            size, mtime = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        rel = parts[2][2:] if parts[2].startswith("./") else parts[2]
+        listing[rel] = (size, mtime)
+    return listing
+
+
+def remote_hashes(client, serial, remote_root, rel_paths):
+    hashes = {}
+    rel_paths = list(rel_paths)
+    for i in range(0, len(rel_paths), HASH_BATCH):
+        batch = " ".join(shlex.quote("./" + rel) for rel in rel_paths[i:i + HASH_BATCH])
+        output = client.shell(serial, f"cd {shlex.quote(remote_root)} && md5sum {batch}", timeout=300)
+        for line in output.splitlines():
+            digest, _, name = line.partition("  ")
+            if len(digest) == 32 and name:
+                hashes[name[2:] if name.startswith("./") else name] = digest
+    return hashes
+
+
+def local_listing(local_root):
+    """用 os.scandir 遍历本地目录，返回 {相对路径 (以 / 分隔): (size, mtime)}。"""
+    listing = {}
+    if not os.path.isdir(local_root):
+        return listing
+    stack = [("", local_root)]
+    while stack:
+        prefix, directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = prefix + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((rel + "/", entry.path))
+                elif entry.is_file():
+                    st = entry.stat()
+                    listing[rel] = (st.st_size, int(st.st_mtime))
+            except OSError:
+                continue
+    return listing
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """
+    本地文件的清单缓存：{相对路径: [size, mtime, md5 或 None]}。
+    只要 size 与 mtime 未变，就复用上次计算的哈希，不必重新读取文件。
+    """
+
+    def __init__(self, serial, remote_root, local_root, manifest_dir=MANIFEST_DIR):
+        key = hashlib.sha1(f"{serial}|{remote_root}|{os.path.abspath(local_root)}".encode('utf-8')).hexdigest()
+        self.path = os.path.join(manifest_dir, key + ".json")
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def local_hash(self, local_root, rel, size, mtime):
+        cached = self.entries.get(rel)
+        if cached and cached[0] == size and cached[1] == mtime and cached[2]:
+            return cached[2]
+        digest = file_md5(os.path.join(local_root, *rel.split("/")))
+        self.entries[rel] = [size, mtime, digest]
+        return digest
+
+    def update(self, listing):
+        # 以同步完成后的本地状态为准重建清单，保留仍然有效的哈希
+        entries = {}
+        for rel, (size, mtime) in listing.items():
+            cached = self.entries.get(rel)
+            digest = cached[2] if cached and cached[0] == size and cached[1] == mtime else None
+            entries[rel] = [size, mtime, digest]
+        self.entries = entries
+
+
+class SyncPlan:
+    def __init__(self):
+        self.to_copy = []  # [(rel, size, mtime)] 来源端的元数据
+        self.to_delete = []  # 目标端多出来的相对路径 (仅镜像删除时)
+        self.touch_only = []  # [(rel, mtime)] 内容相同、只需修正修改时间
+        self.unchanged = 0
+
+    @property
+    def bytes_to_copy(self):
+        return sum(size for _rel, size, _mtime in self.to_copy)
+
+
+def build_plan(source, target, mirror_delete=False, same_content=None):
+    """
+    source/target 为 {相对路径: (size, mtime)}。
+    same_content(rel_list) 可选，返回内容相同 (哈希一致) 的相对路径集合，
+    用于 size 相同但 mtime 不同的文件，避免重复传输。
+    """
+    plan = SyncPlan()
+    suspects = []
+    for rel, (size, mtime) in source.items():
+        existing = target.get(rel)
+        if existing is None or existing[0] != size:
+            plan.to_copy.append((rel, size, mtime))
+        elif abs(existing[1] - mtime) > MTIME_TOLERANCE:
+            suspects.append((rel, size, mtime))
+        else:
+            plan.unchanged += 1
+    if suspects:
+        same = same_content([rel for rel, _size, _mtime in suspects]) if same_content else set()
+        for rel, size, mtime in suspects:
+            if rel in same:
+                plan.touch_only.append((rel, mtime))
+            else:
+                plan.to_copy.append((rel, size, mtime))
+    if mirror_delete:
+        plan.to_delete = sorted(rel for rel in target if rel not in source)
+    plan.to_copy.sort()
+    return plan
+
+
+def sync_pull(client, serial, remote_path, local_dest, mirror_delete=False, use_hash=False, progress=None, on_plan=None):
+    """把远程目录同步到 local_dest/<目录名>，返回 SyncPlan；on_plan(plan) 在开始传输前调用。"""
+    remote_root = remote_path.rstrip('/') or '/'
+    local_root = os.path.join(local_dest, posixpath.basename(remote_root) or "root")
+    mode = client.stat(serial, remote_root)[0]
+    if mode == 0:
+        raise AdbError(f"远程路径不存在: {remote_root}")
+    # 旧设备的 sync v1 STAT 不跟随符号链接 (如 /sdcard)，链接的目标是否为目录交给 shell 判断
+    if stat.S_ISLNK(mode) and client.shell(serial, f"test -d {shlex.quote(remote_root)} && echo dir").strip() == "dir":
+        mode = stat.S_IFDIR
+    if not stat.S_ISDIR(mode):
+        # 否则 cd 失败、列表为空，任务会以“传输 0 个文件”结束，mirror_delete 时还会清空本地同名目录
+        raise AdbError(f"远程路径不是文件夹: {remote_root}")
+    source = remote_listing(client, serial, remote_root)
+    target = local_listing(local_root)
+    manifest = SyncManifest(serial, remote_root, local_root).load()
+
+    def same_content(rels):
+        remote = remote_hashes(client, serial, remote_root, rels)
+        return {rel for rel in rels if rel in remote and remote[rel] == manifest.local_hash(local_root, rel, *target[rel])}
+
+    plan = build_plan(source, target, mirror_delete, same_content if use_hash else None)
+    if on_plan: on_plan(plan)
+    for rel, size, mtime in plan.to_copy:
+        local_file = os.path.join(local_root, *rel.split("/"))
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        client.pull_file(serial, remote_root + "/" + rel, local_file, size, mtime, progress)
+    for rel, mtime in plan.touch_only:
+        os.utime(os.path.join(local_root, *rel.split("/")), (mtime, mtime))
+    for rel in plan.to_delete:
+        try:
+            os.remove(os.path.join(local_root, *rel.split("/")))
+        except OSError:
+            pass
+    manifest.update(local_listing(local_root))
+    manifest.save()
+    return plan
+
+
+def sync_push(client, serial, local_path, remote_dest, mirror_delete=False, use_hash=False, progress=None, on_plan=None):
+    """把本地目录同步到 remote_dest/<目录名>，返回 SyncPlan；on_plan(plan) 在开始传输前调用。"""
+    local_root = os.path.abspath(local_path)
+    if not os.path.isdir(local_root):
+        raise AdbError(f"本地路径不是文件夹: {local_root}")
+    remote_root = remote_dest.rstrip('/') + "/" + os.path.basename(local_root)
+    source = local_listing(local_root)
+    target = remote_listing(client, serial, remote_root)
+    manifest = SyncManifest(serial, remote_root, local_root).load()
+
+    def same_content(rels):
+        remote = remote_hashes(client, serial, remote_root, rels)
+        return {rel for rel in rels if rel in remote and remote[rel] == manifest.local_hash(local_root, rel, *source[rel])}
+
+    plan = build_plan(source, target, mirror_delete, same_content if use_hash else None)
+    if on_plan: on_plan(plan)
+    for rel, _size, _mtime in plan.to_copy:
+        client.push_file(serial, os.path.join(local_root, *rel.split("/")), remote_root + "/" + rel, progress)
+    if plan.touch_only:
+        _remote_batch(client, serial, remote_root, [f"touch -m -d @{mtime} {shlex.quote(rel)}" for rel, mtime in plan.touch_only])
+    if plan.to_delete:
+        _remote_batch(client, serial, remote_root, [f"rm -f {shlex.quote(rel)}" for rel in plan.to_delete])
+    manifest.update(source)
+    manifest.save()
+    return plan
+
+
+def _remote_batch(client, serial, remote_root, commands, batch=100):
+    for i in range(0, len(commands), batch):
+        client.shell(serial, f"cd {shlex.quote(remote_root)} && " + "; ".join(commands[i:i + batch]), timeout=120)
@@ -0,0 +1,92 @@
+"""
+批量把 USB 连接的设备切换到 adb over TCP/IP：对每台设备并行地读取 Wi-Fi IP、执行 tcpip、
+再 adb connect 到 ip:port，返回 序列号 -> 地址 的对应关系，供以后自动连接使用。
+
+IP 必须在 tcpip 之前读取：adbd 重启时 USB 连接会短暂断开。
+"""
+import re
+import threading
+import time
+
+from adb_client import AdbError
+from device_discovery import connect_one
+
+_ROUTE_SRC = re.compile(r"\bdev\s+(\S+).*?\bsrc\s+(\d+\.\d+\.\d+\.\d+)")
+_INET = re.compile(r"\binet\s+(\d+\.\d+\.\d+\.\d+)/\d+")
+WIFI_INTERFACES = ("wlan", "swlan", "eth")
+
+
+class ProvisionResult:
+    __slots__ = ("serial", "ip", "address", "ok", "message", "elapsed")
+
+    def __init__(self, serial, ip=None, address=None, ok=False, message="", elapsed=0.0):
+        self.serial = serial
+        self.ip = ip
+        self.address = address
+        self.ok = ok
+        self.message = message
+        self.elapsed = elapsed
+
+
+def is_usb_serial(serial):
+    return ":" not in serial and "._adb-tls-" not in serial
+
+
+def parse_wifi_ip(route_output, addr_output=""):
+    """
+    取 `ip route` 中 Wi-Fi (wlan*) 或有线网卡 (eth*) 的 src 地址，没有时取 `ip addr show wlan0` 的 inet 地址。
+    移动数据 (rmnet* 等) 的地址从电脑上无法访问，不会返回。
+    """
+    for dev, ip in _ROUTE_SRC.findall(route_output):
+        if dev.startswith(WIFI_INTERFACES) and not ip.startswith("127."):
+            return ip
+    match = _INET.search(addr_output)
+    if match and not match.group(1).startswith("127."):
+        return match.group(1)
+    return None
+
+
+def device_wifi_ip(client, serial):
+    ip = parse_wifi_ip(client.shell(serial, "ip route", timeout=10))
+    if ip is None:
+        ip = parse_wifi_ip("", client.shell(serial, "ip -f inet addr show wlan0", timeout=10))
+    return ip
+
+
+def provision_one(client, serial, port=5555, connect_wait=8.0):
+    started = time.monotonic()
+    result = ProvisionResult(serial)
+    try:
+        result.ip = device_wifi_ip(client, serial)
+        if not result.ip:
+            result.message = "未找到 Wi-Fi IP (设备是否已连接 Wi-Fi?)"
+            return result
+        result.address = f"{result.ip}:{port}"
+        client.tcpip(serial, port)
+        # adbd 重启需要约一秒，在 connect_wait 内反复尝试
+        deadline = time.monotonic() + connect_wait
+        while True:
+            result.ok, result.message = connect_one(client, result.address, timeout=3)
+            if result.ok or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+    except (AdbError, OSError) as e:
+        result.message = str(e)
+    finally:
+        result.elapsed = time.monotonic() - started
+    return result
+
+
+def provision_all(client, serials, port=5555, max_concurrent=16, on_result=None):
+    """并行切换 serials 中的设备；on_result(result) 在每台设备完成时于后台线程中调用。返回结果列表 (与输入顺序一致)。"""
+    slots = threading.BoundedSemaphore(max_concurrent)
+    results = {}
+    def target(serial):
+        with slots:
+            result = results[serial] = provision_one(client, serial, port)
+        if on_result:
+            on_result(result)
+    threads = [threading.Thread(target=target, args=(serial,), daemon=True) for serial in serials]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return [results[serial] for serial in serials]
@@ -0,0 +1,150 @@
+"""
+AdbClient 与假 adb server (benchmarks/fake_devices.py serve) 之间的协议测试：
+设备列表、sync v1/v2 的 stat 与 listdir、pull 的字节数以及 shell 退出码的解析。
+
+    python -m unittest discover -s tests
+"""
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from adb_client import AdbClient, AdbError
+
+FAKE_DEVICES = os.path.join(REPO_DIR, "benchmarks", "fake_devices.py")
+BIG_SIZE = 5000 * 1024 * 1024  # 超过 4 GiB，sync v1 的 32 位大小会回绕
+SERIAL = "fake-0001"
+
+
+class FakeServer:
+    """在独立进程中运行假 adb server；关闭标准输入时它会自行退出。"""
+
+    def __init__(self, **options):
+        cmd = [sys.executable, FAKE_DEVICES, "serve", "--devices", "2", "--latency", "0", "--listing", "50", "--file-mb", "5000"]
+        for key, value in options.items():
+            cmd += ["--" + key.replace("_", "-"), str(value)]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.port = int(self.proc.stdout.readline())
+
+    def client(self):
+        # adb 可执行文件指向不存在的路径，确保测试的是 server 协议而不是本机的 adb
+        return AdbClient(adb_path=os.path.join(TESTS_DIR, "no-such-adb"), port=self.port, timeout=5)
+
+    def close(self):
+        self.proc.stdin.close()
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.proc.stdout.close()
+
+
+class _ServerTestCase(unittest.TestCase):
+    SERVER_OPTIONS = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(**cls.SERVER_OPTIONS)
+        cls.client = cls.server.client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.server.close()
+
+
+class SyncV2Test(_ServerTestCase):
+    SERVER_OPTIONS = {"sync_v2": 1}
+
+    def test_devices(self):
+        self.assertEqual(self.client.devices(), [("fake-0001", "device"), ("fake-0002", "device")])
+
+    def test_features(self):
+        self.assertTrue({"stat_v2", "ls_v2"} <= self.client.features(SERIAL))
+
+    def test_stat_reports_64_bit_size(self):
+        mode, size, mtime = self.client.stat(SERIAL, "/sdcard/big.bin")
+        self.assertTrue(stat.S_ISREG(mode))
+        self.assertEqual(size, BIG_SIZE)
+        self.assertGreater(mtime, 0)
+
+    def test_stat_missing_path(self):
+        self.assertEqual(self.client.stat(SERIAL, "/sdcard/missing")[0], 0)
+
+    def test_listdir(self):
+        entries = {name: (mode, size) for name, mode, size, _mtime in self.client.listdir(SERIAL, "/sdcard")}
+        self.assertEqual(set(entries), {"huge", "Download", "DCIM", "big.bin"})
+        self.assertTrue(stat.S_ISDIR(entries["huge"][0]))
+        self.assertEqual(entries["big.bin"][1], BIG_SIZE)
+        self.assertEqual(len(self.client.listdir(SERIAL, "/sdcard/huge")), 50)
+
+    def test_pull_file_byte_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            seen = []
+            done = self.client.pull(SERIAL, "/sdcard/huge/file_000007.jpg", tmp, lambda path, n, total: seen.append((n, total)))
+            self.assertEqual(done, 1007)
+            self.assertEqual(os.path.getsize(os.path.join(tmp, "file_000007.jpg")), 1007)
+            self.assertEqual(seen[-1], (1007, 1007))
+
+    def test_pull_missing_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(AdbError):
+                self.client.pull(SERIAL, "/sdcard/missing.bin", tmp)
+
+    def test_push_then_pull_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "Download")
+            os.makedirs(source)
+            for name, size in (("a.bin", 10), ("b.bin", 70000)):
+                with open(os.path.join(source, name), 'wb') as f:
+                    f.write(b"x" * size)
+            self.client.push("fake-0002", source, "/sdcard")
+            dest = os.path.join(tmp, "pulled")
+            os.makedirs(dest)
+            self.assertEqual(self.client.pull("fake-0002", "/sdcard/Download", dest), 70010)
+            self.assertEqual(sorted(os.listdir(os.path.join(dest, "Download"))), ["a.bin", "b.bin"])
+
+    def test_shell_output_and_exit_status(self):
+        self.assertEqual(self.client.shell(SERIAL, "echo hello").strip(), "hello")
+        self.assertEqual(self.client.shell(SERIAL, "exit 3").strip(), "")
+        with self.assertRaises(AdbError):
+            self.client.shell(SERIAL, "exit 3", check=True)
+        self.client.shell(SERIAL, "exit 0", check=True)
+
+    def test_unknown_device(self):
+        with self.assertRaises(AdbError):
+            self.client.stat("fake-9999", "/sdcard")
+
+
+class SyncV1Test(_ServerTestCase):
+    SERVER_OPTIONS = {"sync_v2": 0}
+
+    def test_features(self):
+        self.assertNotIn("stat_v2", self.client.features(SERIAL))
+
+    def test_stat_falls_back_to_v1(self):
+        mode, size, _mtime = self.client.stat(SERIAL, "/sdcard/big.bin")
+        self.assertTrue(stat.S_ISREG(mode))
+        self.assertEqual(size, BIG_SIZE & 0xffffffff)  # v1 协议本身只有 32 位
+        self.assertEqual(self.client.stat(SERIAL, "/sdcard/huge/file_000003.jpg")[1], 1003)
+
+    def test_listdir_falls_back_to_v1(self):
+        entries = {name: (mode, size) for name, mode, size, _mtime in self.client.listdir(SERIAL, "/sdcard/huge")}
+        self.assertEqual(len(entries), 50)
+        self.assertEqual(entries["file_000049.jpg"], (stat.S_IFREG | 0o660, 1049))
+
+    def test_pull_file_byte_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "copy.jpg")
+            self.assertEqual(self.client.pull(SERIAL, "/sdcard/huge/file_000001.jpg", target), 1001)
+            self.assertEqual(os.path.getsize(target), 1001)
+
+
+if __name__ == '__main__':
+    unittest.main()
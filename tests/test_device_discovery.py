@@ -0,0 +1,109 @@
+"""
+device_discovery 的目标解析与端口扫描测试：扫描时在 127.0.0.1 上监听几个端口作为假设备。
+
+    python -m unittest discover -s tests
+"""
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import device_discovery
+from device_discovery import MAX_HOSTS, expand_targets, parse_mdns_services, parse_ports, scan
+
+MDNS_OUTPUT = """List of discovered mdns services
+adb-R58M123	_adb-tls-connect._tcp.	192.168.1.20:37891
+adb-R58M123	_adb-tls-pairing._tcp.	192.168.1.20:41234
+adb-emulator	_adb._tcp	192.168.1.21:5555
+adb-broken	_adb-tls-connect._tcp.	fe80::1%wlan0
+"""
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_ports(self):
+        self.assertEqual(parse_ports("5555"), [5555])
+        self.assertEqual(parse_ports("5555-5557, 6000"), [5555, 5556, 5557, 6000])
+        for text in ("0", "5560-5555", "70000", "abc"):
+            with self.assertRaises(ValueError):
+                parse_ports(text)
+
+    def test_expand_cidr(self):
+        self.assertEqual(expand_targets(["192.168.1.0/30"]), [("192.168.1.1", 5555), ("192.168.1.2", 5555)])
+        self.assertEqual(len(expand_targets(["10.0.0.0/24"])), 254)  # 不含网络地址与广播地址
+
+    def test_expand_range_and_ports(self):
+        self.assertEqual(expand_targets(["10.0.0.5-6:5555-5556"]),
+                         [("10.0.0.5", 5555), ("10.0.0.5", 5556), ("10.0.0.6", 5555), ("10.0.0.6", 5556)])
+        self.assertEqual(expand_targets(["10.0.0.9"], default_ports=(5555, 5037)), [("10.0.0.9", 5555), ("10.0.0.9", 5037)])
+
+    def test_expand_keeps_order_and_removes_duplicates(self):
+        self.assertEqual(expand_targets(["10.0.0.2; 10.0.0.1 10.0.0.1-2"]), [("10.0.0.2", 5555), ("10.0.0.1", 5555)])
+
+    def test_expand_rejects_large_ranges(self):
+        self.assertEqual(len(expand_targets(["10.0.0.0/20"])), MAX_HOSTS - 2)
+        with self.assertRaises(ValueError):
+            expand_targets(["10.0.0.0/16"])
+        with self.assertRaises(ValueError):
+            expand_targets(["10.0.0.0/8:5555"])
+
+    def test_expand_rejects_bad_targets(self):
+        for spec in ("10.0.0.1:abc", "10.0.0.1:0", "10.0.0.1:5555:5556"):
+            with self.assertRaises(ValueError):
+                expand_targets([spec])
+
+    def test_parse_mdns_services(self):
+        self.assertEqual(parse_mdns_services(MDNS_OUTPUT), [("adb-R58M123", "192.168.1.20:37891"), ("adb-emulator", "192.168.1.21:5555")])
+        self.assertEqual(parse_mdns_services(""), [])
+
+    def test_mdns_services_uses_client(self):
+        class Client:
+            def mdns_services(self):
+                return MDNS_OUTPUT
+        self.assertEqual(len(device_discovery.mdns_services(Client())), 2)
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.listeners = []
+        for _ in range(3):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(("127.0.0.1", 0))
+            s.listen(8)
+            self.listeners.append(s)
+        self.open_ports = [s.getsockname()[1] for s in self.listeners]
+        # 绑定后立即关闭的端口：没有进程监听，连接会被拒绝
+        self.closed_ports = []
+        for _ in range(3):
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.bind(("127.0.0.1", 0))
+                self.closed_ports.append(s.getsockname()[1])
+
+    def tearDown(self):
+        for s in self.listeners:
+            s.close()
+
+    def test_scan_finds_exactly_the_open_ports(self):
+        ports = [self.closed_ports[0], self.open_ports[2], self.closed_ports[1], self.open_ports[0], self.open_ports[1], self.closed_ports[2]]
+        targets = [("127.0.0.1", port) for port in ports]
+        found, lock = [], threading.Lock()
+        def on_found(address):
+            with lock: found.append(address)
+        result = scan(targets, timeout=1.0, max_workers=4, on_found=on_found)
+        expected = [f"127.0.0.1:{port}" for port in ports if port in self.open_ports]
+        self.assertEqual(result, expected)  # 按输入顺序
+        self.assertEqual(sorted(found), sorted(expected))
+
+    def test_scan_with_expanded_targets(self):
+        spec = "127.0.0.1:" + ",".join(str(port) for port in self.open_ports + self.closed_ports)
+        self.assertEqual(scan(expand_targets([spec]), timeout=1.0), [f"127.0.0.1:{port}" for port in self.open_ports])
+
+    def test_scan_stops_when_requested(self):
+        stop = threading.Event(); stop.set()
+        self.assertEqual(scan([("127.0.0.1", port) for port in self.open_ports], stop_event=stop), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,341 @@
+"""
+文件传输队列：多个 (设备, 源路径, 目标路径) 任务排队执行，
+同时限制全局并发数与每台设备的并发数，避免压垮 adb server 或某台设备独占所有名额。
+"""
+import itertools
+import os
+import stat
+import threading
+import time
+
+from adb_client import AdbError
+import archive_stream
+import resumable_transfer
+import sync_manifest
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+RATE_WINDOW = 0.5  # 秒；计算传输速度的最小采样间隔
+RATE_SMOOTHING = 0.3  # 速度的指数平滑系数
+
+
+class TransferCancelled(AdbError):
+    pass
+
+
+class TransferJob:
+    def __init__(self, job_id, direction, serial, source, dest, mode="copy", mirror_delete=False, use_hash=False, compression=None):
+        self.id = job_id
+        self.direction = direction  # "pull" 或 "push"
+        self.serial = serial
+        self.source = source
+        self.dest = dest
+        self.mode = mode  # "copy" 完整复制，"sync" 只传输新增或变化的文件，"archive" 打包为 tar 流传输文件夹
+        self.mirror_delete = mirror_delete
+        self.use_hash = use_hash
+        self.compression = compression  # 仅 archive 模式的拉取：None、"gzip" 或 "auto"
+        self.summary = ""
+        self.state = QUEUED
+        self.error = ""
+        self.bytes_done = 0
+        self.bytes_total = None  # 开始传输前统计，无法统计时为 None
+        self.current_file = ""
+        self.file_done = 0
+        self.file_total = 0
+        self.rate = 0.0  # 字节/秒 (平滑后)
+        self._file_base = 0  # 当前文件之前已完成的字节数
+        self._rate_time = None
+        self._rate_bytes = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+
+    @property
+    def percent(self):
+        if self.state == DONE:
+            return 100.0
+        if not self.bytes_total:
+            return None
+        return min(100.0, self.bytes_done * 100.0 / self.bytes_total)
+
+    @property
+    def file_percent(self):
+        return min(100.0, self.file_done * 100.0 / self.file_total) if self.file_total else None
+
+    @property
+    def remaining_bytes(self):
+        return max(0, self.bytes_total - self.bytes_done) if self.bytes_total else None
+
+    @property
+    def eta(self):
+        remaining = self.remaining_bytes
+        if remaining is None or self.rate <= 0 or self.state != RUNNING:
+            return None
+        return remaining / self.rate
+
+    def record_progress(self, path, done, total, now=None):
+        now = time.monotonic() if now is None else now
+        if path != self.current_file:
+            self.current_file = path
+            self._file_base = self.bytes_done
+        self.file_done, self.file_total = done, total or 0
+        self.bytes_done = self._file_base + done
+        if self._rate_time is None:
+            self._rate_time, self._rate_bytes = now, self.bytes_done
+        elif now - self._rate_time >= RATE_WINDOW:
+            sample = (self.bytes_done - self._rate_bytes) / (now - self._rate_time)
+            self.rate = sample if self.rate == 0 else self.rate + RATE_SMOOTHING * (sample - self.rate)
+            self._rate_time, self._rate_bytes = now, self.bytes_done
+
+    @property
+    def average_rate(self):
+        end = self.finished_at or time.time()
+        if not self.started_at or end <= self.started_at:
+            return 0.0
+        return self.bytes_done / (end - self.started_at)
+
+
+class DeviceStats:
+    """单台设备上所有任务的汇总：运行/排队数量、总速度与预计剩余时间。"""
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.running = 0
+        self.queued = 0
+        self.bytes_done = 0
+        self.remaining_bytes = 0
+        self.rate = 0.0
+        self.eta_known = True
+
+    @property
+    def eta(self):
+        if self.rate <= 0 or not self.eta_known:
+            return None
+        return self.remaining_bytes / self.rate
+
+
+class TransferEngine:
+    """
+    任务按提交顺序调度，但会跳过已达到单设备并发上限的设备，
+    因此一台设备上的超大任务不会挡住其他设备的任务。
+    on_update(job) 在任务状态或进度变化时于工作线程中调用；
+    on_finish(job) 在每个任务结束 (完成、失败或取消) 时调用且只调用一次，不依赖界面是否刷新过这个任务。
+    完整复制模式下的大文件 (单个文件，不小于 RESUMABLE_MIN_SIZE) 使用断点续传，进度记录在 journal 中。
+    """
+
+    def __init__(self, client, max_workers=4, per_device_workers=1, on_update=None, journal=None, on_finish=None):
+        self.client = client
+        self.journal = journal or resumable_transfer.TransferJournal()
+        self.max_workers = max_workers
+        self.per_device_workers = per_device_workers
+        self.on_update = on_update
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._pending = []
+        self._running_per_device = {}
+        self._running_total = 0
+
+    def submit(self, direction, serial, source, dest, mode="copy", mirror_delete=False, use_hash=False, compression=None):
+        if direction not in ("pull", "push"):
+            raise ValueError(f"未知的传输方向: {direction}")
+        if mode not in ("copy", "sync", "archive"):
+            raise ValueError(f"未知的传输模式: {mode}")
+        with self._lock:
+            job = TransferJob(next(self._ids), direction, serial, source, dest, mode, mirror_delete, use_hash, compression)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def resume_incomplete(self, serials=None):
+        """把 journal 中未完成的传输重新加入队列 (只限 serials 中的设备)，返回新任务列表。"""
+        jobs = []
+        for _key, entry in self.journal.incomplete():
+            if serials is not None and entry.get("serial") not in serials:
+                continue
+            if any(job.state not in FINISHED_STATES and (job.serial, job.source) == (entry["serial"], entry["source"]) for job in self.jobs()):
+                continue
+            jobs.append(self.submit(entry["direction"], entry["serial"], entry["source"], entry["dest"]))
+        return jobs
+
+    def submit_many(self, items):
+        """items 为 [(direction, serial, source, dest), ...]，也可以附带 mode 等参数"""
+        return [self.submit(*item) for item in items]
+
+    def set_limits(self, max_workers=None, per_device_workers=None):
+        with self._lock:
+            if max_workers is not None: self.max_workers = max(1, int(max_workers))
+            if per_device_workers is not None: self.per_device_workers = max(1, int(per_device_workers))
+        self._dispatch()
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job.state in FINISHED_STATES:
+                return False
+            job.cancel_requested = True
+            was_queued = job.state == QUEUED
+            if was_queued:
+                self._pending.remove(job)
+                job.state = CANCELLED
+                job.finished_at = time.time()
+        self._notify(job)
+        if was_queued:
+            self._notify_finished(job)  # 运行中的任务由工作线程在结束时通知
+        return True
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def clear_finished(self):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.state in FINISHED_STATES]:
+                del self._jobs[job_id]
+
+    def device_stats(self):
+        stats = {}
+        for job in self.jobs():
+            if job.state in FINISHED_STATES:
+                continue
+            entry = stats.setdefault(job.serial, DeviceStats(job.serial))
+            entry.bytes_done += job.bytes_done
+            if job.state == RUNNING:
+                entry.running += 1
+                entry.rate += job.rate
+            else:
+                entry.queued += 1
+            if job.remaining_bytes is None:
+                entry.eta_known = False
+            else:
+                entry.remaining_bytes += job.remaining_bytes
+        return stats
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + self._running_total
+
+    def _dispatch(self):
+        to_start = []
+        with self._lock:
+            for job in list(self._pending):
+                if self._running_total >= self.max_workers:
+                    break
+                if self._running_per_device.get(job.serial, 0) >= self.per_device_workers:
+                    continue
+                self._pending.remove(job)
+                self._running_total += 1
+                self._running_per_device[job.serial] = self._running_per_device.get(job.serial, 0) + 1
+                job.state = RUNNING
+                job.started_at = time.time()
+                to_start.append(job)
+        for job in to_start:
+            threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+
+    def _run_job(self, job):
+        self._notify(job)
+        try:
+            self._execute(job)
+            job.state = DONE
+        except TransferCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.state = CANCELLED if job.cancel_requested else FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running_total -= 1
+                self._running_per_device[job.serial] -= 1
+                if not self._running_per_device[job.serial]:
+                    del self._running_per_device[job.serial]
+            self._notify(job)
+            self._notify_finished(job)
+            self._dispatch()
+
+    def _execute(self, job):
+        def progress(path, done, total):
+            if job.cancel_requested:
+                raise TransferCancelled("传输已取消")
+            job.record_progress(path, done, total)
+            self._notify(job)
+        if job.mode == "sync":
+            sync_func = sync_manifest.sync_pull if job.direction == "pull" else sync_manifest.sync_push
+            def on_plan(plan):
+                job.bytes_total = plan.bytes_to_copy
+                self._notify(job)
+            plan = sync_func(self.client, job.serial, job.source, job.dest, job.mirror_delete, job.use_hash, progress, on_plan)
+            job.summary = f"传输 {len(plan.to_copy)} 个文件，跳过 {plan.unchanged + len(plan.touch_only)} 个未变化文件，删除 {len(plan.to_delete)} 个"
+        elif job.mode == "archive":
+            job.bytes_total = self._measure_source(job)
+            self._notify(job)
+            if job.direction == "pull":
+                compression = archive_stream.resolve_compression(self.client, job.serial, job.compression)
+                archive_stream.pull_archive(self.client, job.serial, job.source, job.dest, compression, progress)
+                job.summary = "打包传输" + (" (gzip)" if compression else "")
+            else:
+                archive_stream.push_archive(self.client, job.serial, job.source, job.dest, progress)
+                job.summary = "打包传输"
+        else:
+            job.bytes_total = self._measure_source(job)
+            self._notify(job)
+            if resumable_transfer.can_resume(self.client, job.direction, job.serial, job.source, job.bytes_total):
+                resume_func = resumable_transfer.pull_resumable if job.direction == "pull" else resumable_transfer.push_resumable
+                result = resume_func(self.client, job.serial, job.source, job.dest, self.journal, progress)
+                job.summary = (f"从 {format_bytes(result.resumed_from)} 处继续，" if result.resumed_from else "") + ("MD5 校验一致" if result.verified else "设备不支持 md5sum，未校验")
+            elif job.direction == "pull":
+                self.client.pull(job.serial, job.source, job.dest, progress)
+            else:
+                self.client.push(job.serial, job.source, job.dest, progress)
+
+    def _measure_source(self, job):
+        # 预先统计总字节数以便计算百分比与剩余时间；统计失败不影响传输本身
+        try:
+            if job.direction == "push":
+                if os.path.isfile(job.source):
+                    return os.path.getsize(job.source)
+                return sum(size for size, _mtime in sync_manifest.local_listing(job.source).values())
+            mode, size, _mtime = self.client.stat(job.serial, job.source)
+            if stat.S_ISDIR(mode):
+                return sum(size for size, _mtime in sync_manifest.remote_listing(self.client, job.serial, job.source).values())
+            return resumable_transfer.remote_file_size(self.client, job.serial, job.source, size) or None
+        except Exception:
+            return None
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception:
+                pass
+
+    def _notify_finished(self, job):
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception:
+                pass
+
+
+def format_rate(rate):
+    return f"{format_bytes(rate)}/s" if rate else "-"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0